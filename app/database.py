@@ -8,35 +8,397 @@ SQLiteデータベースの作成、接続、CRUD操作を行います。
 - user_memories: ユーザーの記憶（日常的な出来事、情報など）
 - user_goals: ユーザーの目標（やりたいこと、達成したいことなど）
 - assistant_requests: アシスタントへのお願い（話し方、対応方法など）
+- llm_cache: 情報整理やチャットでのLLMの出力（同じ入力でLLMを呼び直さないため）
 """
 
 import sqlite3
+import atexit
+import functools
+import hashlib
+import json
+import threading
+import time
+from urllib.request import pathname2url
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 import os
 
 # 設定ファイルからデータベースパスを取得
+# （直接実行したときだけプロジェクトルートをパスに追加する。
+#   パッケージとして読み込まれたときは既にパスにあるため、重複して追加しない）
 import sys
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from config import DATABASE_PATH
+if __name__ == '__main__':
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from config import DATABASE_PATH, QUERY_CACHE_TTL_SECONDS, LLM_CACHE_MAX_AGE_DAYS
+from app.db_pool import SQLiteConnectionPool
+
+
+# 接続ごとに適用するPRAGMA
+# - journal_mode=WAL: 書き込み中も読み取りをブロックしない
+# - synchronous=NORMAL: WALではコミットごとのfsyncを省いても整合性を保てる
+# - temp_store=MEMORY: 一時テーブル・ソート領域をメモリに置く
+# - cache_size=-64000: ページキャッシュ約64MB（負値はKB単位）
+# - mmap_size=268435456: 256MBまでメモリマップI/Oを使う
+# - wal_autocheckpoint=4000: WALが約16MB（4000ページ）に達するまでチェックポイントを遅らせる
+# - foreign_keys=ON: 外部キー制約を有効にする（SQLiteの既定は無効）
+CONNECTION_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-64000;
+    PRAGMA mmap_size=268435456;
+    PRAGMA wal_autocheckpoint=4000;
+    PRAGMA foreign_keys=ON;
+"""
+
+# 読み取り専用接続に適用するPRAGMA（ファイルへの書き込みを伴う設定は除く）
+READ_ONLY_PRAGMAS = """
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-64000;
+    PRAGMA mmap_size=268435456;
+"""
+
+# INSERT ... RETURNING が使えるか（SQLite 3.35以降）
+_SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# 接続ごとにキャッシュするプリペアドステートメント数
+STATEMENT_CACHE_SIZE = 128
+
+# 読み書き用・読み取り専用の接続プール（スレッドごとに1本ずつ接続を保持する）
+_rw_pool = SQLiteConnectionPool(CONNECTION_PRAGMAS, STATEMENT_CACHE_SIZE)
+_ro_pool = SQLiteConnectionPool(READ_ONLY_PRAGMAS, STATEMENT_CACHE_SIZE)
+
+# スレッドごとのトランザクション状態（セーブポイントの深さなど）を保持する領域
+_local = threading.local()
+
 
 
 def get_connection() -> sqlite3.Connection:
     """
     データベース接続を取得する関数
 
+    接続プールから現在のスレッド用の接続を取り出します。
+    接続はスレッドごとに使い回し、プロセス終了時にまとめて閉じます。
+
     Returns:
         sqlite3.Connection: データベース接続オブジェクト
 
     Note:
-        row_factory を sqlite3.Row に設定することで、
-        カラム名でアクセスできるようになります（例: row['name']）
+        row_factory を sqlite3.Row に設定しているため、
+        カラム名でアクセスできます（例: row['name']）
+        isolation_level=None（自動コミットモード）のため、
+        各文は実行時点で確定します。
     """
     # データベースファイルに接続（ファイルがなければ自動作成される）
-    conn = sqlite3.connect(DATABASE_PATH)
-    # 辞書形式でデータを取得できるように設定
-    conn.row_factory = sqlite3.Row
-    return conn
+    return _rw_pool.get(DATABASE_PATH)
+
+
+def _in_transaction() -> bool:
+    """
+    現在のスレッドの書き込み用接続がトランザクション中か確認する
+
+    接続を新しく開かずに確認するため、読み取りしかしないスレッドでは
+    書き込み用接続を開きません。
+
+    Returns:
+        bool: トランザクション中の場合True（未接続の場合はFalse）
+    """
+    conn = _rw_pool.peek()
+    return conn is not None and conn.in_transaction
+
+
+def get_ro_connection() -> sqlite3.Connection:
+    """
+    読み取り専用のデータベース接続を取得する関数
+
+    一覧取得などの読み取りは、書き込み用とは別の mode=ro 接続で行います。
+    WALモードでは読み取り専用接続は書き込み中もブロックされないため、
+    バックグラウンドの記憶保存と管理画面の表示が並行して動けます。
+    接続はスレッドごとに1本を使い回します。
+
+    以下の場合は書き込み用接続（get_connection）を返します。
+    - 書き込み用接続がトランザクション中（未確定の変更を読めるようにするため）
+    - インメモリDBなどファイル以外のデータベース、またはファイルが未作成
+
+    Returns:
+        sqlite3.Connection: データベース接続オブジェクト
+    """
+    if _in_transaction():
+        return _rw_pool.peek()
+
+    if (DATABASE_PATH == ':memory:' or DATABASE_PATH.startswith('file:')
+            or not os.path.exists(DATABASE_PATH)):
+        return get_connection()
+
+    uri = f"file:{pathname2url(os.path.abspath(DATABASE_PATH))}?mode=ro"
+    return _ro_pool.get(uri)
+
+
+def close_all_connections():
+    """
+    開いている全ての接続を閉じる
+
+    プロセス終了時に自動で呼ばれます。SQLite接続はフォークをまたいで
+    使えないため、アプリを読み込んだ後にフォークする場合
+    （gunicorn の preload_app など）はフォーク前にも呼び出します。
+    """
+    _rw_pool.close_all()
+    _ro_pool.close_all()
+
+
+atexit.register(close_all_connections)
+
+
+@contextmanager
+def write_batch():
+    """
+    複数の書き込みを1つのトランザクションにまとめるコンテキストマネージャー
+
+    ブロック内で呼ばれたCRUD関数の変更は、ブロックを抜けた時点で
+    1回のコミットでまとめて確定します（例外時はロールバック）。
+    1件ずつ自動コミットするとコミットごとにディスク同期が発生するため、
+    まとまった書き込みを行う処理で使用します。
+
+    既にトランザクション中の場合はセーブポイントを使って入れ子にします。
+
+    使用例:
+        with write_batch():
+            add_attribute("名前", "田中太郎")
+            add_memory("ラーメンが好き", "preference")
+    """
+    conn = get_connection()
+
+    if conn.in_transaction:
+        # 入れ子の場合はセーブポイントで部分的に確定・取り消しする
+        depth = getattr(_local, 'savepoint_depth', 0) + 1
+        _local.savepoint_depth = depth
+        savepoint = f"write_batch_{depth}"
+        conn.execute(f"SAVEPOINT {savepoint}")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+            raise
+        else:
+            conn.execute(f"RELEASE {savepoint}")
+        finally:
+            _local.savepoint_depth = depth - 1
+        return
+
+    # 書き込みロックを先に確保し、途中でのロック昇格失敗を防ぐ
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+    finally:
+        # トランザクション中に他スレッドがキャッシュした確定前の状態を捨てる
+        pending = getattr(_local, 'pending_invalidations', None)
+        _local.pending_invalidations = set()
+        for table in pending or ():
+            _invalidate(table)
+
+
+def _fetch_dicts(cursor: sqlite3.Cursor) -> List[Dict[str, Any]]:
+    """
+    実行済みカーソルの結果を辞書のリストとして取り出す
+
+    sqlite3.Row を経由して dict(row) に変換すると、行ごとに
+    Row オブジェクトの生成とカラム名の対応付けが二重に発生するため、
+    タプルで取得してからカラム名と組み合わせて1回で辞書にします。
+
+    Args:
+        cursor: SELECT文を実行済みのカーソル
+
+    Returns:
+        List[Dict]: 1行1辞書のリスト
+    """
+    # Row を作らずタプルのまま取得する
+    cursor.row_factory = None
+    columns = [description[0] for description in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _page_params(limit: Optional[int], offset: int) -> Tuple[int, int]:
+    """
+    一覧取得SQLの LIMIT ? OFFSET ? に渡す値を返す
+
+    Args:
+        limit: 取得する最大件数（Noneの場合は全件）
+        offset: 先頭から読み飛ばす件数
+
+    Returns:
+        Tuple[int, int]: (LIMIT値, OFFSET値)。SQLiteでは LIMIT -1 が無制限を表す
+    """
+    return (-1 if limit is None else limit, offset)
+
+
+# ==================================================
+# クエリ結果キャッシュ
+# ==================================================
+
+# テーブルごとのキャッシュ {テーブル名: {キー: (有効期限, 結果)}}
+_query_cache: Dict[str, Dict[tuple, Tuple[float, List[Dict[str, Any]]]]] = {}
+# テーブルごとの世代番号（更新のたびに進め、取得中に更新された結果を保存しないために使う）
+_cache_generation: Dict[str, int] = {}
+# _query_cache と _cache_generation を保護するロック
+_cache_lock = threading.Lock()
+
+
+def _invalidate(table: Optional[str] = None):
+    """
+    テーブルのクエリ結果キャッシュを破棄する
+
+    トランザクション中に呼ばれた場合は、確定（または取り消し）の
+    時点でもう一度破棄するよう記録します。
+
+    Args:
+        table: 対象テーブル名（Noneの場合は全テーブル）
+    """
+    if table is not None and _in_transaction():
+        if not hasattr(_local, 'pending_invalidations'):
+            _local.pending_invalidations = set()
+        _local.pending_invalidations.add(table)
+
+    with _cache_lock:
+        tables = list(_query_cache) if table is None else [table]
+        for name in tables:
+            _query_cache.pop(name, None)
+            _cache_generation[name] = _cache_generation.get(name, 0) + 1
+
+
+def _cached_query(table: str):
+    """
+    一覧取得関数の結果をTTL付きでキャッシュするデコレーター
+
+    キーには呼び出し引数とDBパスを含めます。トランザクション中は
+    確定前の状態をキャッシュしないよう、常にDBから取得します。
+    返すリストは呼び出しごとに複製しますが、各行の辞書は共有されるため
+    呼び出し側で書き換えないでください。
+
+    Args:
+        table: 結果が依存するテーブル名（_invalidate に渡す名前）
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _in_transaction():
+                return func(*args, **kwargs)
+
+            key = (DATABASE_PATH, func.__name__, args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            with _cache_lock:
+                entry = _query_cache.get(table, {}).get(key)
+                generation = _cache_generation.get(table, 0)
+            if entry is not None and entry[0] > now:
+                return list(entry[1])
+
+            result = func(*args, **kwargs)
+
+            with _cache_lock:
+                # 取得中に更新があった場合は古い結果になり得るため保存しない
+                if _cache_generation.get(table, 0) == generation:
+                    _query_cache.setdefault(table, {})[key] = (
+                        now + QUERY_CACHE_TTL_SECONDS, result
+                    )
+            return list(result)
+        return wrapper
+    return decorator
+
+
+# ==================================================
+# スキーマ定義
+# ==================================================
+
+# 全テーブル・インデックスの作成文
+# executescript で1回にまとめて実行し、1トランザクションで確定する
+SCHEMA_DDL = '''
+BEGIN;
+
+-- ===== user_attributes テーブル =====
+-- ユーザーの属性（名前、年齢、職業など固定的な情報）
+CREATE TABLE IF NOT EXISTS user_attributes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    attribute_name TEXT NOT NULL,          -- 属性名（例: "名前", "年齢"）
+    attribute_value TEXT NOT NULL,         -- 属性値（例: "田中太郎", "30歳"）
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- 作成日時
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- 更新日時
+    compression_level INTEGER DEFAULT 0    -- 圧縮レベル（0:なし, 1:軽度, 2:中度, 3:強度）
+);
+-- 一覧取得（更新日時の降順）用のインデックス
+CREATE INDEX IF NOT EXISTS idx_attr_updated
+ON user_attributes(updated_at DESC);
+-- 属性名は一意（一意インデックス作成前に、同名の古い行を除去しておく）
+DELETE FROM user_attributes
+WHERE id NOT IN (
+    SELECT MAX(id) FROM user_attributes GROUP BY attribute_name
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_attr_name
+ON user_attributes(attribute_name);
+
+-- ===== user_memories テーブル =====
+-- ユーザーの記憶（日常的な出来事、好み、経験など）
+CREATE TABLE IF NOT EXISTS user_memories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    memory_content TEXT NOT NULL,          -- 記憶の内容
+    memory_category TEXT DEFAULT 'general', -- カテゴリ（general, preference, event等）
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_accessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- 最終アクセス日時
+    access_count INTEGER DEFAULT 0,        -- アクセス回数（重要度の指標）
+    compression_level INTEGER DEFAULT 0,
+    is_active INTEGER DEFAULT 1,           -- アクティブフラグ（0:削除済み, 1:有効）
+    content_hash TEXT                      -- 内容のSHA-1（完全一致の重複検出用）
+);
+-- 有効な記憶を更新日時の降順で取得するためのインデックス
+CREATE INDEX IF NOT EXISTS idx_mem_active_updated
+ON user_memories(is_active, updated_at DESC);
+
+-- ===== user_goals テーブル =====
+-- ユーザーの目標（達成したいこと、やりたいこと）
+CREATE TABLE IF NOT EXISTS user_goals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    goal_content TEXT NOT NULL,            -- 目標の内容
+    goal_status TEXT DEFAULT 'active',     -- 状態（active, completed, cancelled）
+    priority INTEGER DEFAULT 5,            -- 優先度（1:最高 ～ 10:最低）
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP,                -- 完了日時
+    compression_level INTEGER DEFAULT 0
+);
+-- 状態で絞り込み、優先度・更新日時順に並べるためのインデックス
+CREATE INDEX IF NOT EXISTS idx_goals_status_pri
+ON user_goals(goal_status, priority, updated_at DESC);
+
+-- ===== assistant_requests テーブル =====
+-- アシスタントへのお願い（話し方、対応方法など）
+CREATE TABLE IF NOT EXISTS assistant_requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    request_content TEXT NOT NULL,         -- お願いの内容
+    request_category TEXT DEFAULT 'general', -- カテゴリ（tone, behavior, format等）
+    is_active INTEGER DEFAULT 1,           -- 有効フラグ
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+-- 有効なお願いを更新日時の降順で取得するためのインデックス
+CREATE INDEX IF NOT EXISTS idx_req_active_updated
+ON assistant_requests(is_active, updated_at DESC);
+
+-- ===== llm_cache テーブル =====
+-- 情報整理（整形・圧縮）やチャットでのLLMの出力（プロンプトのハッシュで引く）
+CREATE TABLE IF NOT EXISTS llm_cache (
+    hash TEXT PRIMARY KEY,                 -- プロンプト（チャットはリクエスト全体）のハッシュ
+    output TEXT NOT NULL,                  -- LLMの出力
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMIT;
+'''
 
 
 def init_database():
@@ -49,70 +411,312 @@ def init_database():
     conn = get_connection()
     cursor = conn.cursor()
 
-    # ===== user_attributes テーブル =====
-    # ユーザーの属性（名前、年齢、職業など固定的な情報）
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_attributes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            attribute_name TEXT NOT NULL,          -- 属性名（例: "名前", "年齢"）
-            attribute_value TEXT NOT NULL,         -- 属性値（例: "田中太郎", "30歳"）
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- 作成日時
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- 更新日時
-            compression_level INTEGER DEFAULT 0    -- 圧縮レベル（0:なし, 1:軽度, 2:中度, 3:強度）
-        )
-    ''')
-
-    # ===== user_memories テーブル =====
-    # ユーザーの記憶（日常的な出来事、好み、経験など）
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_memories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            memory_content TEXT NOT NULL,          -- 記憶の内容
-            memory_category TEXT DEFAULT 'general', -- カテゴリ（general, preference, event等）
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_accessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- 最終アクセス日時
-            access_count INTEGER DEFAULT 0,        -- アクセス回数（重要度の指標）
-            compression_level INTEGER DEFAULT 0,
-            is_active INTEGER DEFAULT 1            -- アクティブフラグ（0:削除済み, 1:有効）
-        )
-    ''')
-
-    # ===== user_goals テーブル =====
-    # ユーザーの目標（達成したいこと、やりたいこと）
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_goals (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            goal_content TEXT NOT NULL,            -- 目標の内容
-            goal_status TEXT DEFAULT 'active',     -- 状態（active, completed, cancelled）
-            priority INTEGER DEFAULT 5,            -- 優先度（1:最高 ～ 10:最低）
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            completed_at TIMESTAMP,                -- 完了日時
-            compression_level INTEGER DEFAULT 0
-        )
-    ''')
-
-    # ===== assistant_requests テーブル =====
-    # アシスタントへのお願い（話し方、対応方法など）
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS assistant_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            request_content TEXT NOT NULL,         -- お願いの内容
-            request_category TEXT DEFAULT 'general', -- カテゴリ（tone, behavior, format等）
-            is_active INTEGER DEFAULT 1,           -- 有効フラグ
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    # WALモード等の設定をデータベースファイルに適用
+    cursor.executescript(CONNECTION_PRAGMAS)
+
+    # テーブルとインデックスをまとめて作成
+    cursor.executescript(SCHEMA_DDL)
 
-    # 変更をコミット（保存）
-    conn.commit()
-    conn.close()
+    # 既存のデータベースにも記憶の内容ハッシュ列とインデックスを用意する
+    _migrate_memory_content_hash(conn)
+
+    # クエリプランナー用の統計情報を必要に応じて更新する
+    cursor.execute('PRAGMA optimize')
 
     print("データベースの初期化が完了しました")
 
 
+def _migrate_memory_content_hash(conn: sqlite3.Connection):
+    """
+    user_memories に内容ハッシュの列とインデックスを用意する
+
+    content_hash 列がない古いデータベースでは列を追加し、既存の記憶の
+    ハッシュを埋めます。インデックスは列の追加後に作成する必要があるため、
+    SCHEMA_DDL とは別に実行します。
+
+    Args:
+        conn: データベース接続
+    """
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(user_memories)')}
+
+    with write_batch():
+        if 'content_hash' not in columns:
+            conn.execute(SQL_ADD_MEMORY_CONTENT_HASH)
+            rows = conn.execute(SQL_SELECT_MEMORY_CONTENTS).fetchall()
+            conn.executemany(
+                SQL_SET_MEMORY_CONTENT_HASH,
+                [(_content_hash(content), memory_id) for memory_id, content in rows]
+            )
+        conn.execute(SQL_CREATE_MEMORY_CONTENT_HASH_INDEX)
+
+
+def optimize_database():
+    """
+    データベースの定期メンテナンスを行う関数
+
+    クエリプランナーの統計情報を更新し、WALファイルの内容を
+    本体に書き戻してWALを切り詰めます。長時間稼働するサーバーで
+    1日1回程度呼び出すことを想定しています。
+    保持期間を過ぎたLLM出力キャッシュもここで削除します。
+    """
+    prune_llm_cache(LLM_CACHE_MAX_AGE_DAYS)
+
+    conn = get_connection()
+    conn.execute('PRAGMA optimize')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+# ==================================================
+# SQL文定義
+# ==================================================
+# SQL文はモジュール定数として1か所にまとめ、毎回同じ文字列を渡すことで
+# 接続ごとのステートメントキャッシュ（cached_statements）を効かせます。
+
+# ----- user_attributes -----
+SQL_UPSERT_ATTRIBUTE_RETURNING = '''
+    INSERT INTO user_attributes (attribute_name, attribute_value)
+    VALUES (?, ?)
+    ON CONFLICT(attribute_name) DO UPDATE SET
+        attribute_value = excluded.attribute_value,
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING id
+'''
+SQL_UPSERT_ATTRIBUTE = '''
+    INSERT INTO user_attributes (attribute_name, attribute_value)
+    VALUES (?, ?)
+    ON CONFLICT(attribute_name) DO UPDATE SET
+        attribute_value = excluded.attribute_value,
+        updated_at = CURRENT_TIMESTAMP
+'''
+SQL_SELECT_ATTRIBUTE_ID = 'SELECT id FROM user_attributes WHERE attribute_name = ?'
+SQL_SELECT_ATTRIBUTES = '''
+    SELECT * FROM user_attributes
+    ORDER BY updated_at DESC, id DESC
+    LIMIT ? OFFSET ?
+'''
+SQL_UPDATE_ATTRIBUTE = '''
+    UPDATE user_attributes
+    SET attribute_value = ?, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ? AND attribute_value IS NOT ?
+'''
+SQL_DELETE_ATTRIBUTE = 'DELETE FROM user_attributes WHERE id = ?'
+
+# ----- user_memories -----
+# 同じ内容の有効な記憶がある場合は追加しない（content_hash のインデックスで判定）
+SQL_INSERT_MEMORY = '''
+    INSERT INTO user_memories (memory_content, memory_category, content_hash)
+    SELECT ?1, ?2, ?3
+    WHERE NOT EXISTS (
+        SELECT 1 FROM user_memories WHERE content_hash = ?3 AND is_active = 1
+    )
+'''
+SQL_SELECT_MEMORY_ID_BY_HASH = '''
+    SELECT id FROM user_memories
+    WHERE content_hash = ? AND is_active = 1
+'''
+SQL_SELECT_ACTIVE_MEMORIES = '''
+    SELECT * FROM user_memories
+    WHERE is_active = 1
+    ORDER BY updated_at DESC, id DESC
+    LIMIT ? OFFSET ?
+'''
+SQL_SELECT_ALL_MEMORIES = '''
+    SELECT * FROM user_memories
+    ORDER BY updated_at DESC, id DESC
+    LIMIT ? OFFSET ?
+'''
+SQL_SELECT_RECENT_MEMORIES = '''
+    SELECT * FROM user_memories
+    WHERE is_active = 1
+    ORDER BY updated_at DESC
+    LIMIT ?
+'''
+# 経過日数から目標の圧縮レベルを求め、今より圧縮が必要な記憶だけを返す
+# （julianday は「YYYY-MM-DD HH:MM:SS」形式とISO 8601形式のどちらも解釈できる）
+SQL_SELECT_MEMORIES_NEEDING_COMPRESSION = '''
+    SELECT * FROM (
+        SELECT *,
+            CASE
+                WHEN age_days >= :ancient AND compression_level < 3 THEN 3
+                WHEN age_days >= :old AND compression_level < 2 THEN 2
+                WHEN age_days >= :medium AND compression_level < 1 THEN 1
+            END AS target_level
+        FROM (
+            SELECT *, julianday('now') - julianday(created_at) AS age_days
+            FROM user_memories
+            WHERE is_active = 1 AND compression_level < 3
+        )
+    )
+    WHERE target_level IS NOT NULL
+    ORDER BY id
+'''
+SQL_UPDATE_MEMORY = '''
+    UPDATE user_memories
+    SET memory_content = ?, content_hash = ?, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ? AND memory_content IS NOT ?
+'''
+SQL_DELETE_MEMORY = 'DELETE FROM user_memories WHERE id = ?'
+SQL_DEACTIVATE_MEMORY = '''
+    UPDATE user_memories
+    SET is_active = 0, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+'''
+SQL_INCREMENT_MEMORY_ACCESS = '''
+    UPDATE user_memories
+    SET access_count = access_count + 1,
+        last_accessed_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+'''
+# content_hash 列の追加（古いデータベースの移行用）
+SQL_ADD_MEMORY_CONTENT_HASH = 'ALTER TABLE user_memories ADD COLUMN content_hash TEXT'
+SQL_SELECT_MEMORY_CONTENTS = 'SELECT id, memory_content FROM user_memories'
+SQL_SET_MEMORY_CONTENT_HASH = 'UPDATE user_memories SET content_hash = ? WHERE id = ?'
+# 有効な記憶だけを対象にした内容ハッシュのインデックス
+SQL_CREATE_MEMORY_CONTENT_HASH_INDEX = '''
+    CREATE INDEX IF NOT EXISTS idx_mem_content_hash
+    ON user_memories(content_hash) WHERE is_active = 1
+'''
+
+# ----- user_goals -----
+SQL_INSERT_GOAL = '''
+    INSERT INTO user_goals (goal_content, priority)
+    VALUES (?, ?)
+'''
+SQL_SELECT_GOALS_BY_STATUS = '''
+    SELECT * FROM user_goals
+    WHERE goal_status = ?
+    ORDER BY priority ASC, updated_at DESC, id DESC
+    LIMIT ? OFFSET ?
+'''
+SQL_SELECT_ALL_GOALS = '''
+    SELECT * FROM user_goals
+    ORDER BY priority ASC, updated_at DESC, id DESC
+    LIMIT ? OFFSET ?
+'''
+SQL_DELETE_GOAL = 'DELETE FROM user_goals WHERE id = ?'
+
+
+def _build_update_goal_sql(content: bool, status: bool, completed: bool,
+                           priority: bool) -> str:
+    """
+    update_goal 用のUPDATE文を組み立てる（モジュール読み込み時のみ使用）
+
+    Args:
+        content: goal_content を更新するか
+        status: goal_status を更新するか
+        completed: completed_at を現在時刻にするか（status が完了の場合）
+        priority: priority を更新するか
+
+    Returns:
+        str: UPDATE文（プレースホルダーは上記の順、最後がID）
+    """
+    updates = []
+    if content:
+        updates.append('goal_content = ?')
+    if status:
+        updates.append('goal_status = ?')
+    if completed:
+        updates.append('completed_at = CURRENT_TIMESTAMP')
+    if priority:
+        updates.append('priority = ?')
+    # 更新日時は常に更新
+    updates.append('updated_at = CURRENT_TIMESTAMP')
+    return f'''
+    UPDATE user_goals
+    SET {', '.join(updates)}
+    WHERE id = ?
+'''
+
+
+# update_goal の全組み合わせのSQL文
+# キーは (内容, 状態, 完了日時, 優先度) を更新するかどうか。
+# 呼び出しごとにSQL文字列を組み立てないため、文のキャッシュが効く
+SQL_UPDATE_GOAL = {
+    (content, status, status and completed, priority): _build_update_goal_sql(
+        content, status, status and completed, priority
+    )
+    for content in (False, True)
+    for status in (False, True)
+    for completed in (False, True)
+    for priority in (False, True)
+}
+
+# ----- assistant_requests -----
+SQL_INSERT_REQUEST = '''
+    INSERT INTO assistant_requests (request_content, request_category)
+    VALUES (?, ?)
+'''
+SQL_SELECT_ACTIVE_REQUESTS = '''
+    SELECT * FROM assistant_requests
+    WHERE is_active = 1
+    ORDER BY updated_at DESC, id DESC
+    LIMIT ? OFFSET ?
+'''
+SQL_SELECT_ALL_REQUESTS = '''
+    SELECT * FROM assistant_requests
+    ORDER BY updated_at DESC, id DESC
+    LIMIT ? OFFSET ?
+'''
+SQL_UPDATE_REQUEST = '''
+    UPDATE assistant_requests
+    SET request_content = ?, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ? AND request_content IS NOT ?
+'''
+SQL_DELETE_REQUEST = 'DELETE FROM assistant_requests WHERE id = ?'
+
+# ----- llm_cache -----
+# 件数によらず同じSQL文になるよう、ハッシュのリストはJSON配列で渡す
+SQL_SELECT_LLM_CACHE = '''
+    SELECT hash, output FROM llm_cache
+    WHERE hash IN (SELECT value FROM json_each(?))
+'''
+# 保存してから一定時間内の出力を、保存からの経過秒数とともに取得する（チャットの応答用）
+SQL_SELECT_RECENT_LLM_OUTPUT = '''
+    SELECT output, (julianday('now') - julianday(created_at)) * 86400
+    FROM llm_cache
+    WHERE hash = ? AND created_at >= datetime('now', ?)
+'''
+SQL_UPSERT_LLM_CACHE = '''
+    INSERT OR REPLACE INTO llm_cache (hash, output)
+    VALUES (?, ?)
+'''
+SQL_DELETE_OLD_LLM_CACHE = '''
+    DELETE FROM llm_cache
+    WHERE created_at < datetime('now', ?)
+'''
+
+# 圧縮レベル更新（テーブル名は埋め込みのため、許可するテーブルごとに事前生成）
+SQL_UPDATE_COMPRESSION_LEVEL = {
+    table_name: f'''
+    UPDATE {table_name}
+    SET compression_level = ?, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+'''
+    for table_name in ('user_attributes', 'user_memories', 'user_goals')
+}
+
+# レコードの存在確認（内容が同じで更新を省略した場合の成否判定に使う）
+SQL_RECORD_EXISTS = {
+    table_name: f'SELECT 1 FROM {table_name} WHERE id = ?'
+    for table_name in ('user_attributes', 'user_memories', 'assistant_requests')
+}
+
+
+def _record_exists(table_name: str, record_id: int) -> bool:
+    """
+    指定IDのレコードが存在するか確認する
+
+    Args:
+        table_name: テーブル名（SQL_RECORD_EXISTS のキー）
+        record_id: レコードID
+
+    Returns:
+        bool: 存在する場合True
+    """
+    cursor = get_connection().execute(SQL_RECORD_EXISTS[table_name], (record_id,))
+    return cursor.fetchone() is not None
+
+
 # ==================================================
 # ユーザー属性（user_attributes）の操作関数
 # ==================================================
@@ -131,51 +735,62 @@ def add_attribute(attribute_name: str, attribute_value: str) -> int:
     conn = get_connection()
     cursor = conn.cursor()
 
-    # 同じ属性名が既に存在するかチェック
-    cursor.execute(
-        'SELECT id FROM user_attributes WHERE attribute_name = ?',
-        (attribute_name,)
-    )
-    existing = cursor.fetchone()
-
-    if existing:
-        # 既存の属性を更新
-        cursor.execute('''
-            UPDATE user_attributes
-            SET attribute_value = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE attribute_name = ?
-        ''', (attribute_value, attribute_name))
-        record_id = existing['id']
+    # 属性名の一意インデックスを使い、挿入と更新を1文で行う
+    if _SUPPORTS_RETURNING:
+        cursor.execute(SQL_UPSERT_ATTRIBUTE_RETURNING, (attribute_name, attribute_value))
+        record_id = cursor.fetchone()[0]
     else:
-        # 新しい属性を挿入
-        cursor.execute('''
-            INSERT INTO user_attributes (attribute_name, attribute_value)
-            VALUES (?, ?)
-        ''', (attribute_name, attribute_value))
-        record_id = cursor.lastrowid
-
-    conn.commit()
-    conn.close()
+        # RETURNING非対応の古いSQLiteではIDを引き直す
+        cursor.execute(SQL_UPSERT_ATTRIBUTE, (attribute_name, attribute_value))
+        cursor.execute(SQL_SELECT_ATTRIBUTE_ID, (attribute_name,))
+        record_id = cursor.fetchone()[0]
+
+    _invalidate('user_attributes')
     return record_id
 
 
-def get_all_attributes() -> List[Dict[str, Any]]:
+def add_attributes_bulk(rows: List[Tuple[str, str]]) -> int:
+    """
+    複数のユーザー属性をまとめて追加する
+
+    同じ属性名が既にある場合は add_attribute と同様に値を更新します。
+    1件ずつ追加するとコミットが件数分発生するため、
+    executemany で1トランザクションにまとめます。
+
+    Args:
+        rows: (属性名, 属性値) のリスト
+
+    Returns:
+        int: 追加・更新した件数
+    """
+    if not rows:
+        return 0
+
+    with write_batch() as conn:
+        conn.executemany(SQL_UPSERT_ATTRIBUTE, rows)
+        _invalidate('user_attributes')
+
+    return len(rows)
+
+
+@_cached_query('user_attributes')
+def get_all_attributes(limit: Optional[int] = None,
+                       offset: int = 0) -> List[Dict[str, Any]]:
     """
     全てのユーザー属性を取得する
 
+    Args:
+        limit: 取得する最大件数（Noneの場合は全件）
+        offset: 先頭から読み飛ばす件数
+
     Returns:
         List[Dict]: 属性のリスト
     """
-    conn = get_connection()
+    conn = get_ro_connection()
     cursor = conn.cursor()
 
-    cursor.execute('SELECT * FROM user_attributes ORDER BY updated_at DESC')
-    rows = cursor.fetchall()
-
-    conn.close()
-
-    # sqlite3.Row を辞書に変換
-    return [dict(row) for row in rows]
+    cursor.execute(SQL_SELECT_ATTRIBUTES, _page_params(limit, offset))
+    return _fetch_dicts(cursor)
 
 
 def update_attribute(attribute_id: int, attribute_value: str) -> bool:
@@ -192,16 +807,14 @@ def update_attribute(attribute_id: int, attribute_value: str) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute('''
-        UPDATE user_attributes
-        SET attribute_value = ?, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (attribute_value, attribute_id))
+    # 値が変わらない場合はUPDATEせず、WALへの書き込みとキャッシュ破棄を省く
+    cursor.execute(SQL_UPDATE_ATTRIBUTE, (attribute_value, attribute_id, attribute_value))
+    if cursor.rowcount > 0:
+        _invalidate('user_attributes')
+        return True
 
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
-    return success
+    # 更新されなかった場合は、レコードが存在すれば（値が同じだけなら）成功とする
+    return _record_exists('user_attributes', attribute_id)
 
 
 def delete_attribute(attribute_id: int) -> bool:
@@ -217,11 +830,10 @@ def delete_attribute(attribute_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute('DELETE FROM user_attributes WHERE id = ?', (attribute_id,))
+    cursor.execute(SQL_DELETE_ATTRIBUTE, (attribute_id,))
+    _invalidate('user_attributes')
 
     success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
     return success
 
 
@@ -229,57 +841,115 @@ def delete_attribute(attribute_id: int) -> bool:
 # ユーザー記憶（user_memories）の操作関数
 # ==================================================
 
+def _content_hash(content: str) -> str:
+    """
+    記憶の内容から重複検出用のハッシュを求める
+
+    Args:
+        content: 記憶の内容
+
+    Returns:
+        str: SHA-1の16進文字列
+    """
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
 def add_memory(memory_content: str, memory_category: str = 'general') -> int:
     """
     ユーザーの記憶を追加する
 
+    同じ内容の有効な記憶が既にある場合は追加せず、既存の記憶のIDを返します。
+
     Args:
         memory_content: 記憶の内容
         memory_category: カテゴリ（デフォルト: 'general'）
 
     Returns:
-        int: 追加されたレコードのID
+        int: 追加されたレコード（または既存のレコード）のID
     """
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute('''
-        INSERT INTO user_memories (memory_content, memory_category)
-        VALUES (?, ?)
-    ''', (memory_content, memory_category))
+    content_hash = _content_hash(memory_content)
+    cursor.execute(SQL_INSERT_MEMORY, (memory_content, memory_category, content_hash))
+    if cursor.rowcount > 0:
+        return cursor.lastrowid
+
+    cursor.execute(SQL_SELECT_MEMORY_ID_BY_HASH, (content_hash,))
+    return cursor.fetchone()[0]
 
-    record_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return record_id
 
+def add_memories_bulk(rows: List[Tuple[str, str]]) -> int:
+    """
+    複数の記憶をまとめて追加する
+
+    同じ内容の有効な記憶が既にあるもの（同じ rows 内の重複を含む）は追加しません。
+
+    Args:
+        rows: (記憶の内容, カテゴリ) のリスト
+
+    Returns:
+        int: 追加した件数
+    """
+    if not rows:
+        return 0
+
+    with write_batch() as conn:
+        cursor = conn.executemany(SQL_INSERT_MEMORY, [
+            (content, category, _content_hash(content))
+            for content, category in rows
+        ])
+        return cursor.rowcount
 
-def get_all_memories(active_only: bool = True) -> List[Dict[str, Any]]:
+
+def get_all_memories(active_only: bool = True, limit: Optional[int] = None,
+                     offset: int = 0) -> List[Dict[str, Any]]:
     """
     全ての記憶を取得する
 
     Args:
         active_only: Trueの場合、有効な記憶のみ取得
+        limit: 取得する最大件数（Noneの場合は全件）
+        offset: 先頭から読み飛ばす件数
 
     Returns:
         List[Dict]: 記憶のリスト
     """
-    conn = get_connection()
+    conn = get_ro_connection()
     cursor = conn.cursor()
 
     if active_only:
-        cursor.execute('''
-            SELECT * FROM user_memories
-            WHERE is_active = 1
-            ORDER BY updated_at DESC
-        ''')
+        cursor.execute(SQL_SELECT_ACTIVE_MEMORIES, _page_params(limit, offset))
     else:
-        cursor.execute('SELECT * FROM user_memories ORDER BY updated_at DESC')
+        cursor.execute(SQL_SELECT_ALL_MEMORIES, _page_params(limit, offset))
 
-    rows = cursor.fetchall()
-    conn.close()
+    return _fetch_dicts(cursor)
+
+
+def get_memories_needing_compression(medium_days: int, old_days: int,
+                                     ancient_days: int) -> List[Dict[str, Any]]:
+    """
+    圧縮が必要な有効な記憶を、目標の圧縮レベル付きで取得する
+
+    経過日数の判定をSQL側で行い、対象の記憶だけを読み込みます。
+
+    Args:
+        medium_days: 圧縮レベル1にする経過日数
+        old_days: 圧縮レベル2にする経過日数
+        ancient_days: 圧縮レベル3にする経過日数
+
+    Returns:
+        List[Dict]: 記憶のリスト（各記憶の target_level に目標の圧縮レベル、
+            age_days に経過日数が入る）
+    """
+    conn = get_ro_connection()
+    cursor = conn.execute(SQL_SELECT_MEMORIES_NEEDING_COMPRESSION, {
+        'medium': medium_days,
+        'old': old_days,
+        'ancient': ancient_days
+    })
 
-    return [dict(row) for row in rows]
+    return _fetch_dicts(cursor)
 
 
 def get_recent_memories(limit: int = 10) -> List[Dict[str, Any]]:
@@ -292,20 +962,12 @@ def get_recent_memories(limit: int = 10) -> List[Dict[str, Any]]:
     Returns:
         List[Dict]: 記憶のリスト
     """
-    conn = get_connection()
+    conn = get_ro_connection()
     cursor = conn.cursor()
 
-    cursor.execute('''
-        SELECT * FROM user_memories
-        WHERE is_active = 1
-        ORDER BY updated_at DESC
-        LIMIT ?
-    ''', (limit,))
-
-    rows = cursor.fetchall()
-    conn.close()
+    cursor.execute(SQL_SELECT_RECENT_MEMORIES, (limit,))
 
-    return [dict(row) for row in rows]
+    return _fetch_dicts(cursor)
 
 
 def update_memory(memory_id: int, memory_content: str) -> bool:
@@ -322,16 +984,16 @@ def update_memory(memory_id: int, memory_content: str) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute('''
-        UPDATE user_memories
-        SET memory_content = ?, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (memory_content, memory_id))
+    # 内容が変わらない場合はUPDATEせず、WALへの書き込みを省く
+    cursor.execute(
+        SQL_UPDATE_MEMORY,
+        (memory_content, _content_hash(memory_content), memory_id, memory_content)
+    )
+    if cursor.rowcount > 0:
+        return True
 
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
-    return success
+    # 更新されなかった場合は、レコードが存在すれば（内容が同じだけなら）成功とする
+    return _record_exists('user_memories', memory_id)
 
 
 def delete_memory(memory_id: int, hard_delete: bool = False) -> bool:
@@ -350,18 +1012,12 @@ def delete_memory(memory_id: int, hard_delete: bool = False) -> bool:
 
     if hard_delete:
         # 物理削除（完全に削除）
-        cursor.execute('DELETE FROM user_memories WHERE id = ?', (memory_id,))
+        cursor.execute(SQL_DELETE_MEMORY, (memory_id,))
     else:
         # 論理削除（is_activeを0に設定）
-        cursor.execute('''
-            UPDATE user_memories
-            SET is_active = 0, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (memory_id,))
+        cursor.execute(SQL_DEACTIVATE_MEMORY, (memory_id,))
 
     success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
     return success
 
 
@@ -372,18 +1028,8 @@ def increment_memory_access(memory_id: int):
     Args:
         memory_id: 記憶のID
     """
-    conn = get_connection()
-    cursor = conn.cursor()
+    get_connection().execute(SQL_INCREMENT_MEMORY_ACCESS, (memory_id,))
 
-    cursor.execute('''
-        UPDATE user_memories
-        SET access_count = access_count + 1,
-            last_accessed_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (memory_id,))
-
-    conn.commit()
-    conn.close()
 
 
 # ==================================================
@@ -404,46 +1050,57 @@ def add_goal(goal_content: str, priority: int = 5) -> int:
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute('''
-        INSERT INTO user_goals (goal_content, priority)
-        VALUES (?, ?)
-    ''', (goal_content, priority))
+    cursor.execute(SQL_INSERT_GOAL, (goal_content, priority))
+    _invalidate('user_goals')
 
     record_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
     return record_id
 
 
-def get_all_goals(status_filter: Optional[str] = None) -> List[Dict[str, Any]]:
+def add_goals_bulk(rows: List[Tuple[str, int]]) -> int:
+    """
+    複数の目標をまとめて追加する
+
+    Args:
+        rows: (目標の内容, 優先度) のリスト
+
+    Returns:
+        int: 追加した件数
+    """
+    if not rows:
+        return 0
+
+    with write_batch() as conn:
+        conn.executemany(SQL_INSERT_GOAL, rows)
+        _invalidate('user_goals')
+
+    return len(rows)
+
+
+@_cached_query('user_goals')
+def get_all_goals(status_filter: Optional[str] = None, limit: Optional[int] = None,
+                  offset: int = 0) -> List[Dict[str, Any]]:
     """
     全ての目標を取得する
 
     Args:
         status_filter: 状態フィルタ（'active', 'completed', 'cancelled'）
+        limit: 取得する最大件数（Noneの場合は全件）
+        offset: 先頭から読み飛ばす件数
 
     Returns:
         List[Dict]: 目標のリスト
     """
-    conn = get_connection()
+    conn = get_ro_connection()
     cursor = conn.cursor()
 
     if status_filter:
-        cursor.execute('''
-            SELECT * FROM user_goals
-            WHERE goal_status = ?
-            ORDER BY priority ASC, updated_at DESC
-        ''', (status_filter,))
+        cursor.execute(SQL_SELECT_GOALS_BY_STATUS,
+                       (status_filter,) + _page_params(limit, offset))
     else:
-        cursor.execute('''
-            SELECT * FROM user_goals
-            ORDER BY priority ASC, updated_at DESC
-        ''')
-
-    rows = cursor.fetchall()
-    conn.close()
+        cursor.execute(SQL_SELECT_ALL_GOALS, _page_params(limit, offset))
 
-    return [dict(row) for row in rows]
+    return _fetch_dicts(cursor)
 
 
 def update_goal(goal_id: int, goal_content: str = None,
@@ -463,41 +1120,23 @@ def update_goal(goal_id: int, goal_content: str = None,
     conn = get_connection()
     cursor = conn.cursor()
 
-    # 更新するフィールドを動的に構築
-    updates = []
-    values = []
-
-    if goal_content is not None:
-        updates.append('goal_content = ?')
-        values.append(goal_content)
-
-    if goal_status is not None:
-        updates.append('goal_status = ?')
-        values.append(goal_status)
-        # 完了状態の場合、完了日時を設定
-        if goal_status == 'completed':
-            updates.append('completed_at = CURRENT_TIMESTAMP')
-
-    if priority is not None:
-        updates.append('priority = ?')
-        values.append(priority)
-
-    # 更新日時は常に更新
-    updates.append('updated_at = CURRENT_TIMESTAMP')
-
-    # 値にIDを追加
-    values.append(goal_id)
-
-    # SQL実行
-    cursor.execute(f'''
-        UPDATE user_goals
-        SET {', '.join(updates)}
-        WHERE id = ?
-    ''', values)
+    # 更新するフィールドの組み合わせに対応するSQL文を選ぶ
+    completed = goal_status == 'completed'
+    sql = SQL_UPDATE_GOAL[(
+        goal_content is not None,
+        goal_status is not None,
+        completed,
+        priority is not None
+    )]
+    values = tuple(
+        value for value in (goal_content, goal_status, priority)
+        if value is not None
+    ) + (goal_id,)
+
+    cursor.execute(sql, values)
+    _invalidate('user_goals')
 
     success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
     return success
 
 
@@ -514,11 +1153,10 @@ def delete_goal(goal_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute('DELETE FROM user_goals WHERE id = ?', (goal_id,))
+    cursor.execute(SQL_DELETE_GOAL, (goal_id,))
+    _invalidate('user_goals')
 
     success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
     return success
 
 
@@ -540,43 +1178,56 @@ def add_request(request_content: str, request_category: str = 'general') -> int:
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute('''
-        INSERT INTO assistant_requests (request_content, request_category)
-        VALUES (?, ?)
-    ''', (request_content, request_category))
+    cursor.execute(SQL_INSERT_REQUEST, (request_content, request_category))
+    _invalidate('assistant_requests')
 
     record_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
     return record_id
 
 
-def get_all_requests(active_only: bool = True) -> List[Dict[str, Any]]:
+def add_requests_bulk(rows: List[Tuple[str, str]]) -> int:
+    """
+    複数のお願いをまとめて追加する
+
+    Args:
+        rows: (お願いの内容, カテゴリ) のリスト
+
+    Returns:
+        int: 追加した件数
+    """
+    if not rows:
+        return 0
+
+    with write_batch() as conn:
+        conn.executemany(SQL_INSERT_REQUEST, rows)
+        _invalidate('assistant_requests')
+
+    return len(rows)
+
+
+@_cached_query('assistant_requests')
+def get_all_requests(active_only: bool = True, limit: Optional[int] = None,
+                     offset: int = 0) -> List[Dict[str, Any]]:
     """
     全てのお願いを取得する
 
     Args:
         active_only: Trueの場合、有効なお願いのみ取得
+        limit: 取得する最大件数（Noneの場合は全件）
+        offset: 先頭から読み飛ばす件数
 
     Returns:
         List[Dict]: お願いのリスト
     """
-    conn = get_connection()
+    conn = get_ro_connection()
     cursor = conn.cursor()
 
     if active_only:
-        cursor.execute('''
-            SELECT * FROM assistant_requests
-            WHERE is_active = 1
-            ORDER BY updated_at DESC
-        ''')
+        cursor.execute(SQL_SELECT_ACTIVE_REQUESTS, _page_params(limit, offset))
     else:
-        cursor.execute('SELECT * FROM assistant_requests ORDER BY updated_at DESC')
-
-    rows = cursor.fetchall()
-    conn.close()
+        cursor.execute(SQL_SELECT_ALL_REQUESTS, _page_params(limit, offset))
 
-    return [dict(row) for row in rows]
+    return _fetch_dicts(cursor)
 
 
 def update_request(request_id: int, request_content: str) -> bool:
@@ -593,16 +1244,14 @@ def update_request(request_id: int, request_content: str) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute('''
-        UPDATE assistant_requests
-        SET request_content = ?, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (request_content, request_id))
+    # 内容が変わらない場合はUPDATEせず、WALへの書き込みとキャッシュ破棄を省く
+    cursor.execute(SQL_UPDATE_REQUEST, (request_content, request_id, request_content))
+    if cursor.rowcount > 0:
+        _invalidate('assistant_requests')
+        return True
 
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
-    return success
+    # 更新されなかった場合は、レコードが存在すれば（内容が同じだけなら）成功とする
+    return _record_exists('assistant_requests', request_id)
 
 
 def delete_request(request_id: int) -> bool:
@@ -618,14 +1267,103 @@ def delete_request(request_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute('DELETE FROM assistant_requests WHERE id = ?', (request_id,))
+    cursor.execute(SQL_DELETE_REQUEST, (request_id,))
+    _invalidate('assistant_requests')
 
     success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
     return success
 
 
+# ==================================================
+# LLM出力キャッシュ（llm_cache）の操作関数
+# ==================================================
+
+def prompt_hash(prompt: str, model: str = '') -> str:
+    """
+    LLM出力キャッシュのキーにするプロンプトのハッシュを求める
+
+    Args:
+        prompt: プロンプト
+        model: 出力を生成するモデル名（モデルを変えたときに古い出力を使わないため）
+
+    Returns:
+        str: SHA-1の16進文字列
+    """
+    if model:
+        return _content_hash(f"{model}\n{prompt}")
+    return _content_hash(prompt)
+
+
+def get_cached_llm_outputs(hashes: List[str]) -> Dict[str, str]:
+    """
+    キャッシュ済みのLLM出力をまとめて取得する
+
+    Args:
+        hashes: プロンプトのハッシュのリスト
+
+    Returns:
+        Dict[str, str]: {ハッシュ: 出力}（キャッシュにないものは含まない）
+    """
+    if not hashes:
+        return {}
+
+    conn = get_ro_connection()
+    cursor = conn.execute(SQL_SELECT_LLM_CACHE, (json.dumps(hashes),))
+
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def get_recent_llm_output(key: str, max_age_seconds: int) -> Optional[Tuple[str, float]]:
+    """
+    保存してから一定時間内のLLM出力を取得する
+
+    Args:
+        key: プロンプト（チャットはリクエスト全体）のハッシュ
+        max_age_seconds: この秒数より前に保存した出力は返さない
+
+    Returns:
+        Optional[Tuple[str, float]]: (出力, 保存からの経過秒数)（ない場合はNone）
+    """
+    conn = get_ro_connection()
+    row = conn.execute(SQL_SELECT_RECENT_LLM_OUTPUT,
+                       (key, f'-{max_age_seconds} seconds')).fetchone()
+    return (row[0], row[1]) if row is not None else None
+
+
+def save_llm_outputs(rows: List[Tuple[str, str]]) -> int:
+    """
+    LLM出力をまとめてキャッシュに保存する
+
+    Args:
+        rows: (プロンプトのハッシュ, 出力) のリスト
+
+    Returns:
+        int: 保存した件数
+    """
+    if not rows:
+        return 0
+
+    with write_batch() as conn:
+        conn.executemany(SQL_UPSERT_LLM_CACHE, rows)
+
+    return len(rows)
+
+
+def prune_llm_cache(max_age_days: int) -> int:
+    """
+    保持期間を過ぎたLLM出力キャッシュを削除する
+
+    Args:
+        max_age_days: 保持する日数
+
+    Returns:
+        int: 削除した件数
+    """
+    with write_batch() as conn:
+        cursor = conn.execute(SQL_DELETE_OLD_LLM_CACHE, (f'-{max_age_days} days',))
+        return cursor.rowcount
+
+
 # ==================================================
 # 圧縮レベル更新関数
 # ==================================================
@@ -644,25 +1382,54 @@ def update_compression_level(table_name: str, record_id: int,
         bool: 更新成功時True
     """
     # SQLインジェクション対策: テーブル名をホワイトリストでチェック
-    allowed_tables = ['user_attributes', 'user_memories', 'user_goals']
-    if table_name not in allowed_tables:
+    if table_name not in SQL_UPDATE_COMPRESSION_LEVEL:
         raise ValueError(f"不正なテーブル名: {table_name}")
 
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute(f'''
-        UPDATE {table_name}
-        SET compression_level = ?, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (compression_level, record_id))
+    cursor.execute(
+        SQL_UPDATE_COMPRESSION_LEVEL[table_name],
+        (compression_level, record_id)
+    )
+    _invalidate(table_name)
 
     success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
     return success
 
 
+def update_compression_levels_bulk(table_name: str,
+                                   items: List[Tuple[int, int]]) -> int:
+    """
+    複数レコードの圧縮レベルをまとめて更新する
+
+    1件ずつ update_compression_level を呼ぶと更新ごとにコミットが
+    発生するため、executemany で1トランザクションにまとめます。
+
+    Args:
+        table_name: テーブル名
+        items: (レコードID, 新しい圧縮レベル) のリスト
+
+    Returns:
+        int: 更新されたレコード数
+    """
+    # SQLインジェクション対策: テーブル名をホワイトリストでチェック
+    if table_name not in SQL_UPDATE_COMPRESSION_LEVEL:
+        raise ValueError(f"不正なテーブル名: {table_name}")
+
+    if not items:
+        return 0
+
+    with write_batch() as conn:
+        cursor = conn.executemany(
+            SQL_UPDATE_COMPRESSION_LEVEL[table_name],
+            [(compression_level, record_id)
+             for record_id, compression_level in items]
+        )
+        _invalidate(table_name)
+        return cursor.rowcount
+
+
 # スクリプトとして実行された場合、データベースを初期化
 if __name__ == '__main__':
     init_database()
@@ -0,0 +1,151 @@
+"""
+SQLite接続プールモジュール
+========================
+SQLite接続をスレッドごとに1本ずつ保持し、使い回します。
+
+リクエストのたびに接続・切断するとファイルオープンや
+ページキャッシュの再構築が毎回発生するため、
+開いた接続はそのスレッドで再利用し、プロセス終了時にまとめて閉じます。
+"""
+
+import sqlite3
+import threading
+import weakref
+from typing import Optional
+
+
+class _PooledConnection(sqlite3.Connection):
+    """
+    プールが保持するSQLite接続
+
+    sqlite3.Connection は弱参照を作れないため、サブクラス化しています。
+    終了したスレッドの接続は弱参照の集合から自動的に外れ、GCで閉じられます。
+    """
+
+
+class SQLiteConnectionPool:
+    """
+    スレッドごとのSQLite接続プール
+
+    SQLite接続はスレッド間で共有すると排他が必要になるため、
+    スレッドごとに専用の接続を割り当てます。
+    接続を開いた時点でPRAGMAを1回だけ適用します。
+
+    使用例:
+        pool = SQLiteConnectionPool("PRAGMA journal_mode=WAL;")
+        conn = pool.get("ai_secretary.db")
+    """
+
+    def __init__(self, pragmas: str = "", statement_cache_size: int = 128):
+        """
+        プールを初期化
+
+        Args:
+            pragmas: 接続を開いたときに実行するPRAGMA（executescript形式）
+            statement_cache_size: 接続ごとにキャッシュするプリペアドステートメント数
+        """
+        self.pragmas = pragmas
+        self.statement_cache_size = statement_cache_size
+        # スレッドごとの接続を保持する領域
+        self._local = threading.local()
+        # 開いている全ての接続（close_all でまとめて閉じるため）
+        self._connections: "weakref.WeakSet[_PooledConnection]" = weakref.WeakSet()
+        # _connections を保護するロック
+        self._lock = threading.Lock()
+        # close_all のたびに進める世代番号（閉じた接続を使い続けないため）
+        self._generation = 0
+
+    def get(self, database: str) -> sqlite3.Connection:
+        """
+        現在のスレッドの接続を取得する
+
+        未接続、前回と異なるデータベースを指定した場合、
+        または close_all で閉じられた後は新しく接続します。
+
+        Args:
+            database: データベースファイルのパス、または file: 形式のURI
+
+        Returns:
+            sqlite3.Connection: データベース接続オブジェクト
+
+        Note:
+            row_factory は sqlite3.Row、isolation_level=None（自動コミットモード）です。
+        """
+        conn = getattr(self._local, 'conn', None)
+
+        if (conn is None or self._local.database != database
+                or self._local.generation != self._generation):
+            if conn is not None:
+                self._discard(conn)
+
+            conn = self._open(database)
+            self._local.conn = conn
+            self._local.database = database
+            self._local.generation = self._generation
+            with self._lock:
+                self._connections.add(conn)
+
+        return conn
+
+    def peek(self) -> Optional[sqlite3.Connection]:
+        """
+        現在のスレッドの接続を、新しく開かずに返す
+
+        Returns:
+            Optional[sqlite3.Connection]: 接続（未接続または閉じられた場合はNone）
+        """
+        if getattr(self._local, 'generation', None) != self._generation:
+            return None
+        return getattr(self._local, 'conn', None)
+
+    def _open(self, database: str) -> sqlite3.Connection:
+        """
+        新しい接続を開いてPRAGMAを適用する
+
+        Args:
+            database: データベースファイルのパス、または file: 形式のURI
+
+        Returns:
+            sqlite3.Connection: 開いた接続
+        """
+        # uri=True でも file: で始まらない文字列は通常のファイルパスとして扱われる
+        conn = sqlite3.connect(
+            database,
+            uri=True,
+            check_same_thread=False,
+            isolation_level=None,
+            factory=_PooledConnection,
+            cached_statements=self.statement_cache_size
+        )
+        # 辞書形式でデータを取得できるように設定
+        conn.row_factory = sqlite3.Row
+        if self.pragmas:
+            conn.executescript(self.pragmas)
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection):
+        """
+        接続を閉じて管理対象から外す
+
+        Args:
+            conn: 閉じる接続
+        """
+        with self._lock:
+            self._connections.discard(conn)
+        conn.close()
+
+    def close_all(self):
+        """
+        開いている全ての接続を閉じる
+
+        各スレッドは次回の get で新しく接続し直します。
+        """
+        with self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+            self._generation += 1
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
@@ -63,6 +63,19 @@ class ExtractedMemories(BaseModel):
     )
 
 
+class TurnExtractedMemories(ExtractedMemories):
+    """1件の会話から抽出された記憶情報（バッチ抽出用）"""
+    turn: int = Field(description="抽出元の会話の番号（1始まり）")
+
+
+class BatchExtractedMemories(BaseModel):
+    """複数の会話からまとめて抽出された記憶情報"""
+    results: List[TurnExtractedMemories] = Field(
+        description="会話ごとの抽出結果のリスト",
+        default_factory=list
+    )
+
+
 # memory_organizer用のモデル
 
 class DuplicatePair(BaseModel):
@@ -109,3 +122,31 @@ class MergedContent(BaseModel):
 class CompressedContent(BaseModel):
     """圧縮されたコンテンツ"""
     compressed: str = Field(description="圧縮されたコンテンツ")
+
+
+class FormattedItem(BaseModel):
+    """整形されたテキスト（複数項目をまとめて整形する場合の1件分）"""
+    id: int = Field(description="アイテムのID")
+    formatted: str = Field(description="整形されたテキスト")
+
+
+class FormattedTextList(BaseModel):
+    """整形されたテキストのリスト"""
+    items: List[FormattedItem] = Field(
+        description="アイテムごとの整形結果のリスト",
+        default_factory=list
+    )
+
+
+class CompressedItem(BaseModel):
+    """圧縮されたコンテンツ（複数項目をまとめて圧縮する場合の1件分）"""
+    id: int = Field(description="アイテムのID")
+    compressed: str = Field(description="圧縮されたコンテンツ")
+
+
+class CompressedContentList(BaseModel):
+    """圧縮されたコンテンツのリスト"""
+    items: List[CompressedItem] = Field(
+        description="アイテムごとの圧縮結果のリスト",
+        default_factory=list
+    )
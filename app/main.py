@@ -13,26 +13,42 @@ Flaskを使用したWebチャットアプリケーションです。
 - 記憶整理機能
 """
 
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, g
 from datetime import datetime, timedelta
+from typing import Optional
 import sys
 import os
 import json
+import re
+import multiprocessing
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# プロジェクトルートをパスに追加
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+# プロジェクトルート（直接実行したときだけパスに追加する）
 project_root = os.path.dirname(os.path.dirname(__file__))
-sys.path.insert(0, project_root)
+if __name__ == '__main__':
+    sys.path.insert(0, project_root)
 
 # 設定と各モジュールをインポート
 from config import (
     SECRET_KEY,
     SESSION_TIMEOUT_SECONDS,
     RESET_TRIGGER_WORDS,
-    DEFAULT_TEST_MODE
+    DEFAULT_TEST_MODE,
+    DB_MAINTENANCE_INTERVAL_SECONDS,
+    ADMIN_PAGE_SIZE,
+    ADMIN_MAX_PAGE_SIZE,
+    DEBUG,
+    SERVER_HOST,
+    SERVER_PORT
 )
 from app.database import (
     init_database,
+    optimize_database,
     get_all_attributes,
     get_all_memories,
     get_all_goals,
@@ -60,8 +76,66 @@ from app.memory_extractor import get_memory_extractor
 from app.memory_organizer import get_memory_organizer
 
 
-# グローバル変数：記憶処理の状態
-is_memory_processing = False
+# 記憶処理を実行中のワーカー数（ワーカースレッドが増減し、状態確認APIが読み取る）
+# 共有メモリ上に置くため、アプリを読み込んでからフォークした複数のワーカープロセス
+# （gunicorn の preload_app など）でも同じ値を参照できる
+memory_processing_count = multiprocessing.Value('i', 0)
+
+# 記憶抽出用のワーカー（SQLiteの書き込みは1本に絞るため1スレッドのみ）
+# 発言ごとにスレッドを生成せず、キューに積んで順番に処理する
+_memory_executor = ThreadPoolExecutor(
+    max_workers=1,
+    thread_name_prefix='memory-extractor'
+)
+
+# チャット応答用のコンテキスト取得ワーカー
+# 記憶抽出のキューに並ばないよう、抽出用とは別に用意する
+_context_executor = ThreadPoolExecutor(
+    max_workers=4,
+    thread_name_prefix='context-loader'
+)
+
+# 履歴リセットのトリガーワード（いずれかを含むか1回の走査で判定する。重複は除く）
+# トリガーワードがない場合は何にも一致しないパターンにする
+_RESET_TRIGGER_RE = re.compile(
+    '|'.join(map(re.escape, dict.fromkeys(RESET_TRIGGER_WORDS))) or r'(?!)'
+)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    orjson でJSONを変換するFlask用プロバイダ
+
+    jsonify のたびに標準の json モジュールで辞書を走査すると
+    ログや管理画面のデータが大きいときに時間がかかるため、C実装の orjson に置き換えます。
+    orjson が扱えない型は DefaultJSONProvider.default で変換します。
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        """
+        オブジェクトをJSON文字列に変換する
+
+        Args:
+            obj: 変換するオブジェクト
+
+        Returns:
+            str: JSON文字列
+        """
+        return orjson.dumps(
+            obj, default=self.default, option=orjson.OPT_NON_STR_KEYS
+        ).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        """
+        JSON文字列をオブジェクトに変換する
+
+        Args:
+            s: JSON文字列またはバイト列
+
+        Returns:
+            変換したオブジェクト
+        """
+        return orjson.loads(s)
 
 
 # Flaskアプリケーションを作成
@@ -71,12 +145,52 @@ app = Flask(
     static_folder=os.path.join(project_root, 'static')
 )
 app.secret_key = SECRET_KEY
+# レスポンスのJSON変換に orjson を使う
+app.json = OrjsonProvider(app)
 
 # データベースを初期化
 # データベースを初期化
 init_database()
 
 
+def _schedule_periodic(interval: float, task, name: str):
+    """
+    処理を一定間隔で繰り返し実行するよう予約する
+
+    実行後に次回分を予約し直します。例外が発生しても次回の予約は続けます。
+
+    Args:
+        interval: 実行間隔（秒）
+        task: 実行する関数（引数なし）
+        name: ログ出力用の処理名
+    """
+    def run_task():
+        try:
+            task()
+        except Exception as e:
+            print(f"{name} failed: {e}")
+        finally:
+            _schedule_periodic(interval, task, name)
+
+    timer = threading.Timer(interval, run_task)
+    # サーバー終了を妨げないようにデーモンスレッドで実行する
+    timer.daemon = True
+    timer.start()
+
+
+def start_background_jobs():
+    """
+    定期実行する処理を開始する
+
+    import 時には開始せず、サーバーを起動するプロセスから呼び出します。
+    （gunicorn は preload_app でマスタープロセスがアプリを読み込むため、
+      ワーカーをフォークした後の post_fork で呼び出す）
+    """
+    # データベースの定期メンテナンス（統計更新・WALの切り詰め）
+    _schedule_periodic(DB_MAINTENANCE_INTERVAL_SECONDS, optimize_database,
+                       'Database maintenance')
+
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     """グローバルな例外ハンドラー"""
@@ -101,25 +215,24 @@ def handle_exception(e):
 # ヘルパー関数
 # ==================================================
 
-def should_reset_history(user_input: str, last_input_time: datetime) -> bool:
+def should_reset_history(user_input: str, last_input_time: Optional[float]) -> bool:
     """
     履歴をリセットすべきか判定する
 
     Args:
         user_input: ユーザーの入力
-        last_input_time: 最後の入力時刻
+        last_input_time: 最後の入力時刻（UNIX時刻の秒数、未入力ならNone）
 
     Returns:
         bool: リセットすべき場合True
     """
     # トリガーワードをチェック
-    for trigger in RESET_TRIGGER_WORDS:
-        if trigger in user_input:
-            return True
+    if _RESET_TRIGGER_RE.search(user_input):
+        return True
 
     # タイムアウトをチェック
     if last_input_time:
-        elapsed = (datetime.now() - last_input_time).total_seconds()
+        elapsed = time.time() - last_input_time
         if elapsed >= SESSION_TIMEOUT_SECONDS:
             return True
 
@@ -145,6 +258,21 @@ def format_history_for_display(history: list) -> list:
     ]
 
 
+def is_test_mode() -> bool:
+    """
+    現在のリクエストがテストモードか判定する
+
+    セッションからの読み取りは1リクエストにつき1回だけ行い、
+    結果を flask.g に保持して使い回します。
+
+    Returns:
+        bool: テストモードの場合True
+    """
+    if 'test_mode' not in g:
+        g.test_mode = bool(session.get('test_mode', DEFAULT_TEST_MODE))
+    return g.test_mode
+
+
 # ==================================================
 # メインページ（チャット）
 # ==================================================
@@ -179,13 +307,19 @@ def chat():
     if not user_input:
         return jsonify({'error': 'メッセージが空です'}), 400
 
+    # MCPでコンテキストを取得（履歴の判定などと並行して読み込みを開始する）
+    mcp_handler = get_mcp_handler()
+    context_future = _context_executor.submit(mcp_handler.get_formatted_context)
+
     # テストモードのログ
-    test_logs = [] if session.get('test_mode') else None
+    test_logs = [] if is_test_mode() else None
 
     # セッションから履歴を取得
     history = session.get('history', [])
-    last_input_time_str = session.get('last_input_time')
-    last_input_time = datetime.fromisoformat(last_input_time_str) if last_input_time_str else None
+    last_input_time = session.get('last_input_time')
+    # 旧形式（ISO文字列）のセッションは未入力として扱う
+    if not isinstance(last_input_time, (int, float)):
+        last_input_time = None
 
     # 履歴リセットの判定
     history_reset = False
@@ -199,17 +333,6 @@ def chat():
                 'timestamp': datetime.now().isoformat()
             })
 
-    # MCPでコンテキストを取得
-    mcp_handler = get_mcp_handler()
-    context = mcp_handler.get_formatted_context()
-
-    if test_logs is not None:
-        test_logs.append({
-            'type': 'mcp_context',
-            'context': context,
-            'timestamp': datetime.now().isoformat()
-        })
-
     # Ollamaクライアントを取得
     ollama_client = get_ollama_client()
 
@@ -218,12 +341,25 @@ def chat():
         # 記憶抽出ログもクリア（新しいチャットのため）
         get_memory_extractor().clear_logs()
 
+    # LLM呼び出しの直前でコンテキストの読み込み完了を待つ
+    context = context_future.result()
+
+    if test_logs is not None:
+        test_logs.append({
+            'type': 'mcp_context',
+            'context': context,
+            'timestamp': datetime.now().isoformat()
+        })
+
     # AIの応答を生成
     ai_response = ollama_client.generate(
         prompt=user_input,
         system_prompt=DEFAULT_SYSTEM_PROMPT,
         context=context,
-        history=history
+        history=history,
+        # Ollamaの通信ログはテストモードのときだけ記録する
+        # （クライアントは全リクエストで共有するため、test_mode は書き換えない）
+        log=test_logs is not None
     )
 
     if test_logs is not None:
@@ -237,26 +373,37 @@ def chat():
     history.append({'role': 'user', 'content': user_input})
     history.append({'role': 'assistant', 'content': ai_response})
 
-    # 最後の入力時刻を更新
-    session['last_input_time'] = datetime.now().isoformat()
+    # 最後の入力時刻を更新（UNIX時刻の秒数で保持し、次回はパースせずに比較する）
+    session['last_input_time'] = time.time()
     session['history'] = history
 
     # 記憶の抽出・保存を非同期で実行（ユーザーが応答を読む間に）
+    extractor = get_memory_extractor()
+    # 直前のAI応答を取得（history[-3]がユーザー入力前のAI応答）
+    # history: [..., AI(prev), User(curr), AI(curr)]
+    # インデックス: -3, -2, -1
+    prev_ai_response = history[-3]['content'] if len(history) >= 3 else ""
+    # 記憶抽出ログはテストモードのときだけ記録する
+    # （抽出は別スレッドで後から行うため、記録の有無は会話と一緒にキューへ入れる）
+    extractor.enqueue_input(user_input, prev_ai_response, log=test_logs is not None)
+
     def extract_and_save():
-        global is_memory_processing
-        is_memory_processing = True
+        with memory_processing_count.get_lock():
+            memory_processing_count.value += 1
         try:
-            extractor = get_memory_extractor()
-            # 直前のAI応答を取得（history[-3]がユーザー入力前のAI応答）
-            # history: [..., AI(prev), User(curr), AI(curr)]
-            # インデックス: -3, -2, -1
-            prev_ai_response = history[-3]['content'] if len(history) >= 3 else ""
-            extractor.process_input(user_input, prev_ai_response)
+            # 前回の抽出中に溜まった会話もまとめて処理する
+            # （先に実行されたジョブが処理済みの場合は何もしない）
+            extractor.process_pending()
+        except Exception:
+            # ワーカー内の例外は Future に保持されて表に出ないため、ここで出力する
+            import traceback
+            print(f"Memory extraction failed: {traceback.format_exc()}")
         finally:
-            is_memory_processing = False
+            with memory_processing_count.get_lock():
+                memory_processing_count.value -= 1
 
     # バックグラウンドで記憶抽出を実行
-    threading.Thread(target=extract_and_save).start()
+    _memory_executor.submit(extract_and_save)
 
     # レスポンスを構築
     response_data = {
@@ -306,9 +453,10 @@ def test_mode():
     if request.method == 'POST':
         data = request.get_json()
         session['test_mode'] = data.get('enabled', False)
+        g.test_mode = bool(session['test_mode'])
         return jsonify({'test_mode': session['test_mode']})
     else:
-        return jsonify({'test_mode': session.get('test_mode', DEFAULT_TEST_MODE)})
+        return jsonify({'test_mode': is_test_mode()})
 
 
 # ==================================================
@@ -323,26 +471,78 @@ def admin():
     return render_template('admin.html')
 
 
+# 管理画面APIのテーブル名と操作関数の対応表
+# 各テーブルについて 取得・追加・更新・削除 の関数を定義する
+# - get: (取得件数, 読み飛ばす件数) -> レコードのリスト
+# - add: (リクエストデータ) -> 追加したID
+# - update: (レコードID, リクエストデータ) -> 成否
+# - delete: (レコードID) -> 成否
+TABLE_HANDLERS = {
+    'attributes': {
+        'get': lambda limit, offset: get_all_attributes(limit=limit, offset=offset),
+        'add': lambda d: add_attribute(d['name'], d['value']),
+        'update': lambda i, d: update_attribute(i, d['value']),
+        'delete': delete_attribute,
+    },
+    'memories': {
+        'get': lambda limit, offset: get_all_memories(
+            active_only=False, limit=limit, offset=offset
+        ),
+        'add': lambda d: add_memory(d['content'], d.get('category', 'general')),
+        'update': lambda i, d: update_memory(i, d['content']),
+        'delete': lambda i: delete_memory(i, hard_delete=True),
+    },
+    'goals': {
+        'get': lambda limit, offset: get_all_goals(limit=limit, offset=offset),
+        'add': lambda d: add_goal(d['content'], d.get('priority', 5)),
+        'update': lambda i, d: update_goal(
+            i,
+            goal_content=d.get('content'),
+            goal_status=d.get('status'),
+            priority=d.get('priority')
+        ),
+        'delete': delete_goal,
+    },
+    'requests': {
+        'get': lambda limit, offset: get_all_requests(
+            active_only=False, limit=limit, offset=offset
+        ),
+        'add': lambda d: add_request(d['content'], d.get('category', 'general')),
+        'update': lambda i, d: update_request(i, d['content']),
+        'delete': delete_request,
+    },
+}
+
+
 @app.route('/api/data/<table_name>', methods=['GET'])
 def get_data(table_name):
     """
-    テーブルデータを取得
+    テーブルデータを1ページ分取得
+
+    クエリパラメータ:
+        page: ページ番号（1始まり、デフォルト1）
+        page_size: 1ページの件数（デフォルト ADMIN_PAGE_SIZE、上限 ADMIN_MAX_PAGE_SIZE）
 
     Args:
         table_name: テーブル名（attributes, memories, goals, requests）
+
+    Returns:
+        data: レコードのリスト
+        next_cursor: 次のページ番号（最終ページの場合はnull）
     """
-    if table_name == 'attributes':
-        data = get_all_attributes()
-    elif table_name == 'memories':
-        data = get_all_memories(active_only=False)
-    elif table_name == 'goals':
-        data = get_all_goals()
-    elif table_name == 'requests':
-        data = get_all_requests(active_only=False)
-    else:
+    handlers = TABLE_HANDLERS.get(table_name)
+    if handlers is None:
         return jsonify({'error': '不正なテーブル名'}), 400
 
-    return jsonify({'data': data})
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = request.args.get('page_size', ADMIN_PAGE_SIZE, type=int)
+    page_size = min(max(page_size, 1), ADMIN_MAX_PAGE_SIZE)
+
+    # 1件多く取得して次のページがあるかを判定する
+    rows = handlers['get'](page_size + 1, (page - 1) * page_size)
+    next_cursor = page + 1 if len(rows) > page_size else None
+
+    return jsonify({'data': rows[:page_size], 'next_cursor': next_cursor})
 
 
 @app.route('/api/data/<table_name>', methods=['POST'])
@@ -353,19 +553,11 @@ def add_data(table_name):
     Args:
         table_name: テーブル名
     """
-    data = request.get_json()
-
-    if table_name == 'attributes':
-        record_id = add_attribute(data['name'], data['value'])
-    elif table_name == 'memories':
-        record_id = add_memory(data['content'], data.get('category', 'general'))
-    elif table_name == 'goals':
-        record_id = add_goal(data['content'], data.get('priority', 5))
-    elif table_name == 'requests':
-        record_id = add_request(data['content'], data.get('category', 'general'))
-    else:
+    handlers = TABLE_HANDLERS.get(table_name)
+    if handlers is None:
         return jsonify({'error': '不正なテーブル名'}), 400
 
+    record_id = handlers['add'](request.get_json())
     return jsonify({'success': True, 'id': record_id})
 
 
@@ -378,24 +570,11 @@ def update_data(table_name, record_id):
         table_name: テーブル名
         record_id: レコードID
     """
-    data = request.get_json()
-
-    if table_name == 'attributes':
-        success = update_attribute(record_id, data['value'])
-    elif table_name == 'memories':
-        success = update_memory(record_id, data['content'])
-    elif table_name == 'goals':
-        success = update_goal(
-            record_id,
-            goal_content=data.get('content'),
-            goal_status=data.get('status'),
-            priority=data.get('priority')
-        )
-    elif table_name == 'requests':
-        success = update_request(record_id, data['content'])
-    else:
+    handlers = TABLE_HANDLERS.get(table_name)
+    if handlers is None:
         return jsonify({'error': '不正なテーブル名'}), 400
 
+    success = handlers['update'](record_id, request.get_json())
     return jsonify({'success': success})
 
 
@@ -408,17 +587,11 @@ def remove_data(table_name, record_id):
         table_name: テーブル名
         record_id: レコードID
     """
-    if table_name == 'attributes':
-        success = delete_attribute(record_id)
-    elif table_name == 'memories':
-        success = delete_memory(record_id, hard_delete=True)
-    elif table_name == 'goals':
-        success = delete_goal(record_id)
-    elif table_name == 'requests':
-        success = delete_request(record_id)
-    else:
+    handlers = TABLE_HANDLERS.get(table_name)
+    if handlers is None:
         return jsonify({'error': '不正なテーブル名'}), 400
 
+    success = handlers['delete'](record_id)
     return jsonify({'success': success})
 
 
@@ -426,8 +599,26 @@ def remove_data(table_name, record_id):
 # 情報整理機能
 # ==================================================
 
-# グローバル変数：記憶整理の状態
-is_organizing = False
+# 情報整理用のワーカー（LLMを何度も呼ぶ長時間処理のため、リクエストスレッドから切り離す）
+_organize_executor = ThreadPoolExecutor(
+    max_workers=1,
+    thread_name_prefix='memory-organizer'
+)
+# 実行中（または最後に実行した）情報整理のFuture
+_organize_future = None
+# _organize_future の確認と差し替えを保護するロック
+_organize_lock = threading.Lock()
+
+
+def _is_organizing() -> bool:
+    """
+    情報整理が実行中（または実行待ち）か判定する
+
+    Returns:
+        bool: 実行中の場合True
+    """
+    return _organize_future is not None and not _organize_future.done()
+
 
 @app.route('/organize', methods=['POST'])
 def organize_memories():
@@ -435,23 +626,17 @@ def organize_memories():
     ユーザー情報の整理・圧縮を実行（属性/エピソード/目標/お願いの全て）
     バックグラウンドで実行され、ステータスは /organize/status で確認します
     """
-    global is_organizing
-    if is_organizing:
-        return jsonify({'error': '既に実行中です'}), 409
-
+    global _organize_future
     organizer = get_memory_organizer()
-    organizer.clear_logs()
 
-    def run_organize():
-        global is_organizing
-        is_organizing = True
-        try:
-            organizer.organize_all()
-        finally:
-            is_organizing = False
+    # 確認と投入の間に別リクエストが割り込まないようにロックする
+    with _organize_lock:
+        if _is_organizing():
+            return jsonify({'error': '既に実行中です'}), 409
 
-    # バックグラウンドで実行
-    threading.Thread(target=run_organize).start()
+        organizer.clear_logs()
+        # バックグラウンドで実行
+        _organize_future = _organize_executor.submit(organizer.organize_all)
 
     return jsonify({
         'status': 'started',
@@ -465,10 +650,17 @@ def get_organize_status():
     情報整理の進捗状況を取得
     """
     organizer = get_memory_organizer()
-    return jsonify({
-        'is_organizing': is_organizing,
+    response = {
+        'is_organizing': _is_organizing(),
         'logs': organizer.get_logs()
-    })
+    }
+
+    # 前回の整理が例外で終了していればエラー内容を返す
+    future = _organize_future
+    if future is not None and future.done() and future.exception() is not None:
+        response['error'] = str(future.exception())
+
+    return jsonify(response)
 
 
 # ==================================================
@@ -485,7 +677,7 @@ def system_status():
     return jsonify({
         'ollama_connected': ollama_client.check_connection(),
         'available_models': ollama_client.get_available_models(),
-        'test_mode': session.get('test_mode', DEFAULT_TEST_MODE),
+        'test_mode': is_test_mode(),
         'session_timeout': SESSION_TIMEOUT_SECONDS
     })
 
@@ -495,14 +687,12 @@ def get_processing_status():
     """
     記憶処理の実行状態を取得
     """
-    global is_memory_processing
-    
     response = {
-        'processing': is_memory_processing
+        'processing': memory_processing_count.value > 0
     }
     
     # テストモードならログを含める
-    if session.get('test_mode'):
+    if is_test_mode():
         extractor = get_memory_extractor()
         response['logs'] = extractor.get_logs()
         
@@ -527,9 +717,11 @@ if __name__ == '__main__':
 
     print("")
     print("サーバーを起動します...")
-    print("ブラウザで http://localhost:5000 にアクセスしてください")
+    print(f"ブラウザで http://localhost:{SERVER_PORT} にアクセスしてください")
     print("終了するには Ctrl+C を押してください")
     print("")
 
-    # Flaskサーバーを起動
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    start_background_jobs()
+
+    # Flaskサーバーを起動（本番環境では gunicorn -c gunicorn.conf.py を使用）
+    app.run(debug=DEBUG, host=SERVER_HOST, port=SERVER_PORT, threaded=True)
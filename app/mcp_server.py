@@ -19,9 +19,10 @@ import os
 import json
 from typing import Any
 
-# プロジェクトルートをパスに追加
+# 直接実行したときだけプロジェクトルートをパスに追加
 project_root = os.path.dirname(os.path.dirname(__file__))
-sys.path.insert(0, project_root)
+if __name__ == '__main__':
+    sys.path.insert(0, project_root)
 
 from mcp_tools.memory_tools import (
     get_user_context,
@@ -139,11 +140,9 @@ class MCPToolHandler:
                 - result: 実行結果データ
                 - error: エラーメッセージ（失敗時）
         """
-        if arguments is None:
-            arguments = {}
-
-        # ツールの存在確認
-        if tool_name not in self._tool_implementations:
+        # ツールの存在確認と取得を1回の辞書参照で行う
+        tool_func = self._tool_implementations.get(tool_name)
+        if tool_func is None:
             return {
                 'success': False,
                 'error': f'不明なツール: {tool_name}',
@@ -152,8 +151,7 @@ class MCPToolHandler:
 
         try:
             # ツールを実行
-            tool_func = self._tool_implementations[tool_name]
-            result = tool_func(**arguments)
+            result = tool_func(**(arguments or {}))
 
             return {
                 'success': True,
@@ -15,30 +15,38 @@
 4. アシスタントへのお願い（話し方、対応方法など）
 """
 
-import re
+import functools
 import json
-from typing import Dict, List, Optional, Any
+import threading
+from collections import deque
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Any, Tuple
 import sys
 import os
 
-# プロジェクトルートをパスに追加
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+# 直接実行したときだけプロジェクトルートをパスに追加
+if __name__ == '__main__':
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from app.structured_llm_client import StructuredLLMClient, get_structured_llm_client
-from app.extraction_models import ExtractedMemories
+from app.extraction_models import ExtractedMemories, BatchExtractedMemories
 from app.database import (
-    add_attribute,
-    add_memory,
-    add_goal,
-    add_request,
-    get_all_attributes,
-    get_all_memories,
-    get_all_goals
+    add_attributes_bulk,
+    add_memories_bulk,
+    add_goals_bulk,
+    add_requests_bulk,
+    write_batch
 )
+from config import EXTRACTION_MAX_BATCH, EXTRACTION_LOG_MAX, DEFAULT_TEST_MODE
+
 
+# LLM応答に埋め込まれたJSONを読み取るデコーダー（呼び出しごとに生成しないよう共有する）
+_JSON_DECODER = json.JSONDecoder()
 
-# 記憶抽出用のプロンプト（2段階応答パターン用）
-EXTRACTION_PROMPT = """あなたは会話から重要な情報を正確に抽出するAIです。
+# 記憶抽出用のシステムプロンプト（2段階応答パターン用）
+# 毎回同じ内容をシステムメッセージとして先頭に送ることで、
+# Ollama側でこの部分の処理結果（KVキャッシュ）が再利用されます。
+EXTRACTION_SYSTEM_PROMPT = """あなたは会話から重要な情報を正確に抽出するAIです。
 ユーザーの発言から、保存すべき情報を漏れなく、改変せずに抽出してください。
 
 ## ルール
@@ -47,10 +55,43 @@ EXTRACTION_PROMPT = """あなたは会話から重要な情報を正確に抽出
 3. 推測や仮定は含めない
 4. 明確に述べられた情報のみ抽出する
 
-## 分析対象の会話
+## 抽出カテゴリ
+- attributes: ユーザー属性（名前、年齢、職業、住所、趣味など）
+- memories: 日常の出来事、経験、好み、知識など
+- goals: やりたいこと、達成したいこと、予定など
+- requests: アシスタントへのお願い（話し方、振る舞いなど）
+
+## カテゴリ値
+- memories: "general", "preference", "event", "knowledge"
+- requests: "tone", "behavior", "format", "general"
+- priority: 1-10の整数（デフォルト5）
+
+## 注意
+- 「私は」「僕は」などの一人称に注目する
+- AIが生成した表現は除外する
+- 不確かな情報は含めない
+"""
+
+# 記憶抽出用のプロンプト（会話ごとに変わる部分のみ）
+EXTRACTION_PROMPT = """## 分析対象の会話
 AI応答: {ai_response}
 ユーザー入力: {user_input}
 
+ユーザーの発言を分析し、抽出すべき情報を特定してください。
+"""
+
+# 複数の会話をまとめて抽出するシステムプロンプト（2段階応答パターン用）
+BATCH_EXTRACTION_SYSTEM_PROMPT = """あなたは会話から重要な情報を正確に抽出するAIです。
+番号付きの会話それぞれについて、ユーザーの発言から保存すべき情報を
+漏れなく、改変せずに抽出してください。
+
+## ルール
+1. ユーザーの発言のみを分析する
+2. AIの応答は抽出対象外
+3. 推測や仮定は含めない
+4. 明確に述べられた情報のみ抽出する
+5. 会話ごとに結果を分け、会話の番号を turn に記録する
+
 ## 抽出カテゴリ
 - attributes: ユーザー属性（名前、年齢、職業、住所、趣味など）
 - memories: 日常の出来事、経験、好み、知識など
@@ -66,10 +107,20 @@ AI応答: {ai_response}
 - 「私は」「僕は」などの一人称に注目する
 - AIが生成した表現は除外する
 - 不確かな情報は含めない
+"""
 
-ユーザーの発言を分析し、抽出すべき情報を特定してください。
+# 複数の会話をまとめて抽出するプロンプト（会話ごとに変わる部分のみ）
+BATCH_EXTRACTION_PROMPT = """## 分析対象の会話
+{turns}
+
+各会話のユーザーの発言を分析し、抽出すべき情報を特定してください。
 """
 
+# バッチ抽出プロンプト内の1件分の会話
+BATCH_TURN_TEMPLATE = """### 会話{number}
+AI応答: {ai_response}
+ユーザー入力: {user_input}"""
+
 
 class MemoryExtractor:
     """
@@ -83,25 +134,33 @@ class MemoryExtractor:
     2. 構造化データに変換
     """
 
-    def __init__(self, structured_client: StructuredLLMClient = None):
+    def __init__(self, structured_client: StructuredLLMClient = None,
+                 test_mode: bool = DEFAULT_TEST_MODE):
         """
         エクストラクターを初期化
 
         Args:
             structured_client: 構造化LLMクライアント（省略時は自動取得）
+            test_mode: テストモード用のログを記録するか
         """
         self.client = structured_client or get_structured_llm_client()
-        # テストモード用のログ
-        self.extraction_log = []
+        # テストモード以外ではログを記録しない（プロンプト文字列などを保持しないため）
+        self.test_mode = test_mode
+        # テストモード用のログ（上限を超えると古いものから捨てる）
+        self.extraction_log = deque(maxlen=EXTRACTION_LOG_MAX)
+        # 抽出待ちの会話 (ユーザー入力, 直前のAI応答, ログを記録するか) のキュー
+        self._pending = deque()
+        self._pending_lock = threading.Lock()
 
     def extract_memories(self, user_input: str,
-                         ai_response: str = "") -> Dict[str, List]:
+                         ai_response: str = "", log: bool = None) -> Dict[str, List]:
         """
         ユーザー入力から記憶を抽出する（2段階応答パターン）
 
         Args:
             user_input: ユーザーの入力テキスト
             ai_response: 直前のAIの応答（除外用）
+            log: テストモード用のログを記録するか（省略時は test_mode に従う）
 
         Returns:
             Dict: 抽出された記憶情報
@@ -110,6 +169,9 @@ class MemoryExtractor:
                 - goals: 目標リスト
                 - requests: お願いリスト
         """
+        if log is None:
+            log = self.test_mode
+
         # プロンプトを構築
         prompt = EXTRACTION_PROMPT.format(
             ai_response=ai_response if ai_response else "（なし）",
@@ -117,47 +179,156 @@ class MemoryExtractor:
         )
 
         # テストモード用にログを記録
-        self.extraction_log.append({
-            'type': 'extraction_request',
-            'user_input': user_input,
-            'ai_response': ai_response,
-            'prompt': prompt
-        })
+        if log:
+            self.extraction_log.append({
+                'type': 'extraction_request',
+                'user_input': user_input,
+                'ai_response': ai_response,
+                'prompt': prompt
+            })
 
         try:
             # 2段階応答パターンで構造化データを抽出
             extracted_obj = self.client.generate_structured(
                 prompt=prompt,
                 response_model=ExtractedMemories,
+                system_prompt=EXTRACTION_SYSTEM_PROMPT,
                 enable_two_stage=True
             )
 
+            # Pydanticモデルの変換は1回だけ行い、ログと戻り値で共有する
+            dumped = extracted_obj.model_dump()
+
             # テストモード用にログを記録
-            self.extraction_log.append({
-                'type': 'extraction_response',
-                'structured_data': extracted_obj.model_dump()
-            })
+            if log:
+                self.extraction_log.append({
+                    'type': 'extraction_response',
+                    'structured_data': dumped
+                })
 
-            # Pydanticモデルを辞書形式に変換
-            return {
-                'attributes': [attr.model_dump() for attr in extracted_obj.attributes],
-                'memories': [mem.model_dump() for mem in extracted_obj.memories],
-                'goals': [goal.model_dump() for goal in extracted_obj.goals],
-                'requests': [req.model_dump() for req in extracted_obj.requests]
-            }
+            return self._select_categories(dumped)
 
         except Exception as e:
             # エラー時は空の結果を返す
+            if log:
+                self.extraction_log.append({
+                    'type': 'extraction_error',
+                    'error': str(e)
+                })
+            return self._empty_result()
+
+    def extract_memories_batch(self, turns: List[Tuple[str, str]],
+                               log: bool = None) -> List[Dict[str, List]]:
+        """
+        複数の会話からまとめて記憶を抽出する（2段階応答パターン）
+
+        LLMの呼び出しを会話ごとに行うと、プロンプトの読み込みと通信の
+        待ち時間が件数分かかるため、番号付きの1つのプロンプトにまとめて
+        1回で抽出し、結果を会話ごとに振り分けます。
+        1件だけの場合や、まとめた抽出に失敗した場合は1件ずつ抽出します。
+
+        Args:
+            turns: (ユーザー入力, 直前のAI応答) のリスト
+            log: テストモード用のログを記録するか（省略時は test_mode に従う）
+
+        Returns:
+            List[Dict]: 会話ごとの抽出結果（extract_memories と同じ形式、turns と同じ順）
+        """
+        if log is None:
+            log = self.test_mode
+
+        if len(turns) <= 1:
+            return [self.extract_memories(user_input, ai_response, log)
+                    for user_input, ai_response in turns]
+
+        # プロンプトを構築
+        prompt = BATCH_EXTRACTION_PROMPT.format(turns="\n\n".join(
+            BATCH_TURN_TEMPLATE.format(
+                number=number,
+                ai_response=ai_response if ai_response else "（なし）",
+                user_input=user_input
+            )
+            for number, (user_input, ai_response) in enumerate(turns, 1)
+        ))
+
+        # テストモード用にログを記録
+        if log:
+            self.extraction_log.append({
+                'type': 'extraction_request',
+                'turns': [
+                    {'user_input': user_input, 'ai_response': ai_response}
+                    for user_input, ai_response in turns
+                ],
+                'prompt': prompt
+            })
+
+        try:
+            batch_obj = self.client.generate_structured(
+                prompt=prompt,
+                response_model=BatchExtractedMemories,
+                system_prompt=BATCH_EXTRACTION_SYSTEM_PROMPT,
+                enable_two_stage=True
+            )
+        except Exception as e:
+            if log:
+                self.extraction_log.append({
+                    'type': 'extraction_error',
+                    'error': str(e)
+                })
+            return [self.extract_memories(user_input, ai_response, log)
+                    for user_input, ai_response in turns]
+
+        # Pydanticモデルの変換は1回だけ行い、ログと振り分けで共有する
+        dumped = batch_obj.model_dump()
+
+        # テストモード用にログを記録
+        if log:
             self.extraction_log.append({
-                'type': 'extraction_error',
-                'error': str(e)
+                'type': 'extraction_response',
+                'structured_data': dumped
             })
-            return {
-                'attributes': [],
-                'memories': [],
-                'goals': [],
-                'requests': []
-            }
+
+        # 会話番号ごとに振り分ける（範囲外の番号は無視し、結果のない会話は空にする）
+        results = [self._empty_result() for _ in turns]
+        for turn_result in dumped['results']:
+            if 1 <= turn_result['turn'] <= len(turns):
+                extracted = self._select_categories(turn_result)
+                for key, items in extracted.items():
+                    results[turn_result['turn'] - 1][key].extend(items)
+        return results
+
+    @staticmethod
+    def _select_categories(dumped: Dict[str, Any]) -> Dict[str, List]:
+        """
+        model_dump() 済みの抽出結果から4カテゴリのリストを取り出す
+
+        Args:
+            dumped: ExtractedMemories を model_dump() した辞書
+
+        Returns:
+            Dict: カテゴリごとのリスト
+        """
+        return {
+            'attributes': dumped['attributes'],
+            'memories': dumped['memories'],
+            'goals': dumped['goals'],
+            'requests': dumped['requests']
+        }
+
+    @staticmethod
+    def _empty_result() -> Dict[str, List]:
+        """
+        空の抽出結果を返す
+
+        Returns:
+            Dict: 全カテゴリが空リストの辞書
+        """
+        return {
+            'attributes': [],
+            'memories': [],
+            'goals': [],
+            'requests': []
+        }
 
     def _parse_json_response(self, response: str) -> Dict[str, List]:
         """
@@ -169,84 +340,87 @@ class MemoryExtractor:
         Returns:
             Dict: 解析されたJSON（または空の辞書）
         """
-        try:
-            # 正規表現でJSON部分を抽出
-            import re
-            json_match = re.search(r'(\{[\s\S]*\})', response)
-            if json_match:
-                response = json_match.group(1)
-            
-            # JSONを解析
-            data = json.loads(response.strip())
-
-            # 期待される構造を保証
-            result = {
-                'attributes': data.get('attributes', []),
-                'memories': data.get('memories', []),
-                'goals': data.get('goals', []),
-                'requests': data.get('requests', [])
-            }
-
-            return result
-
-        except json.JSONDecodeError:
+        # 最初の「{」から順に、JSONとして読み取れるオブジェクトを探す
+        # （貪欲な正規表現と違いバックトラックせず、応答を1回走査するだけで済む）
+        data = None
+        start = response.find('{')
+        while start != -1:
+            try:
+                obj, _ = _JSON_DECODER.raw_decode(response, start)
+            except json.JSONDecodeError:
+                obj = None
+            if isinstance(obj, dict):
+                data = obj
+                break
+            start = response.find('{', start + 1)
+
+        if data is None:
             # JSON解析失敗時は空の結果
-            return {
-                'attributes': [],
-                'memories': [],
-                'goals': [],
-                'requests': []
-            }
-
-    def save_extracted_memories(self, extracted: Dict[str, List]) -> Dict[str, int]:
+            return self._empty_result()
+
+        # 期待される構造を保証
+        return {
+            'attributes': data.get('attributes', []),
+            'memories': data.get('memories', []),
+            'goals': data.get('goals', []),
+            'requests': data.get('requests', [])
+        }
+
+    def save_extracted_memories(self, extracted: Dict[str, List],
+                                log: bool = None) -> Dict[str, int]:
         """
         抽出された記憶をデータベースに保存する
 
         Args:
             extracted: extract_memories()の戻り値
+            log: テストモード用のログを記録するか（省略時は test_mode に従う）
 
         Returns:
             Dict: 各カテゴリの保存件数
         """
-        saved_counts = {
-            'attributes': 0,
-            'memories': 0,
-            'goals': 0,
-            'requests': 0
-        }
-
-        # 属性を保存
-        for attr in extracted.get('attributes', []):
-            if 'name' in attr and 'value' in attr:
-                add_attribute(attr['name'], attr['value'])
-                saved_counts['attributes'] += 1
-
-        # 記憶を保存
-        for mem in extracted.get('memories', []):
-            if 'content' in mem:
-                category = mem.get('category', 'general')
-                add_memory(mem['content'], category)
-                saved_counts['memories'] += 1
-
-        # 目標を保存
-        for goal in extracted.get('goals', []):
-            if 'content' in goal:
-                priority = goal.get('priority', 5)
-                add_goal(goal['content'], priority)
-                saved_counts['goals'] += 1
-
-        # お願いを保存
-        for req in extracted.get('requests', []):
-            if 'content' in req:
-                category = req.get('category', 'general')
-                add_request(req['content'], category)
-                saved_counts['requests'] += 1
+        # 必須項目のある要素だけをカテゴリごとの行リストにする
+        attribute_rows = [
+            (attr['name'], attr['value'])
+            for attr in extracted.get('attributes') or ()
+            if 'name' in attr and 'value' in attr
+        ]
+        memory_rows = [
+            (mem['content'], mem.get('category', 'general'))
+            for mem in extracted.get('memories') or ()
+            if 'content' in mem
+        ]
+        goal_rows = [
+            (goal['content'], goal.get('priority', 5))
+            for goal in extracted.get('goals') or ()
+            if 'content' in goal
+        ]
+        request_rows = [
+            (req['content'], req.get('category', 'general'))
+            for req in extracted.get('requests') or ()
+            if 'content' in req
+        ]
+
+        if attribute_rows or memory_rows or goal_rows or request_rows:
+            # 1回の発言から抽出した情報は1トランザクションでまとめて保存する
+            with write_batch():
+                saved_counts = {
+                    'attributes': add_attributes_bulk(attribute_rows),
+                    'memories': add_memories_bulk(memory_rows),
+                    'goals': add_goals_bulk(goal_rows),
+                    'requests': add_requests_bulk(request_rows)
+                }
+        else:
+            # 保存するものがない発言（大半の雑談）ではトランザクションを開始しない
+            saved_counts = {'attributes': 0, 'memories': 0, 'goals': 0, 'requests': 0}
 
         # テストモード用にログを記録
-        self.extraction_log.append({
-            'type': 'save_result',
-            'counts': saved_counts
-        })
+        if log is None:
+            log = self.test_mode
+        if log:
+            self.extraction_log.append({
+                'type': 'save_result',
+                'counts': saved_counts
+            })
 
         return saved_counts
 
@@ -277,11 +451,67 @@ class MemoryExtractor:
             'saved_counts': saved_counts
         }
 
+    def enqueue_input(self, user_input: str, ai_response: str = "", log: bool = None):
+        """
+        ユーザー入力を抽出待ちのキューに追加する
+
+        実際の抽出は process_pending で行います。
+        抽出は後で別スレッドから行うため、ログを記録するかは会話ごとに保持します。
+
+        Args:
+            user_input: ユーザーの入力テキスト
+            ai_response: 直前のAIの応答
+            log: テストモード用のログを記録するか（省略時は test_mode に従う）
+        """
+        if log is None:
+            log = self.test_mode
+        with self._pending_lock:
+            self._pending.append((user_input, ai_response, log))
+
+    def process_pending(self, max_batch: int = EXTRACTION_MAX_BATCH) -> List[Dict[str, Any]]:
+        """
+        抽出待ちの会話をまとめて抽出・保存する
+
+        前回の抽出中に溜まった会話を最大 max_batch 件ずつまとめ、
+        1回のLLM呼び出しで抽出します。
+        ログを記録する会話としない会話は、同じ呼び出しにまとめません。
+
+        Args:
+            max_batch: 1回の抽出でまとめる最大件数
+
+        Returns:
+            List[Dict]: 会話ごとの処理結果（process_input と同じ形式）
+        """
+        results = []
+        while True:
+            with self._pending_lock:
+                if not self._pending:
+                    return results
+                # 先頭の会話とログの記録有無が同じ会話だけを続けて取り出す
+                log = self._pending[0][2]
+                turns = []
+                while (self._pending and len(turns) < max_batch
+                       and self._pending[0][2] == log):
+                    user_input, ai_response, _ = self._pending.popleft()
+                    turns.append((user_input, ai_response))
+
+            extracted_list = self.extract_memories_batch(turns, log)
+
+            # まとめて抽出した分は1トランザクションで保存する
+            # （何も抽出されなかった場合はトランザクションを開始しない）
+            has_items = any(any(extracted.values()) for extracted in extracted_list)
+            with write_batch() if has_items else nullcontext():
+                for extracted in extracted_list:
+                    results.append({
+                        'extracted': extracted,
+                        'saved_counts': self.save_extracted_memories(extracted, log)
+                    })
+
     def clear_logs(self):
         """
         テストモード用のログをクリアする
         """
-        self.extraction_log = []
+        self.extraction_log.clear()
 
     def get_logs(self) -> List[Dict]:
         """
@@ -293,8 +523,20 @@ class MemoryExtractor:
         return list(self.extraction_log)
 
 
-# グローバルなエクストラクターインスタンス
-_extractor = None
+# シングルトンの生成を1回に限るロック
+# （lru_cache は初回に複数スレッドから同時に呼ばれると、別々のインスタンスを返し得るため）
+_extractor_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _create_memory_extractor() -> MemoryExtractor:
+    """
+    メモリエクストラクターのインスタンスを生成する（get_memory_extractor からのみ呼び出す）
+
+    Returns:
+        MemoryExtractor: エクストラクターインスタンス
+    """
+    return MemoryExtractor()
 
 
 def get_memory_extractor() -> MemoryExtractor:
@@ -304,10 +546,8 @@ def get_memory_extractor() -> MemoryExtractor:
     Returns:
         MemoryExtractor: エクストラクターインスタンス
     """
-    global _extractor
-    if _extractor is None:
-        _extractor = MemoryExtractor()
-    return _extractor
+    with _extractor_lock:
+        return _create_memory_extractor()
 
 
 # テスト用: 直接実行時の動作確認
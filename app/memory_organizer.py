@@ -9,36 +9,53 @@
 - 目標（goals）: やりたいこと、達成したいこと
 - お願い（requests）: アシスタントへの要望
 
-処理ステップ（逐次実行）:
+処理ステップ（カテゴリごとに並行実行）:
 1. 属性の整理: 重複・矛盾の検出と解決
 2. エピソードの整理: 重複統合、整形、圧縮
 3. 目標の整理: 重複・矛盾の検出と解決
 4. お願いの整理: 重複統合、整形
 
 各ステップの進捗はコールバック関数でリアルタイムに通知されます。
-LLMへの負荷を考慮し、全ての処理は逐次実行されます。
+各カテゴリのデータは互いに依存しないため4つのステップは並行して実行し、
+LLMへの負荷を考慮してLLMの同時呼び出し数は制限します。
 """
 
+import functools
 import json
+import re
+import orjson
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Dict, List, Callable, Optional, Any
+from itertools import islice
+from typing import Dict, List, Callable, Optional, Any, Type, Iterator, Tuple, Set
 from enum import Enum
+from pydantic import BaseModel
 import sys
 import os
 
-# プロジェクトルートをパスに追加
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+# 直接実行したときだけプロジェクトルートをパスに追加
+if __name__ == '__main__':
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from app.structured_llm_client import StructuredLLMClient, get_structured_llm_client
+from app.structured_llm_client import StructuredLLMClient, get_structured_llm_client, find_json
 from app.extraction_models import (
     DuplicateList,
+    DuplicatePair,
     ConflictList,
+    ConflictPair,
     FormattedText,
+    FormattedTextList,
     MergedContent,
-    CompressedContent
+    CompressedContent,
+    CompressedContentList
 )
 from app.database import (
     get_all_memories,
+    get_memories_needing_compression,
     get_all_attributes,
     get_all_goals,
     get_all_requests,
@@ -49,10 +66,25 @@ from app.database import (
     delete_memory,
     delete_attribute,
     delete_request,
-    update_compression_level,
-    get_connection
+    update_compression_levels_bulk,
+    write_batch,
+    prompt_hash,
+    get_cached_llm_outputs,
+    save_llm_outputs
+)
+from config import (
+    MEMORY_COMPRESSION_THRESHOLDS,
+    ORGANIZE_MAX_CONCURRENT_LLM,
+    FORMAT_SKIP_MAX_LENGTH,
+    FORMAT_STEP_BUDGET_SECONDS,
+    PROGRESS_NOTIFY_INTERVAL_SECONDS,
+    ORGANIZATION_LOG_MAX,
+    DETECTION_SNIPPET_LENGTH,
+    DUPLICATE_SIMILARITY_THRESHOLD,
+    ORGANIZE_LLM_TIMEOUT_SECONDS,
+    ORGANIZE_LLM_RETRIES,
+    ORGANIZE_LLM_RETRY_BACKOFF_SECONDS
 )
-from config import MEMORY_COMPRESSION_THRESHOLDS
 
 
 class DataType(Enum):
@@ -82,63 +114,301 @@ class OrganizeStep(Enum):
 # ==================================================
 # LLMプロンプト定義（2段階応答パターン用）
 # ==================================================
+# 指示はシステムプロンプトにまとめ、ユーザープロンプトには項目の内容だけを入れる
+# （呼び出しごとに変わる部分を末尾に置き、Ollama側で共通の先頭部分の計算を再利用させるため）
 
-# 重複検出用プロンプト
-DUPLICATE_DETECTION_PROMPT = """以下のリストから、同じ意味または重複している項目のペアを特定してください。
-重複がない場合は空のリストを返してください。
+# 重複検出用システムプロンプト
+DUPLICATE_DETECTION_SYSTEM_PROMPT = """与えられたリストから、同じ意味または重複している項目のペアを特定してください。
+
+### 出力形式
+重複1組につき1行で「ID1,ID2,理由」と出力してください（例: 1,3,同じ趣味について）。
+JSONやコードブロックは使わないでください。重複がない場合は「なし」とだけ出力してください。"""
 
-### 項目リスト
+# 重複検出用プロンプト
+DUPLICATE_DETECTION_PROMPT = """### 項目リスト
 {items}
 """
 
-# 統合用プロンプト
-MERGE_PROMPT = """以下の2つの項目を1つに統合してください。
-両方の重要な情報を含め、情報が失われないようにしてください。
+# 統合用システムプロンプト
+MERGE_SYSTEM_PROMPT = """与えられた2つの項目を1つに統合してください。
+両方の重要な情報を含め、情報が失われないようにしてください。"""
 
-### 項目1
+# 統合用プロンプト
+MERGE_PROMPT = """### 項目1
 {item1}
 
 ### 項目2
 {item2}
 """
 
-# 整形用プロンプト
-FORMAT_PROMPT = """以下のテキストを自然な日本語に整形してください。
-意味を変えずに読みやすくしてください。
+# 整形用システムプロンプト（1件ずつの整形とまとめた整形で共通）
+FORMAT_SYSTEM_PROMPT = """与えられたテキストを自然な日本語に整形してください。
+意味を変えずに読みやすくしてください。"""
 
-### 元のテキスト
+# 整形用プロンプト
+FORMAT_PROMPT = """### 元のテキスト
 {text}
 """
 
-# 圧縮用プロンプト
-COMPRESS_PROMPT = """以下のエピソードを圧縮してください。
+# 複数項目をまとめて整形するプロンプト
+BATCH_FORMAT_PROMPT = """JSON配列の全ての項目について、id と整形後のテキストを組にして返してください。
+
+### 元のテキスト（JSON配列）
+{items}
+"""
+
+# 圧縮用システムプロンプト（1件ずつの圧縮とまとめた圧縮で共通）
+COMPRESS_SYSTEM_PROMPT = """与えられたエピソードを圧縮してください。
 重要な情報は保持しつつ、表現を短くしてください。
+圧縮レベルは 1:軽度、2:中度、3:強度 です。"""
 
-### 圧縮レベル
-{level}（1:軽度、2:中度、3:強度）
+# 圧縮用プロンプト
+COMPRESS_PROMPT = """### 圧縮レベル
+{level}
 
 ### 元のエピソード
 {content}
 """
 
-# 矛盾検出用プロンプト
-CONFLICT_DETECTION_PROMPT = """以下のリストから、矛盾している項目を特定してください。
+# 複数のエピソードをまとめて圧縮するプロンプト
+BATCH_COMPRESS_PROMPT = """JSON配列の全ての項目について、id と圧縮後の内容を組にして返してください。
+
+### 圧縮レベル
+{level}
+
+### 元のエピソード（JSON配列）
+{items}
+"""
+
+# 矛盾検出用システムプロンプト
+CONFLICT_DETECTION_SYSTEM_PROMPT = """与えられたリストから、矛盾している項目を特定してください。
 矛盾とは、同じトピックについて相反する情報を持つものです。
-矛盾がない場合は空のリストを返してください。
 
-`newer_id`には、新しい情報（残すべきもの）のIDを指定してください。
+### 出力形式
+矛盾1組につき1行で「ID1,ID2,新しい情報（残すべきもの）のID,理由」と出力してください（例: 2,5,5,職業が変わった）。
+JSONやコードブロックは使わないでください。矛盾がない場合は「なし」とだけ出力してください。"""
 
-### 項目リスト
+# 矛盾検出用プロンプト
+CONFLICT_DETECTION_PROMPT = """### 項目リスト
 {items}
 """
 
 
+def _compile_prompt(template: str, *names: str) -> Callable[..., str]:
+    """
+    プロンプトのテンプレートを、プレースホルダーの前後の固定部分に分けておく
+
+    str.format は呼び出しごとにテンプレートを解析し直すため、
+    固定部分と値を連結するだけの関数にしておきます。
+
+    Args:
+        template: プロンプトのテンプレート
+        names: テンプレート中に現れる順に並べたプレースホルダー名
+
+    Returns:
+        Callable[..., str]: names の順に値を受け取り、プロンプトを返す関数
+    """
+    parts = []
+    rest = template
+    for name in names:
+        head, found, rest = rest.partition('{' + name + '}')
+        if not found:
+            raise ValueError(f"プレースホルダーが見つかりません: {name}")
+        parts.append(head)
+    parts.append(rest)
+
+    def render(*values: Any) -> str:
+        pieces = [parts[0]]
+        for value, part in zip(values, parts[1:]):
+            pieces.append(str(value))
+            pieces.append(part)
+        return ''.join(pieces)
+
+    return render
+
+
+# 整形済みとみなすテキストの文末
+_FORMATTED_ENDINGS = ("。", "！", "？", "」", ".", "!", "?")
+
+# 整形が必要な崩れ（連続する空白、空行、制御文字）
+_NEEDS_FORMAT_RE = re.compile(r'[ \t]{2,}|\n\n|[\x00-\x08\x0b-\x1f\x7f]')
+
+
+def _needs_reformat(text: str) -> bool:
+    """
+    テキストの整形をLLMに依頼する必要があるかを簡易的に判定する
+
+    短く、文末が句点などで終わり、余分な空白や制御文字がないテキストは
+    既に整っているとみなします。
+
+    Args:
+        text: 整形前のテキスト
+
+    Returns:
+        bool: 整形が必要な場合True
+    """
+    return not (
+        len(text) <= FORMAT_SKIP_MAX_LENGTH
+        and text == text.strip()
+        and text.endswith(_FORMATTED_ENDINGS)
+        and not _NEEDS_FORMAT_RE.search(text)
+    )
+
+
+def _snippet(text: str, width: int = DETECTION_SNIPPET_LENGTH) -> str:
+    """
+    検出プロンプト用に、テキストを1行にまとめて先頭から指定の文字数までに切り詰める
+
+    日本語は単語の区切りに空白を使わないため、textwrap.shorten ではなく文字数で切ります。
+
+    Args:
+        text: テキスト
+        width: 最大文字数（切り詰めた場合は末尾の「…」を含む）
+
+    Returns:
+        str: 切り詰めたテキスト
+    """
+    text = ' '.join(text.split())
+    if len(text) <= width:
+        return text
+    return text[:width - 1] + '…'
+
+
+def _bigrams(text: str) -> Set[str]:
+    """
+    空白を除いたテキストの文字2-gramの集合を求める
+
+    Args:
+        text: テキスト
+
+    Returns:
+        Set[str]: 文字2-gramの集合（1文字以下のテキストはそのテキスト自身）
+    """
+    text = ''.join(text.split())
+    if len(text) < 2:
+        return {text}
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _duplicate_groups(items: List[Dict], field: str) -> List[List[Dict]]:
+    """
+    文字2-gramの類似度で、重複の可能性がある項目をグループに分ける
+
+    類似度が閾値以上の項目どうしを同じグループにまとめ（推移的にたどる）、
+    どの項目とも似ていない項目は除きます。LLMにはグループごとに短いプロンプトで
+    重複検出を依頼します（最終的な判定はLLMが行います）。
+
+    Args:
+        items: 項目のリスト
+        field: 比較するテキストのフィールド名
+
+    Returns:
+        List[List[Dict]]: 2件以上の項目からなるグループのリスト（グループ内・グループ間とも元の順序のまま）
+    """
+    shingles = [_bigrams(item[field]) for item in items]
+    # 各項目が属するグループの代表（union-find）
+    parent = list(range(len(items)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(items)):
+        for j in range(i + 1, len(items)):
+            union = len(shingles[i] | shingles[j])
+            if union and len(shingles[i] & shingles[j]) / union >= DUPLICATE_SIMILARITY_THRESHOLD:
+                parent[find(j)] = find(i)
+
+    groups: Dict[int, List[Dict]] = {}
+    for index, item in enumerate(items):
+        groups.setdefault(find(index), []).append(item)
+    return [group for group in groups.values() if len(group) >= 2]
+
+
+def _exact_duplicate_groups(items: List[Dict], field: str) -> List[List[Dict]]:
+    """
+    内容（前後の空白を除く）が完全に一致する項目をグループに分ける
+
+    完全に一致する項目は確実に重複しているため、LLMに判定を依頼せずに処理できます。
+
+    Args:
+        items: 項目のリスト
+        field: 比較するテキストのフィールド名
+
+    Returns:
+        List[List[Dict]]: 2件以上の項目からなるグループのリスト（グループ内・グループ間とも元の順序のまま）
+    """
+    groups: Dict[str, List[Dict]] = {}
+    for item in items:
+        groups.setdefault(str(item.get(field) or '').strip(), []).append(item)
+    return [group for group in groups.values() if len(group) >= 2]
+
+
+# 検出結果の1行に含まれるIDの欄（"ID:" の接頭辞や全角の区切りも受け付ける）
+_ID_FIELD = r'\s*(?:ID\s*[:：]?\s*)?(\d+)\s*[,，、]'
+
+# 重複検出の結果の1行（ID1,ID2,理由）
+_DUPLICATE_LINE_RE = re.compile(r'^\s*(?:[-*・]\s*)?' + _ID_FIELD * 2 + r'\s*(.*)$', re.I)
+
+# 矛盾検出の結果の1行（ID1,ID2,残すID,理由）
+_CONFLICT_LINE_RE = re.compile(r'^\s*(?:[-*・]\s*)?' + _ID_FIELD * 3 + r'\s*(.*)$', re.I)
+
+
+def _parse_duplicate_lines(text: str) -> DuplicateList:
+    """
+    1行1組の重複検出結果を解析する
+
+    形式に合わない行（「なし」や説明文など）は読み飛ばします。
+
+    Args:
+        text: LLMの応答（「ID1,ID2,理由」の行）
+
+    Returns:
+        DuplicateList: 重複リスト
+    """
+    return DuplicateList(duplicates=[
+        DuplicatePair(id1=int(m[1]), id2=int(m[2]), reason=m[3].strip())
+        for m in map(_DUPLICATE_LINE_RE.match, text.splitlines()) if m
+    ])
+
+
+def _parse_conflict_lines(text: str) -> ConflictList:
+    """
+    1行1組の矛盾検出結果を解析する
+
+    形式に合わない行（「なし」や説明文など）は読み飛ばします。
+
+    Args:
+        text: LLMの応答（「ID1,ID2,残すID,理由」の行）
+
+    Returns:
+        ConflictList: 矛盾リスト
+    """
+    return ConflictList(conflicts=[
+        ConflictPair(id1=int(m[1]), id2=int(m[2]), newer_id=int(m[3]), reason=m[4].strip())
+        for m in map(_CONFLICT_LINE_RE.match, text.splitlines()) if m
+    ])
+
+
+# 各プロンプトの組み立て関数（引数はプレースホルダーの順）
+_duplicate_detection_prompt = _compile_prompt(DUPLICATE_DETECTION_PROMPT, 'items')
+_merge_prompt = _compile_prompt(MERGE_PROMPT, 'item1', 'item2')
+_format_prompt = _compile_prompt(FORMAT_PROMPT, 'text')
+_batch_format_prompt = _compile_prompt(BATCH_FORMAT_PROMPT, 'items')
+_compress_prompt = _compile_prompt(COMPRESS_PROMPT, 'level', 'content')
+_batch_compress_prompt = _compile_prompt(BATCH_COMPRESS_PROMPT, 'level', 'items')
+_conflict_detection_prompt = _compile_prompt(CONFLICT_DETECTION_PROMPT, 'items')
+
+
 class MemoryOrganizer:
     """
     情報整理クラス
 
     ユーザー情報の整理・圧縮処理を行い、進捗をコールバックで通知します。
-    LLMへの負荷を考慮し、全ての処理は逐次実行されます。
+    カテゴリごとの整理は並行して実行し、LLMへの負荷を考慮して
+    LLMの同時呼び出し数を制限します。
 
     2段階応答パターン:
     1. 自然言語で分析・判断
@@ -158,10 +428,17 @@ class MemoryOrganizer:
         self.client = structured_client or get_structured_llm_client()
         # 進捗通知用コールバック
         self.progress_callback: Optional[Callable[[Dict], None]] = None
-        # 処理ログ
-        self.organization_log = []
-        # 現在のステップ
-        self._current_step: Optional[OrganizeStep] = None
+        # 処理ログ（上限を超えると古いものから捨てる）
+        self.organization_log = deque(maxlen=ORGANIZATION_LOG_MAX)
+        # ステップごとに、処理中の通知を最後にコールバックへ送った時刻
+        self._last_notified_at: Dict[str, float] = {}
+        # LLMの同時呼び出し数を制限するセマフォ
+        self._llm_semaphore = threading.BoundedSemaphore(ORGANIZE_MAX_CONCURRENT_LLM)
+        # 互いに独立したLLM呼び出しを並行して実行するワーカー
+        self._llm_executor = ThreadPoolExecutor(
+            max_workers=ORGANIZE_MAX_CONCURRENT_LLM,
+            thread_name_prefix='organize-llm'
+        )
 
     def set_progress_callback(self, callback: Callable[[Dict], None]):
         """
@@ -199,10 +476,9 @@ class MemoryOrganizer:
             total: 全体の処理数
             data: 追加データ
         """
-        # ステップ表示名を取得
-        step_display = ""
-        if self._current_step:
-            step_display = self._current_step.display
+        # ステップ表示名を取得（並行実行中でも通知元のステップで決める）
+        organize_step = OrganizeStep.__members__.get(step.upper())
+        step_display = organize_step.display if organize_step else ""
 
         progress_info = {
             'step': step,
@@ -218,19 +494,28 @@ class MemoryOrganizer:
         self.organization_log.append(progress_info)
 
         # コールバックがあれば呼び出し
+        # （件数付きの処理中通知は間引き、開始・完了・エラーなどはすぐに送る）
         if self.progress_callback:
+            if status == 'processing' and 0 < total and current < total:
+                now = time.monotonic()
+                if now - self._last_notified_at.get(step, 0.0) < PROGRESS_NOTIFY_INTERVAL_SECONDS:
+                    return
+                self._last_notified_at[step] = now
             self.progress_callback(progress_info)
 
     def organize_all(self) -> Dict[str, Any]:
         """
-        全ての情報整理処理を実行（逐次処理）
+        全ての情報整理処理を実行（カテゴリごとに並行処理）
+
+        4つのカテゴリは互いのデータに依存しないため、スレッドプールで並行に実行します。
+        LLMの同時呼び出し数は ORGANIZE_MAX_CONCURRENT_LLM 件までに制限します。
 
         Returns:
             Dict: 処理結果のサマリー
         """
         self._notify_progress(
             'overall', 'started',
-            '📋 情報整理を開始します（属性→エピソード→目標→お願いの順に処理）'
+            '📋 情報整理を開始します（属性・エピソード・目標・お願いを並行して処理）'
         )
 
         results = {
@@ -240,75 +525,167 @@ class MemoryOrganizer:
             'requests': {'merged': 0, 'formatted': 0}
         }
 
-        try:
-            # ステップ1: 属性の整理
-            self._current_step = OrganizeStep.ATTRIBUTE
-            self._notify_progress(
-                'attribute', 'started',
-                f'🏷️ {self._current_step.display}の整理を開始'
-            )
-            results['attributes'] = self._organize_attributes()
-            self._notify_progress(
-                'attribute', 'completed',
-                f'✅ {self._current_step.display}の整理が完了',
-                data=results['attributes']
-            )
-
-            # ステップ2: エピソードの整理
-            self._current_step = OrganizeStep.EPISODE
-            self._notify_progress(
-                'episode', 'started',
-                f'📝 {self._current_step.display}の整理を開始'
-            )
-            results['episodes'] = self._organize_episodes()
-            self._notify_progress(
-                'episode', 'completed',
-                f'✅ {self._current_step.display}の整理が完了',
-                data=results['episodes']
-            )
-
-            # ステップ3: 目標の整理
-            self._current_step = OrganizeStep.GOAL
-            self._notify_progress(
-                'goal', 'started',
-                f'🎯 {self._current_step.display}の整理を開始'
-            )
-            results['goals'] = self._organize_goals()
-            self._notify_progress(
-                'goal', 'completed',
-                f'✅ {self._current_step.display}の整理が完了',
-                data=results['goals']
-            )
-
-            # ステップ4: お願いの整理
-            self._current_step = OrganizeStep.REQUEST
-            self._notify_progress(
-                'request', 'started',
-                f'💬 {self._current_step.display}の整理を開始'
-            )
-            results['requests'] = self._organize_requests()
-            self._notify_progress(
-                'request', 'completed',
-                f'✅ {self._current_step.display}の整理が完了',
-                data=results['requests']
-            )
+        # (ステップ, 結果のキー, アイコン, 処理メソッド)
+        steps = [
+            (OrganizeStep.ATTRIBUTE, 'attributes', '🏷️', self._organize_attributes),
+            (OrganizeStep.EPISODE, 'episodes', '📝', self._organize_episodes),
+            (OrganizeStep.GOAL, 'goals', '🎯', self._organize_goals),
+            (OrganizeStep.REQUEST, 'requests', '💬', self._organize_requests),
+        ]
+
+        with ThreadPoolExecutor(
+            max_workers=len(steps),
+            thread_name_prefix='organize-step'
+        ) as executor:
+            futures = {
+                executor.submit(self._run_step, step, icon, organize): key
+                for step, key, icon, organize in steps
+            }
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    self._notify_progress(
+                        'overall', 'error',
+                        f'❌ エラーが発生しました: {str(e)}'
+                    )
+                    results.setdefault('error', str(e))
 
-            self._current_step = None
+        if 'error' not in results:
             self._notify_progress(
                 'overall', 'completed',
                 '🎉 全ての情報整理が完了しました',
                 data=results
             )
 
-        except Exception as e:
-            self._notify_progress(
-                'overall', 'error',
-                f'❌ エラーが発生しました: {str(e)}'
-            )
-            results['error'] = str(e)
-
         return results
 
+    def _run_step(
+        self,
+        step: OrganizeStep,
+        icon: str,
+        organize: Callable[[], Dict[str, int]]
+    ) -> Dict[str, int]:
+        """
+        1カテゴリ分の整理を実行し、開始と完了を通知する
+
+        Args:
+            step: 整理ステップ
+            icon: 進捗メッセージに付けるアイコン
+            organize: 整理処理（処理結果を返す）
+
+        Returns:
+            Dict: 処理結果
+        """
+        name = step.name.lower()
+        self._notify_progress(name, 'started', f'{icon} {step.display}の整理を開始')
+        result = organize()
+        self._notify_progress(
+            name, 'completed',
+            f'✅ {step.display}の整理が完了',
+            data=result
+        )
+        return result
+
+    def _generate_structured(self, **kwargs) -> Any:
+        """
+        LLMで構造化データを生成する（同時呼び出し数を制限する）
+
+        Args:
+            **kwargs: StructuredLLMClient.generate_structured の引数
+
+        Returns:
+            response_model型のインスタンス
+
+        Raises:
+            TimeoutError: やり直しても応答が返らなかった場合
+        """
+        return self._call_llm(self.client.generate_structured, **kwargs)
+
+    def _generate_text(self, **kwargs) -> str:
+        """
+        LLMでテキストを生成する（同時呼び出し数を制限する）
+
+        Args:
+            **kwargs: StructuredLLMClient.generate_text の引数
+
+        Returns:
+            str: LLMからの応答
+
+        Raises:
+            TimeoutError: やり直しても応答が返らなかった場合
+        """
+        return self._call_llm(self.client.generate_text, **kwargs)
+
+    def _call_llm(self, generate: Callable[..., Any], **kwargs) -> Any:
+        """
+        同時呼び出し数を制限してLLMを呼び出す
+
+        応答が ORGANIZE_LLM_TIMEOUT_SECONDS 秒以内に返らない呼び出しは打ち切り、
+        待ち時間を倍にしながら ORGANIZE_LLM_RETRIES 回までやり直します。
+
+        Args:
+            generate: 呼び出すクライアントのメソッド
+            **kwargs: generate の引数
+
+        Returns:
+            generate の戻り値
+
+        Raises:
+            TimeoutError: やり直しても応答が返らなかった場合
+        """
+        kwargs.setdefault('timeout', ORGANIZE_LLM_TIMEOUT_SECONDS)
+        for attempt in range(ORGANIZE_LLM_RETRIES + 1):
+            try:
+                with self._llm_semaphore:
+                    return generate(**kwargs)
+            except TimeoutError as e:
+                if attempt == ORGANIZE_LLM_RETRIES:
+                    raise
+                self.organization_log.append({
+                    'type': 'llm_retry',
+                    'attempt': attempt + 1,
+                    'error': str(e)
+                })
+                # 待っている間は他の呼び出しにLLMを譲る
+                time.sleep(ORGANIZE_LLM_RETRY_BACKOFF_SECONDS * (2 ** attempt))
+
+    def _generate_many(
+        self,
+        prompts: Dict[Any, str],
+        response_model: Type[BaseModel],
+        system_prompt: str
+    ) -> Iterator[Tuple[Any, Any]]:
+        """
+        互いに独立した複数のプロンプトを並行してLLMに送る（2段階応答パターン）
+
+        同時に実行する数は ORGANIZE_MAX_CONCURRENT_LLM 件までです。
+        結果は完了した順に返します。
+
+        Args:
+            prompts: {キー: プロンプト}
+            response_model: 結果のモデル
+            system_prompt: 全てのプロンプトに共通のシステムプロンプト
+
+        Yields:
+            Tuple: (キー, response_model型のインスタンス、または発生した例外)
+        """
+        futures = {
+            self._llm_executor.submit(
+                self._generate_structured,
+                prompt=prompt,
+                response_model=response_model,
+                system_prompt=system_prompt,
+                enable_two_stage=True
+            ): key
+            for key, prompt in prompts.items()
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+
     # ==================================================
     # 属性の整理
     # ==================================================
@@ -338,102 +715,116 @@ class MemoryOrganizer:
         )
 
         # 矛盾検出と解決
-        if len(attributes) >= 2:
+        if total >= 2:
             conflicts = self._detect_conflicts(attributes, 'attribute_name', 'attribute_value')
-            result['conflicts_resolved'] = self._resolve_attribute_conflicts(conflicts, attributes)
-
-        # 整形処理
-        attributes = get_all_attributes()  # 再取得
-        for i, attr in enumerate(attributes[:self.MAX_ITEMS_PER_STEP]):
-            self._notify_progress(
-                'attribute', 'processing',
-                f'属性「{attr["attribute_name"]}」を整形中...',
-                current=i + 1, total=min(len(attributes), self.MAX_ITEMS_PER_STEP)
+            result['conflicts_resolved'], changes = self._resolve_attribute_conflicts(
+                conflicts, attributes
             )
-            if self._format_attribute(attr):
-                result['formatted'] += 1
+            attributes = self._apply_changes(attributes, changes)
+
+        # 整形処理（MAX_ITEMS_PER_STEP 件ずつまとめて、時間の許す限り整形する）
+        total = len(attributes)
+        self._notify_progress(
+            'attribute', 'processing',
+            f'{total}件の属性を整形中...',
+            current=0, total=total
+        )
+        formatted = self._format_items('attribute', {
+            attr['id']: f"{attr['attribute_name']}: {attr['attribute_value']}"
+            for attr in attributes
+        })
+        with write_batch():
+            for attr in attributes:
+                if attr['id'] in formatted and self._format_attribute(attr, formatted[attr['id']]):
+                    result['formatted'] += 1
 
         return result
 
-    def _format_attribute(self, attr: Dict) -> bool:
-        """属性を整形する（2段階応答パターン）"""
-        original = f"{attr['attribute_name']}: {attr['attribute_value']}"
-        prompt = FORMAT_PROMPT.format(text=original)
+    def _apply_changes(
+        self,
+        items: List[Dict],
+        changes: Dict[int, Optional[Dict]]
+    ) -> List[Dict]:
+        """
+        矛盾解決・統合での変更を取得済みのリストに反映する
+
+        DBから取得し直さずに、続く整形処理の対象を求めるために使います。
 
-        try:
-            # 2段階応答パターンで整形
-            result = self.client.generate_structured(
-                prompt=prompt,
-                response_model=FormattedText,
-                enable_two_stage=True
-            )
+        Args:
+            items: 変更前の項目のリスト
+            changes: {ID: 更新後の項目（削除・無効化した場合はNone）}
 
-            # ログ記録
-            self.organization_log.append({
-                'type': 'llm_interaction',
-                'action': 'format_attribute',
-                'attribute_id': attr['id'],
-                'prompt': prompt,
-                'response': result.formatted
-            })
+        Returns:
+            List[Dict]: 変更後の項目のリスト（順序は変更前のまま）
+        """
+        if not changes:
+            return items
 
-            formatted = result.formatted
-
-            # 「名前: 値」形式から値部分を抽出
-            if ':' in formatted:
-                parts = formatted.split(':', 1)
-                if len(parts) == 2:
-                    formatted_value = parts[1].strip()
-                else:
-                    formatted_value = formatted
-            else:
-                formatted_value = formatted
-
-            if formatted_value and formatted_value != attr['attribute_value']:
-                update_attribute(attr['id'], formatted_value)
-                return True
-            return False
-        except Exception as e:
-            # エラー時はスキップ
-            self.organization_log.append({
-                'type': 'llm_error',
-                'action': 'format_attribute',
-                'attribute_id': attr['id'],
-                'error': str(e)
-            })
-            return False
+        applied = []
+        for item in items:
+            item = changes.get(item['id'], item)
+            if item is not None:
+                applied.append(item)
+        return applied
+
+    def _format_attribute(self, attr: Dict, formatted: str) -> bool:
+        """
+        属性の整形結果を反映する
+
+        Args:
+            attr: 属性
+            formatted: 「名前: 値」形式の整形結果
+
+        Returns:
+            bool: 更新した場合True
+        """
+        # 「名前: 値」形式から値部分を抽出
+        if ':' in formatted:
+            formatted_value = formatted.split(':', 1)[1].strip()
+        else:
+            formatted_value = formatted
+
+        if formatted_value and formatted_value != attr['attribute_value']:
+            update_attribute(attr['id'], formatted_value)
+            return True
+        return False
 
     def _resolve_attribute_conflicts(
         self,
         conflicts: List[Dict],
         attributes: List[Dict]
-    ) -> int:
-        """属性の矛盾を解決する"""
+    ) -> Tuple[int, Dict[int, Optional[Dict]]]:
+        """属性の矛盾を解決する（解決数と変更内容を返す）"""
         resolved = 0
-        processed_ids = set()
-
-        for conflict in conflicts:
-            id1, id2 = conflict.get('id1'), conflict.get('id2')
-            newer_id = conflict.get('newer_id')
-
-            if id1 in processed_ids or id2 in processed_ids:
-                continue
+        # 削除・取り消し済みのID（1つの項目が複数の矛盾で古い側になっても1回だけ処理する）
+        removed_ids = set()
+        changes: Dict[int, Optional[Dict]] = {}
+        by_id = {attr['id']: attr for attr in attributes}
+
+        # 矛盾の解決はDBの更新だけなので、1つのトランザクションでまとめて書き込む
+        with write_batch():
+            for conflict in conflicts:
+                id1, id2 = conflict.get('id1'), conflict.get('id2')
+                newer_id = conflict.get('newer_id')
+
+                if id1 == id2 or id1 in removed_ids or id2 in removed_ids:
+                    continue
 
-            older_id = id1 if newer_id == id2 else id2
-            attr1 = next((a for a in attributes if a['id'] == id1), None)
-            attr2 = next((a for a in attributes if a['id'] == id2), None)
+                older_id = id1 if newer_id == id2 else id2
+                attr1 = by_id.get(id1)
+                attr2 = by_id.get(id2)
 
-            if attr1 and attr2:
-                self._notify_progress(
-                    'attribute', 'processing',
-                    f'属性の矛盾を解決中: 「{attr1["attribute_name"]}」'
-                )
-                delete_attribute(older_id)
-                processed_ids.add(id1)
-                processed_ids.add(id2)
-                resolved += 1
+                if attr1 and attr2:
+                    self._notify_progress(
+                        'attribute', 'processing',
+                        f'属性の矛盾を解決中: 「{attr1["attribute_name"]}」'
+                    )
+                    delete_attribute(older_id)
+                    changes[older_id] = None
+                    removed_ids.add(older_id)
+                    resolved += 1
 
-        return resolved
+        return resolved, changes
 
     # ==================================================
     # エピソード（旧: 記憶）の整理
@@ -464,99 +855,71 @@ class MemoryOrganizer:
         )
 
         # 重複検出と統合
-        if len(episodes) >= 2:
-            result['merged'] = self._merge_duplicate_episodes(episodes)
+        if total >= 2:
+            result['merged'], changes = self._merge_duplicate_episodes(episodes)
+            episodes = self._apply_changes(episodes, changes)
 
-        # 整形処理
-        episodes = get_all_memories(active_only=True)  # 再取得
-        for i, ep in enumerate(episodes[:self.MAX_ITEMS_PER_STEP]):
-            self._notify_progress(
-                'episode', 'processing',
-                f'エピソードを整形中... ({i + 1}/{min(len(episodes), self.MAX_ITEMS_PER_STEP)})',
-                current=i + 1, total=min(len(episodes), self.MAX_ITEMS_PER_STEP)
-            )
-            if self._format_episode(ep):
-                result['formatted'] += 1
+        # 整形処理（MAX_ITEMS_PER_STEP 件ずつまとめて、時間の許す限り整形する）
+        total = len(episodes)
+        self._notify_progress(
+            'episode', 'processing',
+            f'{total}件のエピソードを整形中...',
+            current=0, total=total
+        )
+        formatted = self._format_items('episode', {
+            ep['id']: ep['memory_content'] for ep in episodes
+        })
+        with write_batch():
+            for ep in episodes:
+                if ep['id'] in formatted and self._format_episode(ep, formatted[ep['id']]):
+                    result['formatted'] += 1
 
         # 圧縮処理
         result['compressed'] = self._compress_old_episodes()
 
         return result
 
-    def _merge_duplicate_episodes(self, episodes: List[Dict]) -> int:
-        """重複するエピソードを統合する（2段階応答パターン）"""
-        # エピソードリストを文字列に変換
-        items_str = "\n".join([
-            f"ID:{ep['id']} - {ep['memory_content']}"
-            for ep in episodes[:self.MAX_ITEMS_PER_STEP]
-        ])
+    def _merge_duplicate_episodes(
+        self,
+        episodes: List[Dict]
+    ) -> Tuple[int, Dict[int, Optional[Dict]]]:
+        """重複するエピソードを統合する（2段階応答パターン、統合数と変更内容を返す）"""
+        # 内容が完全に一致するエピソードは、LLMに依頼せずに先頭の1件だけを残す
+        changes: Dict[int, Optional[Dict]] = self._remove_exact_duplicates(
+            episodes, 'memory_content',
+            lambda episode_id: delete_memory(episode_id, hard_delete=False)
+        )
+        merged_count = len(changes)
+        episodes = self._apply_changes(episodes, changes)
 
-        prompt = DUPLICATE_DETECTION_PROMPT.format(items=items_str)
+        # 似たエピソードがなければ重複検出をLLMに依頼しない
+        groups = _duplicate_groups(
+            episodes[:self.MAX_ITEMS_PER_STEP], 'memory_content'
+        )
+        if not groups:
+            return merged_count, changes
 
         try:
-            # 2段階応答パターンで重複を検出
-            result = self.client.generate_structured(
-                prompt=prompt,
-                response_model=DuplicateList,
-                enable_two_stage=True
-            )
+            duplicates = self._detect_duplicates('episodes', groups, 'memory_content')
 
-            # ログ記録
-            self.organization_log.append({
-                'type': 'llm_interaction',
-                'action': 'detect_duplicate_episodes',
-                'prompt': prompt,
-                'response': [d.model_dump() for d in result.duplicates]
-            })
-
-            merged_count = 0
-            processed_ids = set()
-
-            for dup in result.duplicates:
-                id1, id2 = dup.id1, dup.id2
-
-                if id1 in processed_ids or id2 in processed_ids:
-                    continue
-
-                ep1 = next((e for e in episodes if e['id'] == id1), None)
-                ep2 = next((e for e in episodes if e['id'] == id2), None)
-
-                if ep1 and ep2:
-                    self._notify_progress(
-                        'episode', 'processing',
-                        f'エピソード {id1} と {id2} を統合中...'
-                    )
-
-                    merge_prompt = MERGE_PROMPT.format(
-                        item1=ep1['memory_content'],
-                        item2=ep2['memory_content']
-                    )
-
-                    # 2段階応答パターンで統合
-                    merge_result = self.client.generate_structured(
-                        prompt=merge_prompt,
-                        response_model=MergedContent,
-                        enable_two_stage=True
-                    )
+            by_id = {ep['id']: ep for ep in episodes}
+            merged_pairs = list(self._merge_pairs(
+                'episode', 'episodes', 'エピソード', duplicates, by_id, 'memory_content'
+            ))
 
-                    # ログ記録
-                    self.organization_log.append({
-                        'type': 'llm_interaction',
-                        'action': 'merge_episodes',
-                        'id1': id1,
-                        'id2': id2,
-                        'prompt': merge_prompt,
-                        'response': merge_result.merged
-                    })
-
-                    update_memory(id1, merge_result.merged)
+            # LLMの統合が全て終わってから、1つのトランザクションでまとめて書き込む
+            with write_batch():
+                for id1, id2, merged in merged_pairs:
+                    update_memory(id1, merged)
                     delete_memory(id2, hard_delete=False)
 
-                    processed_ids.add(id1)
-                    processed_ids.add(id2)
-                    merged_count += 1
+            # 書き込みが確定してから変更内容に反映する
+            for id1, id2, merged in merged_pairs:
+                changes[id1] = {**by_id[id1], 'memory_content': merged}
+                changes[id2] = None
+            merged_count += len(merged_pairs)
 
-            return merged_count
+            return merged_count, changes
 
         except Exception as e:
             self.organization_log.append({
@@ -564,111 +927,311 @@ class MemoryOrganizer:
                 'action': 'merge_duplicate_episodes',
                 'error': str(e)
             })
-            return 0
+            return merged_count, changes
 
-    def _format_episode(self, episode: Dict) -> bool:
-        """エピソードを整形する（2段階応答パターン）"""
-        prompt = FORMAT_PROMPT.format(text=episode['memory_content'])
-
-        try:
-            # 2段階応答パターンで整形
-            result = self.client.generate_structured(
-                prompt=prompt,
-                response_model=FormattedText,
-                enable_two_stage=True
-            )
-
-            # ログ記録
-            self.organization_log.append({
-                'type': 'llm_interaction',
-                'action': 'format_episode',
-                'episode_id': episode['id'],
-                'prompt': prompt,
-                'response': result.formatted
-            })
+    def _remove_exact_duplicates(
+        self,
+        items: List[Dict],
+        field: str,
+        delete: Callable[[int], Any]
+    ) -> Dict[int, Optional[Dict]]:
+        """
+        内容が完全に一致する項目を、各グループの先頭の1件だけ残して削除する
 
-            if result.formatted and result.formatted != episode['memory_content']:
-                update_memory(episode['id'], result.formatted)
-                return True
-            return False
-        except Exception as e:
-            self.organization_log.append({
-                'type': 'llm_error',
-                'action': 'format_episode',
-                'episode_id': episode['id'],
-                'error': str(e)
-            })
-            return False
+        Args:
+            items: 項目のリスト
+            field: 比較するテキストのフィールド名
+            delete: 項目のIDを受け取って削除する関数
 
-    def _compress_old_episodes(self) -> int:
-        """古いエピソードを圧縮する（2段階応答パターン）"""
-        episodes = get_all_memories(active_only=True)
-        compressed_count = 0
-        now = datetime.now()
+        Returns:
+            Dict[int, Optional[Dict]]: 変更内容（{削除したID: None}）
+        """
+        removed_ids = [
+            item['id']
+            for group in _exact_duplicate_groups(items, field)
+            for item in group[1:]
+        ]
+        if removed_ids:
+            with write_batch():
+                for item_id in removed_ids:
+                    delete(item_id)
+        return dict.fromkeys(removed_ids)
+
+    def _detect_duplicates(
+        self,
+        action: str,
+        groups: List[List[Dict]],
+        field: str
+    ) -> List[DuplicatePair]:
+        """
+        似た項目のグループごとに、重複するペアを並行して検出する
 
-        for ep in episodes:
-            # 作成日時から経過日数を計算
-            created_at = datetime.fromisoformat(
-                ep['created_at'].replace('Z', '+00:00').replace(' ', 'T')
-            )
-            if created_at.tzinfo:
-                created_at = created_at.replace(tzinfo=None)
-            days_old = (now - created_at).days
-
-            current_level = ep.get('compression_level', 0)
-            thresholds = MEMORY_COMPRESSION_THRESHOLDS
-
-            # 圧縮レベルを決定
-            if days_old >= thresholds['ancient'] and current_level < 3:
-                target_level = 3
-            elif days_old >= thresholds['old'] and current_level < 2:
-                target_level = 2
-            elif days_old >= thresholds['medium'] and current_level < 1:
-                target_level = 1
-            else:
-                continue
+        全項目を1つのプロンプトに並べる代わりに、類似度でまとめたグループごとに
+        短いプロンプトを送ります。検出結果はプロンプトのハッシュでLLM出力キャッシュに保存し、
+        グループの内容が前回から変わっていなければLLMを呼び出さずに再利用します。
 
-            self._notify_progress(
-                'episode', 'processing',
-                f'エピソード {ep["id"]} を圧縮中（レベル{target_level}）...'
-            )
+        Args:
+            action: ログの処理名の接尾辞（episodes/requests）
+            groups: _duplicate_groups で分けた項目のグループ
+            field: 項目のテキストのフィールド名
 
-            prompt = COMPRESS_PROMPT.format(
-                level=target_level,
-                content=ep['memory_content']
+        Returns:
+            List[DuplicatePair]: 重複として検出されたペア（グループの順。検出に失敗したグループは含まない）
+        """
+        action = f'detect_duplicate_{action}'
+        futures = [
+            self._llm_executor.submit(
+                self._detect_cached,
+                action,
+                _duplicate_detection_prompt("\n".join(
+                    f"ID:{item['id']} - {_snippet(item[field])}" for item in group
+                )),
+                DUPLICATE_DETECTION_SYSTEM_PROMPT,
+                _parse_duplicate_lines
             )
+            for group in groups
+        ]
 
+        duplicates: List[DuplicatePair] = []
+        for future in futures:
             try:
-                # 2段階応答パターンで圧縮
-                result = self.client.generate_structured(
-                    prompt=prompt,
-                    response_model=CompressedContent,
-                    enable_two_stage=True
-                )
-
-                # ログ記録
+                duplicates.extend(future.result().duplicates)
+            except Exception as e:
+                # 失敗したグループがあっても、他のグループの結果は使う
                 self.organization_log.append({
-                    'type': 'llm_interaction',
-                    'action': 'compress_episode',
-                    'episode_id': ep['id'],
-                    'level': target_level,
-                    'prompt': prompt,
-                    'response': result.compressed
+                    'type': 'llm_error',
+                    'action': action,
+                    'error': str(e)
                 })
+        return duplicates
 
-                if result.compressed and len(result.compressed) < len(ep['memory_content']):
-                    update_memory(ep['id'], result.compressed)
-                    update_compression_level('user_memories', ep['id'], target_level)
-                    compressed_count += 1
-            except Exception as e:
+    def _detect_cached(
+        self,
+        action: str,
+        prompt: str,
+        system_prompt: str,
+        parse: Callable[[str], BaseModel],
+        **log_fields: Any
+    ) -> BaseModel:
+        """
+        LLM出力キャッシュを使って、1行1組の検出結果を生成・解析する
+
+        検出結果はJSONではなく短い行形式で出力させるため、2段階応答パターンを使わず
+        1回の呼び出しで済ませます。同じモデル・同じプロンプトの応答がキャッシュにあれば、
+        LLMを呼び出さずに解析し直して返します。
+
+        Args:
+            action: ログの処理名
+            prompt: プロンプト
+            system_prompt: システムプロンプト（出力形式の指示を含む）
+            parse: 応答を解析する関数
+            **log_fields: ログに追加する項目
+
+        Returns:
+            parse の戻り値
+        """
+        key = self._cache_key(prompt, system_prompt)
+        cached = self._load_cached_outputs([key]).get(key)
+        if cached is not None:
+            return parse(cached)
+
+        response = self._generate_text(prompt=prompt, system_prompt=system_prompt)
+        result = parse(response)
+
+        # ログ記録
+        self.organization_log.append({
+            'type': 'llm_interaction',
+            'action': action,
+            **log_fields,
+            'prompt': prompt,
+            'response': result.model_dump()
+        })
+
+        self._save_outputs([(key, response)])
+        return result
+
+    def _cache_key(self, prompt: str, system_prompt: str) -> str:
+        """
+        LLM出力キャッシュのキーを求める（使用するモデルごとに別のキーにする）
+
+        Args:
+            prompt: プロンプト
+            system_prompt: システムプロンプト（指示が変わったときに古い出力を使わないため）
+
+        Returns:
+            str: キャッシュのキー
+        """
+        return prompt_hash(f"{system_prompt}\n{prompt}", self.client.model)
+
+    def _merge_pairs(
+        self,
+        step: str,
+        action: str,
+        label: str,
+        duplicates: List[DuplicatePair],
+        by_id: Dict[int, Dict],
+        field: str
+    ) -> Iterator[Tuple[int, int, str]]:
+        """
+        重複するペアの内容を並行してLLMで統合する
+
+        IDを共有しないペアは互いに独立しているため、まだ使われていないIDだけの
+        ペアを先頭から順に選び、それらの統合をまとめてLLMに送ります。
+
+        Args:
+            step: 処理ステップ名（進捗通知に使う）
+            action: ログの処理名の接尾辞（episodes/requests）
+            label: 進捗メッセージに表示する項目名
+            duplicates: 重複として検出されたペア
+            by_id: {ID: 項目}
+            field: 統合する内容のフィールド名
+
+        Yields:
+            Tuple[int, int, str]: (残すID, 削除するID, 統合後の内容)（統合できたペアのみ）
+        """
+        claimed = set()
+        prompts = {}
+        for dup in duplicates:
+            id1, id2 = dup.id1, dup.id2
+            if id1 == id2 or id1 in claimed or id2 in claimed:
+                continue
+            if id1 not in by_id or id2 not in by_id:
+                continue
+            claimed.update((id1, id2))
+            prompts[(id1, id2)] = _merge_prompt(by_id[id1][field], by_id[id2][field])
+
+        if not prompts:
+            return
+
+        self._notify_progress(
+            step, 'processing',
+            f'{len(prompts)}組の{label}を統合中...'
+        )
+
+        # 前回までに同じ内容で統合したペアはLLMを呼び出さずに結果を使う
+        keys = {
+            pair: self._cache_key(prompt, MERGE_SYSTEM_PROMPT)
+            for pair, prompt in prompts.items()
+        }
+        cached = self._load_cached_outputs(list(keys.values()))
+        for (id1, id2), key in keys.items():
+            if key in cached:
+                yield id1, id2, cached[key]
+        pending = {pair: prompt for pair, prompt in prompts.items() if keys[pair] not in cached}
+
+        for (id1, id2), merge_result in self._generate_many(pending, MergedContent, MERGE_SYSTEM_PROMPT):
+            if isinstance(merge_result, Exception):
                 self.organization_log.append({
                     'type': 'llm_error',
-                    'action': 'compress_episode',
-                    'episode_id': ep['id'],
-                    'error': str(e)
+                    'action': f'merge_{action}',
+                    'id1': id1,
+                    'id2': id2,
+                    'error': str(merge_result)
                 })
+                continue
 
-        return compressed_count
+            # ログ記録
+            self.organization_log.append({
+                'type': 'llm_interaction',
+                'action': f'merge_{action}',
+                'id1': id1,
+                'id2': id2,
+                'prompt': prompts[(id1, id2)],
+                'response': merge_result.merged
+            })
+            self._save_outputs([(keys[(id1, id2)], merge_result.merged)])
+            yield id1, id2, merge_result.merged
+
+    def _format_episode(self, episode: Dict, formatted: str) -> bool:
+        """
+        エピソードの整形結果を反映する
+
+        Args:
+            episode: エピソード
+            formatted: 整形結果
+
+        Returns:
+            bool: 更新した場合True
+        """
+        if formatted and formatted != episode['memory_content']:
+            update_memory(episode['id'], formatted)
+            return True
+        return False
+
+    def _compress_old_episodes(self) -> int:
+        """古いエピソードを圧縮する（2段階応答パターン、圧縮レベルごとにまとめて実行）"""
+        thresholds = MEMORY_COMPRESSION_THRESHOLDS
+        # 圧縮対象（経過日数の判定はDB側で行う）を {圧縮レベル: エピソードのリスト} にまとめる
+        targets: Dict[int, List[Dict]] = {}
+        for ep in get_memories_needing_compression(
+            thresholds['medium'], thresholds['old'], thresholds['ancient']
+        ):
+            targets.setdefault(ep['target_level'], []).append(ep)
+
+        # 圧縮結果は (ID, 圧縮後の内容, 圧縮レベル) として溜めておき、最後にまとめて書き込む
+        pending_updates = []
+
+        # 圧縮レベルごとに MAX_ITEMS_PER_STEP 件ずつまとめ、各まとまりを1回のLLM呼び出しで圧縮する
+        # （まとまりどうしは独立しているため並行して送り、完了した順に結果を溜める）
+        chunks = [
+            (target_level, level_episodes[start:start + self.MAX_ITEMS_PER_STEP])
+            for target_level, level_episodes in targets.items()
+            for start in range(0, len(level_episodes), self.MAX_ITEMS_PER_STEP)
+        ]
+        # LLM呼び出し用のワーカーは圧縮の内部でも使うため、まとまりの実行には別のワーカーを使う
+        with ThreadPoolExecutor(
+            max_workers=ORGANIZE_MAX_CONCURRENT_LLM,
+            thread_name_prefix='organize-compress'
+        ) as executor:
+            futures = {
+                executor.submit(self._compress_chunk, target_level, chunk): (target_level, chunk)
+                for target_level, chunk in chunks
+            }
+            for future in as_completed(futures):
+                target_level, chunk = futures[future]
+                compressed = future.result()
+                for ep in chunk:
+                    content = compressed.get(ep['id'])
+                    if content and len(content) < len(ep['memory_content']):
+                        pending_updates.append((ep['id'], content, target_level))
+
+        # 内容と圧縮レベルの更新を1トランザクションで確定する
+        if pending_updates:
+            with write_batch():
+                for episode_id, compressed, _ in pending_updates:
+                    update_memory(episode_id, compressed)
+                update_compression_levels_bulk('user_memories', [
+                    (episode_id, level)
+                    for episode_id, _, level in pending_updates
+                ])
+
+        return len(pending_updates)
+
+    def _compress_chunk(self, target_level: int, chunk: List[Dict]) -> Dict[int, str]:
+        """
+        同じ圧縮レベルのエピソードをまとめて圧縮する
+
+        Args:
+            target_level: 圧縮レベル
+            chunk: 圧縮するエピソード（MAX_ITEMS_PER_STEP 件まで）
+
+        Returns:
+            Dict[int, str]: {ID: 圧縮後の内容}（圧縮できなかったエピソードは含まない）
+        """
+        self._notify_progress(
+            'episode', 'processing',
+            f'{len(chunk)}件のエピソードを圧縮中（レベル{target_level}）...'
+        )
+        return self._generate_with_cache(
+            'episode', 'compress',
+            {ep['id']: ep['memory_content'] for ep in chunk},
+            COMPRESS_SYSTEM_PROMPT,
+            lambda batch: _batch_compress_prompt(target_level, self._items_json(batch)),
+            CompressedContentList,
+            lambda content: _compress_prompt(target_level, content),
+            CompressedContent,
+            'compressed'
+        )
 
     # ==================================================
     # 目標の整理
@@ -699,88 +1262,81 @@ class MemoryOrganizer:
         )
 
         # 矛盾検出と解決
-        if len(goals) >= 2:
+        if total >= 2:
             conflicts = self._detect_conflicts(goals, 'goal_content', 'goal_status')
-            result['conflicts_resolved'] = self._resolve_goal_conflicts(conflicts, goals)
+            result['conflicts_resolved'], changes = self._resolve_goal_conflicts(conflicts, goals)
+            goals = self._apply_changes(goals, changes)
 
-        # 整形処理
-        goals = get_all_goals(status_filter='active')  # 再取得
-        for i, goal in enumerate(goals[:self.MAX_ITEMS_PER_STEP]):
-            self._notify_progress(
-                'goal', 'processing',
-                f'目標を整形中... ({i + 1}/{min(len(goals), self.MAX_ITEMS_PER_STEP)})',
-                current=i + 1, total=min(len(goals), self.MAX_ITEMS_PER_STEP)
-            )
-            if self._format_goal(goal):
-                result['formatted'] += 1
+        # 整形処理（MAX_ITEMS_PER_STEP 件ずつまとめて、時間の許す限り整形する）
+        total = len(goals)
+        self._notify_progress(
+            'goal', 'processing',
+            f'{total}件の目標を整形中...',
+            current=0, total=total
+        )
+        formatted = self._format_items('goal', {
+            goal['id']: goal['goal_content'] for goal in goals
+        })
+        with write_batch():
+            for goal in goals:
+                if goal['id'] in formatted and self._format_goal(goal, formatted[goal['id']]):
+                    result['formatted'] += 1
 
         return result
 
-    def _format_goal(self, goal: Dict) -> bool:
-        """目標を整形する（2段階応答パターン）"""
-        prompt = FORMAT_PROMPT.format(text=goal['goal_content'])
-
-        try:
-            # 2段階応答パターンで整形
-            result = self.client.generate_structured(
-                prompt=prompt,
-                response_model=FormattedText,
-                enable_two_stage=True
-            )
+    def _format_goal(self, goal: Dict, formatted: str) -> bool:
+        """
+        目標の整形結果を反映する
 
-            # ログ記録
-            self.organization_log.append({
-                'type': 'llm_interaction',
-                'action': 'format_goal',
-                'goal_id': goal['id'],
-                'prompt': prompt,
-                'response': result.formatted
-            })
+        Args:
+            goal: 目標
+            formatted: 整形結果
 
-            if result.formatted and result.formatted != goal['goal_content']:
-                update_goal(goal['id'], goal_content=result.formatted)
-                return True
-            return False
-        except Exception as e:
-            self.organization_log.append({
-                'type': 'llm_error',
-                'action': 'format_goal',
-                'goal_id': goal['id'],
-                'error': str(e)
-            })
-            return False
+        Returns:
+            bool: 更新した場合True
+        """
+        if formatted and formatted != goal['goal_content']:
+            update_goal(goal['id'], goal_content=formatted)
+            return True
+        return False
 
     def _resolve_goal_conflicts(
         self,
         conflicts: List[Dict],
         goals: List[Dict]
-    ) -> int:
-        """目標の矛盾を解決する"""
+    ) -> Tuple[int, Dict[int, Optional[Dict]]]:
+        """目標の矛盾を解決する（解決数と変更内容を返す）"""
         resolved = 0
-        processed_ids = set()
-
-        for conflict in conflicts:
-            id1, id2 = conflict.get('id1'), conflict.get('id2')
-            newer_id = conflict.get('newer_id')
-
-            if id1 in processed_ids or id2 in processed_ids:
-                continue
+        # 削除・取り消し済みのID（1つの項目が複数の矛盾で古い側になっても1回だけ処理する）
+        removed_ids = set()
+        changes: Dict[int, Optional[Dict]] = {}
+        by_id = {goal['id']: goal for goal in goals}
+
+        # 矛盾の解決はDBの更新だけなので、1つのトランザクションでまとめて書き込む
+        with write_batch():
+            for conflict in conflicts:
+                id1, id2 = conflict.get('id1'), conflict.get('id2')
+                newer_id = conflict.get('newer_id')
+
+                if id1 == id2 or id1 in removed_ids or id2 in removed_ids:
+                    continue
 
-            older_id = id1 if newer_id == id2 else id2
-            goal1 = next((g for g in goals if g['id'] == id1), None)
-            goal2 = next((g for g in goals if g['id'] == id2), None)
+                older_id = id1 if newer_id == id2 else id2
+                goal1 = by_id.get(id1)
+                goal2 = by_id.get(id2)
 
-            if goal1 and goal2:
-                self._notify_progress(
-                    'goal', 'processing',
-                    f'目標の矛盾を解決中...'
-                )
-                update_goal(older_id, goal_status='cancelled')
-                processed_ids.add(id1)
-                processed_ids.add(id2)
-                resolved += 1
+                if goal1 and goal2:
+                    self._notify_progress(
+                        'goal', 'processing',
+                        f'目標の矛盾を解決中...'
+                    )
+                    update_goal(older_id, goal_status='cancelled')
+                    # 取り消した目標は整理対象（active）から外れる
+                    changes[older_id] = None
+                    removed_ids.add(older_id)
+                    resolved += 1
 
-        return resolved
+        return resolved, changes
 
     # ==================================================
     # お願いの整理
@@ -811,95 +1367,67 @@ class MemoryOrganizer:
         )
 
         # 重複検出と統合
-        if len(requests) >= 2:
-            result['merged'] = self._merge_duplicate_requests(requests)
+        if total >= 2:
+            result['merged'], changes = self._merge_duplicate_requests(requests)
+            requests = self._apply_changes(requests, changes)
 
-        # 整形処理
-        requests = get_all_requests(active_only=True)  # 再取得
-        for i, req in enumerate(requests[:self.MAX_ITEMS_PER_STEP]):
-            self._notify_progress(
-                'request', 'processing',
-                f'お願いを整形中... ({i + 1}/{min(len(requests), self.MAX_ITEMS_PER_STEP)})',
-                current=i + 1, total=min(len(requests), self.MAX_ITEMS_PER_STEP)
-            )
-            if self._format_request(req):
-                result['formatted'] += 1
+        # 整形処理（MAX_ITEMS_PER_STEP 件ずつまとめて、時間の許す限り整形する）
+        total = len(requests)
+        self._notify_progress(
+            'request', 'processing',
+            f'{total}件のお願いを整形中...',
+            current=0, total=total
+        )
+        formatted = self._format_items('request', {
+            req['id']: req['request_content'] for req in requests
+        })
+        with write_batch():
+            for req in requests:
+                if req['id'] in formatted and self._format_request(req, formatted[req['id']]):
+                    result['formatted'] += 1
 
         return result
 
-    def _merge_duplicate_requests(self, requests: List[Dict]) -> int:
-        """重複するお願いを統合する（2段階応答パターン）"""
-        items_str = "\n".join([
-            f"ID:{req['id']} - {req['request_content']}"
-            for req in requests[:self.MAX_ITEMS_PER_STEP]
-        ])
+    def _merge_duplicate_requests(
+        self,
+        requests: List[Dict]
+    ) -> Tuple[int, Dict[int, Optional[Dict]]]:
+        """重複するお願いを統合する（2段階応答パターン、統合数と変更内容を返す）"""
+        # 内容が完全に一致するお願いは、LLMに依頼せずに先頭の1件だけを残す
+        changes: Dict[int, Optional[Dict]] = self._remove_exact_duplicates(
+            requests, 'request_content', delete_request
+        )
+        merged_count = len(changes)
+        requests = self._apply_changes(requests, changes)
 
-        prompt = DUPLICATE_DETECTION_PROMPT.format(items=items_str)
+        # 似たお願いがなければ重複検出をLLMに依頼しない
+        groups = _duplicate_groups(
+            requests[:self.MAX_ITEMS_PER_STEP], 'request_content'
+        )
+        if not groups:
+            return merged_count, changes
 
         try:
-            # 2段階応答パターンで重複を検出
-            result = self.client.generate_structured(
-                prompt=prompt,
-                response_model=DuplicateList,
-                enable_two_stage=True
-            )
-
-            # ログ記録
-            self.organization_log.append({
-                'type': 'llm_interaction',
-                'action': 'detect_duplicate_requests',
-                'prompt': prompt,
-                'response': [d.model_dump() for d in result.duplicates]
-            })
-
-            merged_count = 0
-            processed_ids = set()
-
-            for dup in result.duplicates:
-                id1, id2 = dup.id1, dup.id2
+            duplicates = self._detect_duplicates('requests', groups, 'request_content')
 
-                if id1 in processed_ids or id2 in processed_ids:
-                    continue
-
-                req1 = next((r for r in requests if r['id'] == id1), None)
-                req2 = next((r for r in requests if r['id'] == id2), None)
-
-                if req1 and req2:
-                    self._notify_progress(
-                        'request', 'processing',
-                        f'お願い {id1} と {id2} を統合中...'
-                    )
+            by_id = {req['id']: req for req in requests}
+            merged_pairs = list(self._merge_pairs(
+                'request', 'requests', 'お願い', duplicates, by_id, 'request_content'
+            ))
 
-                    merge_prompt = MERGE_PROMPT.format(
-                        item1=req1['request_content'],
-                        item2=req2['request_content']
-                    )
-
-                    # 2段階応答パターンで統合
-                    merge_result = self.client.generate_structured(
-                        prompt=merge_prompt,
-                        response_model=MergedContent,
-                        enable_two_stage=True
-                    )
-
-                    # ログ記録
-                    self.organization_log.append({
-                        'type': 'llm_interaction',
-                        'action': 'merge_requests',
-                        'id1': id1,
-                        'id2': id2,
-                        'prompt': merge_prompt,
-                        'response': merge_result.merged
-                    })
-
-                    update_request(id1, merge_result.merged)
+            # LLMの統合が全て終わってから、1つのトランザクションでまとめて書き込む
+            with write_batch():
+                for id1, id2, merged in merged_pairs:
+                    update_request(id1, merged)
                     delete_request(id2)
 
-                    processed_ids.add(id1)
-                    processed_ids.add(id2)
-                    merged_count += 1
+            # 書き込みが確定してから変更内容に反映する
+            for id1, id2, merged in merged_pairs:
+                changes[id1] = {**by_id[id1], 'request_content': merged}
+                changes[id2] = None
+            merged_count += len(merged_pairs)
 
-            return merged_count
+            return merged_count, changes
 
         except Exception as e:
             self.organization_log.append({
@@ -907,41 +1435,23 @@ class MemoryOrganizer:
                 'action': 'merge_duplicate_requests',
                 'error': str(e)
             })
-            return 0
-
-    def _format_request(self, request: Dict) -> bool:
-        """お願いを整形する（2段階応答パターン）"""
-        prompt = FORMAT_PROMPT.format(text=request['request_content'])
+            return merged_count, changes
 
-        try:
-            # 2段階応答パターンで整形
-            result = self.client.generate_structured(
-                prompt=prompt,
-                response_model=FormattedText,
-                enable_two_stage=True
-            )
+    def _format_request(self, request: Dict, formatted: str) -> bool:
+        """
+        お願いの整形結果を反映する
 
-            # ログ記録
-            self.organization_log.append({
-                'type': 'llm_interaction',
-                'action': 'format_request',
-                'request_id': request['id'],
-                'prompt': prompt,
-                'response': result.formatted
-            })
+        Args:
+            request: お願い
+            formatted: 整形結果
 
-            if result.formatted and result.formatted != request['request_content']:
-                update_request(request['id'], result.formatted)
-                return True
-            return False
-        except Exception as e:
-            self.organization_log.append({
-                'type': 'llm_error',
-                'action': 'format_request',
-                'request_id': request['id'],
-                'error': str(e)
-            })
-            return False
+        Returns:
+            bool: 更新した場合True
+        """
+        if formatted and formatted != request['request_content']:
+            update_request(request['id'], formatted)
+            return True
+        return False
 
     # ==================================================
     # 共通ユーティリティ
@@ -953,41 +1463,338 @@ class MemoryOrganizer:
         name_field: str,
         value_field: str
     ) -> List[Dict]:
-        """矛盾を検出する（2段階応答パターン）"""
-        items_str = "\n".join([
-            f"ID:{item['id']} - {item.get(name_field, '')}: {item.get(value_field, '')} (更新: {item.get('updated_at', '')})"
-            for item in items[:self.MAX_ITEMS_PER_STEP]
-        ])
+        """矛盾を検出する（名前が完全に一致する項目はLLMを使わずに判定する）"""
+        # 名前が完全に一致する項目は、更新日時が最も新しいものを残す矛盾とする
+        local_conflicts = []
+        for group in _exact_duplicate_groups(items, name_field):
+            newest = max(group, key=lambda item: (str(item.get('updated_at') or ''), item['id']))
+            local_conflicts.extend(
+                {
+                    'id1': newest['id'],
+                    'id2': item['id'],
+                    'newer_id': newest['id'],
+                    'reason': '同じ内容の項目'
+                }
+                for item in group if item is not newest
+            )
+        if local_conflicts:
+            older_ids = {conflict['id2'] for conflict in local_conflicts}
+            items = [item for item in items if item['id'] not in older_ids]
+            if len(items) < 2:
+                return local_conflicts
+
+        items_str = "\n".join(
+            f"ID:{item['id']} - {_snippet(str(item.get(name_field, '')))}: "
+            f"{_snippet(str(item.get(value_field, '')))} (更新: {item.get('updated_at', '')})"
+            for item in islice(items, self.MAX_ITEMS_PER_STEP)
+        )
 
-        prompt = CONFLICT_DETECTION_PROMPT.format(items=items_str)
+        prompt = _conflict_detection_prompt(items_str)
 
         try:
-            # 2段階応答パターンで矛盾を検出
-            result = self.client.generate_structured(
-                prompt=prompt,
-                response_model=ConflictList,
-                enable_two_stage=True
+            # 1行1組の形式で矛盾を検出（項目が前回から変わっていなければ結果を再利用する）
+            result = self._detect_cached(
+                'detect_conflicts', prompt, CONFLICT_DETECTION_SYSTEM_PROMPT,
+                _parse_conflict_lines, field=name_field
             )
-
-            # ログ記録
+            return local_conflicts + [c.model_dump() for c in result.conflicts]
+        except Exception as e:
+            # エラー時はLLMを使わずに判定した矛盾だけを返す
             self.organization_log.append({
-                'type': 'llm_interaction',
+                'type': 'llm_error',
                 'action': 'detect_conflicts',
                 'field': name_field,
-                'prompt': prompt,
-                'response': [c.model_dump() for c in result.conflicts]
+                'error': str(e)
             })
+            return local_conflicts
 
-            return [c.model_dump() for c in result.conflicts]
-        except Exception as e:
-            # エラー時は空のリストを返す
+    def _format_items(self, step: str, texts: Dict[int, str]) -> Dict[int, str]:
+        """
+        複数のテキストをまとめて整形する（2段階応答パターン）
+
+        MAX_ITEMS_PER_STEP 件ずつまとめて整形し、FORMAT_STEP_BUDGET_SECONDS 秒を過ぎたら
+        残りの項目は次回の整理に回します（最初のまとまりは必ず整形します）。
+
+        Args:
+            step: 処理ステップ名（attribute/episode/goal/request）
+            texts: {ID: 整形前のテキスト}
+
+        Returns:
+            Dict[int, str]: {ID: 整形後のテキスト}（整形できなかった項目・整形が不要な項目・次回に回した項目は含まない）
+        """
+        # 空のテキストと整っているテキストはLLMに送らない
+        total = len(texts)
+        texts = {
+            item_id: text for item_id, text in texts.items()
+            if text and _needs_reformat(text)
+        }
+        if len(texts) < total:
             self.organization_log.append({
-                'type': 'llm_error',
-                'action': 'detect_conflicts',
-                'field': name_field,
+                'type': 'format_skipped',
+                'step': step,
+                'count': total - len(texts)
+            })
+
+        deadline = time.monotonic() + FORMAT_STEP_BUDGET_SECONDS
+        items = list(texts.items())
+        results: Dict[int, str] = {}
+        for start in range(0, len(items), self.MAX_ITEMS_PER_STEP):
+            if start and time.monotonic() > deadline:
+                self.organization_log.append({
+                    'type': 'format_deferred',
+                    'step': step,
+                    'count': len(items) - start
+                })
+                break
+            results.update(self._generate_with_cache(
+                step, 'format', dict(items[start:start + self.MAX_ITEMS_PER_STEP]),
+                FORMAT_SYSTEM_PROMPT,
+                lambda batch: _batch_format_prompt(self._items_json(batch)),
+                FormattedTextList,
+                _format_prompt,
+                FormattedText,
+                'formatted',
+                idempotent=True
+            ))
+        return results
+
+    def _generate_with_cache(
+        self,
+        step: str,
+        action: str,
+        texts: Dict[int, str],
+        system_prompt: str,
+        build_batch_prompt: Callable[[Dict[int, str]], str],
+        batch_model: Type[BaseModel],
+        build_item_prompt: Callable[[str], str],
+        item_model: Type[BaseModel],
+        field: str,
+        idempotent: bool = False
+    ) -> Dict[int, str]:
+        """
+        LLM出力キャッシュを使って複数の項目を処理する
+
+        1件分のプロンプトのハッシュでキャッシュ（llm_cache テーブル）を引き、
+        前回までの整理で処理済みの入力はLLMを呼び出さずに結果を再利用します。
+        同じ内容の項目が複数ある場合も、LLMには1件分だけ送ります。
+
+        Args:
+            step: 処理ステップ名（ログの項目名に使う）
+            action: 処理名（format/compress）
+            texts: {ID: 処理前のテキスト}
+            system_prompt: まとめたプロンプトと1件分のプロンプトに共通のシステムプロンプト
+            build_batch_prompt: {ID: テキスト} から全項目をまとめたプロンプトを作る関数
+            batch_model: まとめた結果のモデル
+            build_item_prompt: テキストから1件分のプロンプトを作る関数
+            item_model: 1件分の結果のモデル
+            field: 結果のテキストが入っているフィールド名
+            idempotent: 出力をもう一度処理しても変わらない処理か（整形など）。
+                Trueの場合、出力を入力としたときの結果も出力自身としてキャッシュし、
+                次回の整理で整形済みの項目をLLMに送らないようにする
+
+        Returns:
+            Dict[int, str]: {ID: 処理結果のテキスト}（処理できなかった項目は含まない）
+        """
+        if not texts:
+            return {}
+
+        item_prompts = {item_id: build_item_prompt(text) for item_id, text in texts.items()}
+        hashes = {
+            item_id: self._cache_key(prompt, system_prompt)
+            for item_id, prompt in item_prompts.items()
+        }
+
+        # 同じプロンプトになる項目は、代表の1件だけを処理する
+        representatives: Dict[str, int] = {}
+        for item_id, key in hashes.items():
+            representatives.setdefault(key, item_id)
+
+        outputs = self._load_cached_outputs(list(representatives))
+        pending = [item_id for key, item_id in representatives.items() if key not in outputs]
+
+        if pending:
+            generated = self._generate_for_items(
+                step, action, system_prompt,
+                build_batch_prompt({item_id: texts[item_id] for item_id in pending}),
+                batch_model,
+                {item_id: item_prompts[item_id] for item_id in pending},
+                item_model,
+                field
+            )
+
+            new_rows = [(hashes[item_id], output) for item_id, output in generated.items()]
+            if idempotent:
+                new_rows += [
+                    (self._cache_key(build_item_prompt(output), system_prompt), output)
+                    for output in generated.values()
+                ]
+            self._save_outputs(new_rows)
+            outputs.update(new_rows[:len(generated)])
+
+        return {
+            item_id: outputs[key]
+            for item_id, key in hashes.items()
+            if key in outputs
+        }
+
+    def _load_cached_outputs(self, hashes: List[str]) -> Dict[str, str]:
+        """
+        キャッシュ済みのLLM出力を取得する（読み取りに失敗した場合はキャッシュなしとして扱う）
+
+        Args:
+            hashes: プロンプトのハッシュのリスト
+
+        Returns:
+            Dict[str, str]: {ハッシュ: 出力}
+        """
+        try:
+            return get_cached_llm_outputs(hashes)
+        except sqlite3.Error as e:
+            self.organization_log.append({
+                'type': 'cache_error',
+                'action': 'load_llm_cache',
                 'error': str(e)
             })
-            return []
+            return {}
+
+    def _save_outputs(self, rows: List[Tuple[str, str]]):
+        """
+        LLM出力をキャッシュに保存する（保存に失敗しても整理は続ける）
+
+        Args:
+            rows: (プロンプトのハッシュ, 出力) のリスト
+        """
+        try:
+            save_llm_outputs(rows)
+        except sqlite3.Error as e:
+            self.organization_log.append({
+                'type': 'cache_error',
+                'action': 'save_llm_cache',
+                'error': str(e)
+            })
+
+    def _generate_for_items(
+        self,
+        step: str,
+        action: str,
+        system_prompt: str,
+        batch_prompt: str,
+        batch_model: Type[BaseModel],
+        item_prompts: Dict[int, str],
+        item_model: Type[BaseModel],
+        field: str
+    ) -> Dict[int, str]:
+        """
+        複数の項目の処理を1回のLLM呼び出しにまとめて実行する
+
+        項目ごとに呼び出すとプロンプトの読み込みと通信の待ち時間が
+        件数分かかるため、全項目を1つのプロンプトにまとめます。
+        まとめた呼び出しに失敗した場合や結果が欠けた項目は、1件ずつ並行して処理し直します。
+
+        Args:
+            step: 処理ステップ名（ログの項目名に使う）
+            action: 処理名（format/compress）
+            system_prompt: まとめたプロンプトと1件分のプロンプトに共通のシステムプロンプト
+            batch_prompt: 全項目をまとめたプロンプト
+            batch_model: まとめた結果のモデル（id と field を持つ items のリスト）
+            item_prompts: {ID: 1件分のプロンプト}
+            item_model: 1件分の結果のモデル（field を持つ）
+            field: 結果のテキストが入っているフィールド名
+
+        Returns:
+            Dict[int, str]: {ID: 前後の空白を除いた処理結果のテキスト}
+                （処理できなかった項目・結果が空の項目は含まない）
+        """
+        if not item_prompts:
+            return {}
+
+        results = {}
+        if len(item_prompts) > 1:
+            try:
+                batch_result = self._generate_structured(
+                    prompt=batch_prompt,
+                    response_model=batch_model,
+                    system_prompt=system_prompt,
+                    enable_two_stage=True
+                )
+                for item in batch_result.items:
+                    output = self._clean_output(getattr(item, field))
+                    if item.id in item_prompts and output:
+                        results[item.id] = output
+
+                # ログ記録
+                self.organization_log.append({
+                    'type': 'llm_interaction',
+                    'action': f'{action}_{step}_batch',
+                    'prompt': batch_prompt,
+                    'response': results
+                })
+            except Exception as e:
+                self.organization_log.append({
+                    'type': 'llm_error',
+                    'action': f'{action}_{step}_batch',
+                    'error': str(e)
+                })
+
+        # まとめた結果に含まれなかった項目は1件ずつ（並行して）処理する
+        missing = {
+            item_id: prompt
+            for item_id, prompt in item_prompts.items()
+            if item_id not in results
+        }
+        for item_id, item_result in self._generate_many(missing, item_model, system_prompt):
+            if isinstance(item_result, Exception):
+                self.organization_log.append({
+                    'type': 'llm_error',
+                    'action': f'{action}_{step}',
+                    f'{step}_id': item_id,
+                    'error': str(item_result)
+                })
+                continue
+
+            output = self._clean_output(getattr(item_result, field))
+            if not output:
+                continue
+            results[item_id] = output
+
+            # ログ記録
+            self.organization_log.append({
+                'type': 'llm_interaction',
+                'action': f'{action}_{step}',
+                f'{step}_id': item_id,
+                'prompt': missing[item_id],
+                'response': results[item_id]
+            })
+
+        return results
+
+    @staticmethod
+    def _clean_output(output: Optional[str]) -> str:
+        """
+        LLMの出力テキストの前後の空白を取り除く
+
+        Args:
+            output: LLMの出力テキスト
+
+        Returns:
+            str: 空白を取り除いたテキスト（出力が空の場合は空文字列）
+        """
+        return output.strip() if output else ''
+
+    @staticmethod
+    def _items_json(texts: Dict[int, str]) -> str:
+        """
+        {ID: テキスト} をプロンプトに埋め込むJSON配列にする
+
+        Args:
+            texts: {ID: テキスト}
+
+        Returns:
+            str: [{"id": ID, "text": テキスト}, ...] 形式のJSON文字列
+        """
+        return orjson.dumps(
+            [{'id': item_id, 'text': text} for item_id, text in texts.items()]
+        ).decode()
 
     def _parse_json_response(self, response: str) -> Any:
         """
@@ -1000,19 +1807,13 @@ class MemoryOrganizer:
             Any: 解析されたJSON
         """
         try:
-            # マークダウンのコードブロックを削除
-            if '```json' in response:
-                response = response.split('```json')[1].split('```')[0]
-            elif '```' in response:
-                response = response.split('```')[1].split('```')[0]
-
-            return json.loads(response.strip())
+            return find_json(response)[0]
         except json.JSONDecodeError:
             return []
 
     def clear_logs(self):
         """処理ログをクリアする"""
-        self.organization_log = []
+        self.organization_log.clear()
 
     def get_logs(self) -> List[Dict]:
         """
@@ -1021,11 +1822,23 @@ class MemoryOrganizer:
         Returns:
             List[Dict]: ログエントリのリスト
         """
-        return self.organization_log
+        return list(self.organization_log)
+
 
+# シングルトンの生成を1回に限るロック
+# （lru_cache は初回に複数スレッドから同時に呼ばれると、別々のインスタンスを返し得るため）
+_organizer_lock = threading.Lock()
 
-# グローバルなオーガナイザーインスタンス
-_organizer = None
+
+@functools.lru_cache(maxsize=None)
+def _create_memory_organizer() -> MemoryOrganizer:
+    """
+    メモリオーガナイザーのインスタンスを生成する（get_memory_organizer からのみ呼び出す）
+
+    Returns:
+        MemoryOrganizer: オーガナイザーインスタンス
+    """
+    return MemoryOrganizer()
 
 
 def get_memory_organizer() -> MemoryOrganizer:
@@ -1035,10 +1848,8 @@ def get_memory_organizer() -> MemoryOrganizer:
     Returns:
         MemoryOrganizer: オーガナイザーインスタンス
     """
-    global _organizer
-    if _organizer is None:
-        _organizer = MemoryOrganizer()
-    return _organizer
+    with _organizer_lock:
+        return _create_memory_organizer()
 
 
 # テスト用: 直接実行時の動作確認
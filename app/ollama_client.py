@@ -12,15 +12,143 @@ Ollamaとは:
     response = client.generate("こんにちは")
 """
 
+import functools
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+import orjson
 import requests
-import json
-from typing import Optional, List, Dict, Any, Generator
+from typing import Optional, List, Dict, Any, Generator, Tuple
 import sys
 import os
 
-# 設定ファイルをインポート
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from config import OLLAMA_BASE_URL, OLLAMA_MODEL
+# 設定ファイルをインポート（直接実行したときだけプロジェクトルートをパスに追加する）
+if __name__ == '__main__':
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from config import (
+    OLLAMA_BASE_URL,
+    OLLAMA_MODEL,
+    DEFAULT_TEST_MODE,
+    LLM_LOG_MAX,
+    OLLAMA_HTTP_POOL_SIZE,
+    OLLAMA_RESPONSE_CACHE_SIZE,
+    OLLAMA_DISK_CACHE,
+    OLLAMA_TAGS_CACHE_TTL_SECONDS,
+    SESSION_TIMEOUT_SECONDS
+)
+from app.database import get_recent_llm_output, save_llm_outputs
+
+
+# リクエスト本文（orjson で変換したJSON）のヘッダー
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# 通信エラーの種類ごとのメッセージ（先に一致したものを使う。
+# ConnectTimeout は ConnectionError と Timeout の両方に当たるため、接続エラーとして扱う）
+_ERROR_MESSAGES = (
+    (requests.exceptions.ConnectionError,
+     "Ollamaサーバーに接続できません。Ollamaが起動していることを確認してください。"),
+    (requests.exceptions.Timeout, "Ollamaサーバーからの応答がタイムアウトしました。"),
+)
+
+# ユーザーコンテキストをシステムメッセージとして渡すときの前置き
+_CONTEXT_PREFIX = "以下はユーザーに関する情報です。この情報を参考に応答してください：\n\n"
+
+
+def create_http_session() -> requests.Session:
+    """
+    Ollamaサーバーとの通信に使い回すHTTPセッションを作成する
+
+    呼び出しごとに接続・切断しないよう、OLLAMA_HTTP_POOL_SIZE 本までの接続を保持します。
+
+    Returns:
+        requests.Session: HTTPセッション
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=OLLAMA_HTTP_POOL_SIZE
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# /api/tags の取得結果（{サーバーのURL: (取得した時刻, モデル名のリスト)}）
+_tags_cache: Dict[str, Tuple[float, List[str]]] = {}
+# _tags_cache を保護するロック
+_tags_lock = threading.Lock()
+
+
+def fetch_model_names(session: requests.Session, base_url: str) -> Optional[List[str]]:
+    """
+    Ollamaサーバーのモデル一覧（/api/tags）を取得する
+
+    状態確認のたびに問い合わせないよう、取得できた結果は
+    OLLAMA_TAGS_CACHE_TTL_SECONDS 秒の間使い回します（取得できなかった場合は保持しない）。
+
+    Args:
+        session: 通信に使うHTTPセッション
+        base_url: OllamaサーバーのURL
+
+    Returns:
+        Optional[List[str]]: モデル名のリスト（サーバーに接続できない場合はNone）
+    """
+    now = time.monotonic()
+    with _tags_lock:
+        cached = _tags_cache.get(base_url)
+    if cached is not None and now - cached[0] < OLLAMA_TAGS_CACHE_TTL_SECONDS:
+        return list(cached[1])
+
+    try:
+        response = session.get(f"{base_url}/api/tags", timeout=5)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        names = [model['name'] for model in data.get('models', [])]
+    except Exception:
+        return None
+
+    with _tags_lock:
+        _tags_cache[base_url] = (now, names)
+    return list(names)
+
+
+def _error_message(error: Exception) -> str:
+    """
+    Ollamaとの通信で発生した例外をユーザー向けのメッセージにする
+
+    Args:
+        error: 発生した例外
+
+    Returns:
+        str: エラーメッセージ
+    """
+    for error_type, message in _ERROR_MESSAGES:
+        if isinstance(error, error_type):
+            return message
+    return f"エラーが発生しました: {str(error)}"
+
+
+def _build_messages(prompt: str, system_prompt: Optional[str], context: Optional[str],
+                    history: Optional[List[Dict]]) -> List[Dict[str, str]]:
+    """
+    /api/chat に送るメッセージのリストを組み立てる
+
+    Args:
+        prompt: ユーザーの入力テキスト
+        system_prompt: システムプロンプト
+        context: ユーザーコンテキスト
+        history: 会話履歴
+
+    Returns:
+        List[Dict]: システムプロンプト、コンテキスト、会話履歴、ユーザー入力の順のメッセージ
+    """
+    return [
+        *([{'role': 'system', 'content': system_prompt}] if system_prompt else ()),
+        *([{'role': 'system', 'content': _CONTEXT_PREFIX + context}] if context else ()),
+        *(history or ()),
+        {'role': 'user', 'content': prompt}
+    ]
 
 
 class OllamaClient:
@@ -34,25 +162,39 @@ class OllamaClient:
         model: 使用するモデル名
     """
 
-    def __init__(self, base_url: str = None, model: str = None):
+    def __init__(self, base_url: str = None, model: str = None,
+                 test_mode: bool = DEFAULT_TEST_MODE):
         """
         クライアントを初期化
 
         Args:
             base_url: OllamaサーバーのURL（デフォルト: config.pyの設定値）
             model: モデル名（デフォルト: config.pyの設定値）
+            test_mode: テストモード用のログを記録するか
         """
         # 設定ファイルの値をデフォルトとして使用
         self.base_url = base_url or OLLAMA_BASE_URL
         self.model = model or OLLAMA_MODEL
 
-        # テストモード用のログ保存リスト
-        self.request_log = []
-        self.response_log = []
+        # HTTP接続を使い回すセッション（呼び出しごとの接続・切断を避けるため）
+        self._session = create_http_session()
+
+        # 応答のキャッシュ（{リクエストのハッシュ: (保存時刻, 応答)}、古く使われたものから捨てる）
+        # 保存時刻は time.monotonic() の値で、SESSION_TIMEOUT_SECONDS を過ぎたものは使わない
+        self._response_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # _response_cache を保護するロック
+        self._cache_lock = threading.Lock()
+
+        # テストモード以外ではログを記録しない（クライアントは使い回すため、応答全文を溜め込まないように）
+        self.test_mode = test_mode
+        # テストモード用のログ（上限を超えると古いものから捨てる）
+        self.request_log = deque(maxlen=LLM_LOG_MAX)
+        self.response_log = deque(maxlen=LLM_LOG_MAX)
 
     def generate(self, prompt: str, system_prompt: str = None,
                  context: str = None, history: List[Dict] = None,
-                 stream: bool = False, format: str = None) -> str:
+                 stream: bool = False, format: str = None,
+                 log: bool = None) -> str:
         """
         テキストを生成する
 
@@ -63,37 +205,17 @@ class OllamaClient:
             history: 会話履歴のリスト
             stream: ストリーミングモードを使用するか
             format: レスポンスのフォーマット（例: 'json'）
+            log: テストモード用のログを記録するか（省略時は test_mode に従う）
 
         Returns:
             str: LLMからの応答テキスト
         """
+        # クライアントは全リクエストで共有するため、記録の有無は呼び出しごとに決める
+        if log is None:
+            log = self.test_mode
+
         # メッセージを構築
-        messages = []
-
-        # システムプロンプトを追加
-        if system_prompt:
-            messages.append({
-                'role': 'system',
-                'content': system_prompt
-            })
-
-        # コンテキストをシステムプロンプトに追加
-        if context:
-            context_message = f"以下はユーザーに関する情報です。この情報を参考に応答してください：\n\n{context}"
-            messages.append({
-                'role': 'system',
-                'content': context_message
-            })
-
-        # 会話履歴を追加
-        if history:
-            messages.extend(history)
-
-        # 現在のユーザー入力を追加
-        messages.append({
-            'role': 'user',
-            'content': prompt
-        })
+        messages = _build_messages(prompt, system_prompt, context, history)
 
         # リクエストデータを構築
         request_data = {
@@ -107,16 +229,25 @@ class OllamaClient:
             request_data['format'] = format
 
         # テストモード用にリクエストを記録
-        self.request_log.append({
+        self._log_request({
             'endpoint': '/api/chat',
             'data': request_data
-        })
+        }, log)
+
+        # 同じ内容のリクエストに応答済みなら、LLMを呼び出さずに同じ応答を返す
+        body = orjson.dumps(request_data)
+        cache_key = hashlib.blake2b(body, digest_size=16).hexdigest()
+        cached = self._get_cached_response(cache_key)
+        if cached is not None:
+            self._log_response({'content': cached, 'cached': True}, log)
+            return cached
 
         try:
             # Ollama APIにリクエストを送信
-            response = requests.post(
+            response = self._session.post(
                 f"{self.base_url}/api/chat",
-                json=request_data,
+                data=body,
+                headers=_JSON_HEADERS,
                 timeout=120  # タイムアウト: 2分
             )
 
@@ -124,32 +255,93 @@ class OllamaClient:
             response.raise_for_status()
 
             # JSONレスポンスを解析
-            response_data = response.json()
+            response_data = orjson.loads(response.content)
 
             # テストモード用にレスポンスを記録
-            self.response_log.append(response_data)
+            self._log_response(response_data, log)
 
             # メッセージ内容を抽出して返す
-            return response_data.get('message', {}).get('content', '')
+            content = response_data.get('message', {}).get('content', '')
+            if content:
+                self._cache_response(cache_key, content)
+            return content
 
-        except requests.exceptions.ConnectionError:
-            error_msg = "Ollamaサーバーに接続できません。Ollamaが起動していることを確認してください。"
-            self.response_log.append({'error': error_msg})
+        except Exception as e:
+            error_msg = _error_message(e)
+            self._log_response({'error': error_msg}, log)
             return f"エラー: {error_msg}"
 
-        except requests.exceptions.Timeout:
-            error_msg = "Ollamaサーバーからの応答がタイムアウトしました。"
-            self.response_log.append({'error': error_msg})
-            return f"エラー: {error_msg}"
+    def _get_cached_response(self, key: str) -> Optional[str]:
+        """
+        キャッシュ済みの応答を取得する（メモリ、データベースの順に探す）
 
-        except Exception as e:
-            error_msg = f"エラーが発生しました: {str(e)}"
-            self.response_log.append({'error': error_msg})
-            return f"エラー: {error_msg}"
+        会話の応答なので、どちらもセッションの有効期間（SESSION_TIMEOUT_SECONDS）内に
+        保存したものだけを使います。
+
+        Args:
+            key: リクエストのハッシュ
+
+        Returns:
+            Optional[str]: 応答（キャッシュにない場合はNone）
+        """
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._response_cache.get(key)
+            if entry is not None:
+                if now - entry[0] < SESSION_TIMEOUT_SECONDS:
+                    self._response_cache.move_to_end(key)
+                    return entry[1]
+                # 期限切れの応答は捨てる
+                del self._response_cache[key]
+
+        # メモリになければデータベースを探す（再起動前の応答も使い回すため）
+        if not OLLAMA_DISK_CACHE:
+            return None
+        try:
+            row = get_recent_llm_output(key, SESSION_TIMEOUT_SECONDS)
+        except sqlite3.Error:
+            # キャッシュは補助的なものなので、読めなければLLMを呼び出す
+            return None
+        if row is None:
+            return None
+        content, age = row
+        # データベースに保存した時点から期限を数える（メモリに移すたびに延びないように）
+        self._cache_response(key, content, persist=False, stored_at=now - age)
+        return content
+
+    def _cache_response(self, key: str, content: str, persist: bool = True,
+                        stored_at: float = None):
+        """
+        応答をキャッシュに保存する
+
+        メモリには OLLAMA_RESPONSE_CACHE_SIZE 件まで保持し、超えたら古いものを捨てます。
+        OLLAMA_DISK_CACHE が有効ならデータベース（llm_cache）にも保存します。
+
+        Args:
+            key: リクエストのハッシュ
+            content: 応答
+            persist: データベースにも保存するか
+            stored_at: 応答を保存した時刻（time.monotonic() の値、省略時は現在）
+        """
+        if OLLAMA_RESPONSE_CACHE_SIZE > 0:
+            if stored_at is None:
+                stored_at = time.monotonic()
+            with self._cache_lock:
+                self._response_cache[key] = (stored_at, content)
+                self._response_cache.move_to_end(key)
+                while len(self._response_cache) > OLLAMA_RESPONSE_CACHE_SIZE:
+                    self._response_cache.popitem(last=False)
+
+        if persist and OLLAMA_DISK_CACHE:
+            try:
+                save_llm_outputs([(key, content)])
+            except sqlite3.Error:
+                # 保存できなくても応答は返せるため、無視する
+                pass
 
     def generate_stream(self, prompt: str, system_prompt: str = None,
-                        context: str = None, history: List[Dict] = None
-                        ) -> Generator[str, None, None]:
+                        context: str = None, history: List[Dict] = None,
+                        log: bool = None) -> Generator[str, None, None]:
         """
         ストリーミングモードでテキストを生成する
 
@@ -158,24 +350,16 @@ class OllamaClient:
             system_prompt: システムプロンプト
             context: ユーザーコンテキスト
             history: 会話履歴
+            log: テストモード用のログを記録するか（省略時は test_mode に従う）
 
         Yields:
             str: 生成されたテキストの断片
         """
-        # メッセージを構築
-        messages = []
-
-        if system_prompt:
-            messages.append({'role': 'system', 'content': system_prompt})
-
-        if context:
-            context_message = f"以下はユーザーに関する情報です：\n\n{context}"
-            messages.append({'role': 'system', 'content': context_message})
+        if log is None:
+            log = self.test_mode
 
-        if history:
-            messages.extend(history)
-
-        messages.append({'role': 'user', 'content': prompt})
+        # メッセージを構築
+        messages = _build_messages(prompt, system_prompt, context, history)
 
         # リクエストデータ
         request_data = {
@@ -184,41 +368,46 @@ class OllamaClient:
             'stream': True
         }
 
-        self.request_log.append({
+        self._log_request({
             'endpoint': '/api/chat',
             'data': request_data,
             'stream': True
-        })
+        }, log)
 
         try:
             # ストリーミングリクエスト
-            response = requests.post(
+            # （途中で読むのをやめた場合も接続をセッションに返すため、with で閉じる）
+            with self._session.post(
                 f"{self.base_url}/api/chat",
-                json=request_data,
+                data=orjson.dumps(request_data),
+                headers=_JSON_HEADERS,
                 stream=True,
                 timeout=120
-            )
-
-            response.raise_for_status()
-
-            # ストリーミングレスポンスを処理
-            full_response = ""
-            for line in response.iter_lines():
-                if line:
-                    # JSONを解析
-                    data = json.loads(line)
-                    # メッセージ内容を取得
-                    content = data.get('message', {}).get('content', '')
-                    if content:
-                        full_response += content
-                        yield content
+            ) as response:
+                response.raise_for_status()
+
+                # ストリーミングレスポンスを処理
+                # （1行ごとのJSONをバイト列のまま orjson で解析し、
+                #   テストモードのときだけ断片をリストに溜めて最後に連結する）
+                chunks = []
+                for line in response.iter_lines(chunk_size=8192):
+                    if line:
+                        # JSONを解析
+                        data = orjson.loads(line)
+                        # メッセージ内容を取得
+                        content = data.get('message', {}).get('content', '')
+                        if content:
+                            if log:
+                                chunks.append(content)
+                            yield content
 
             # テストモード用にレスポンスを記録
-            self.response_log.append({'content': full_response})
+            if log:
+                self._log_response({'content': ''.join(chunks)}, log)
 
         except Exception as e:
-            error_msg = f"ストリーミングエラー: {str(e)}"
-            self.response_log.append({'error': error_msg})
+            error_msg = f"ストリーミングエラー: {_error_message(e)}"
+            self._log_response({'error': error_msg}, log)
             yield error_msg
 
     def check_connection(self) -> bool:
@@ -228,11 +417,7 @@ class OllamaClient:
         Returns:
             bool: 接続成功時True
         """
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
-        except Exception:
-            return False
+        return fetch_model_names(self._session, self.base_url) is not None
 
     def get_available_models(self) -> List[str]:
         """
@@ -241,20 +426,42 @@ class OllamaClient:
         Returns:
             List[str]: モデル名のリスト
         """
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            response.raise_for_status()
-            data = response.json()
-            return [model['name'] for model in data.get('models', [])]
-        except Exception:
-            return []
+        return fetch_model_names(self._session, self.base_url) or []
+
+    def close(self):
+        """
+        使い回しているHTTP接続を閉じる
+        """
+        self._session.close()
+
+    def _log_request(self, entry: Dict[str, Any], log: bool):
+        """
+        テストモードのときだけリクエストを記録する
+
+        Args:
+            entry: 記録する内容
+            log: 記録するか
+        """
+        if log:
+            self.request_log.append(entry)
+
+    def _log_response(self, entry: Dict[str, Any], log: bool):
+        """
+        テストモードのときだけレスポンスを記録する
+
+        Args:
+            entry: 記録する内容
+            log: 記録するか
+        """
+        if log:
+            self.response_log.append(entry)
 
     def clear_logs(self):
         """
         テストモード用のログをクリアする
         """
-        self.request_log = []
-        self.response_log = []
+        self.request_log.clear()
+        self.response_log.clear()
 
     def get_logs(self) -> Dict[str, List]:
         """
@@ -264,8 +471,8 @@ class OllamaClient:
             Dict: リクエストとレスポンスのログ
         """
         return {
-            'requests': self.request_log,
-            'responses': self.response_log
+            'requests': list(self.request_log),
+            'responses': list(self.response_log)
         }
 
 
@@ -282,10 +489,7 @@ DEFAULT_SYSTEM_PROMPT = """あなたは「AI秘書」です。ユーザーの日
 あなた自身の発言はユーザーの情報ではありません。ユーザーが明示的に述べた内容のみがユーザー情報です。"""
 
 
-# グローバルなクライアントインスタンス
-_client = None
-
-
+@functools.lru_cache(maxsize=None)
 def get_ollama_client() -> OllamaClient:
     """
     Ollamaクライアントのシングルトンインスタンスを取得
@@ -293,10 +497,7 @@ def get_ollama_client() -> OllamaClient:
     Returns:
         OllamaClient: クライアントインスタンス
     """
-    global _client
-    if _client is None:
-        _client = OllamaClient()
-    return _client
+    return OllamaClient()
 
 
 # テスト用: 直接実行時の動作確認
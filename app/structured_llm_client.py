@@ -10,21 +10,99 @@ Instructorフレームワークを使用した2段階応答パターンの実装
 これにより、LLMの精度を高めつつ、構造化されたデータを取得できます。
 """
 
+import functools
 import json
+import re
+from collections import deque
+import orjson
 import requests
-from typing import TypeVar, Type, Optional, List, Dict, Any
+from typing import TypeVar, Type, Optional, List, Dict, Any, Tuple
 from pydantic import BaseModel
-import instructor
 import sys
 import os
 
-# 設定ファイルをインポート
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from config import OLLAMA_BASE_URL, OLLAMA_MODEL
+# 設定ファイルをインポート（直接実行したときだけプロジェクトルートをパスに追加する）
+if __name__ == '__main__':
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from config import OLLAMA_BASE_URL, OLLAMA_MODEL, DEFAULT_TEST_MODE, LLM_LOG_MAX
+from app.ollama_client import create_http_session, fetch_model_names
 
 
 T = TypeVar('T', bound=BaseModel)
 
+# LLMの応答を待つ最大時間の既定値（秒）
+DEFAULT_TIMEOUT_SECONDS = 120
+
+# マークダウンのコードブロック（```json ... ``` または ``` ... ```）
+_JSON_BLOCK_RE = re.compile(r'```(?:json)?\s*(.+?)```', re.S)
+
+# JSONの開始位置の候補（「{」または「[」）
+_JSON_START_RE = re.compile(r'[\[{]')
+
+# リクエスト本文（orjson で変換したJSON）のヘッダー
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# 応答に埋め込まれたJSONを読み取るデコーダー（呼び出しごとに生成しないよう共有する）
+_JSON_DECODER = json.JSONDecoder()
+
+
+@functools.lru_cache(maxsize=128)
+def _model_schema(model_class: Type[BaseModel]) -> Tuple[Dict[str, Any], str]:
+    """
+    モデルのJSONスキーマを取得する（モデルごとに1回だけ生成する）
+
+    Pydantic はスキーマを呼び出しのたびにモデルをたどって組み立てるため、
+    辞書とプロンプトに埋め込む文字列をまとめてキャッシュします。
+    返す辞書は共有されるため、変更しないでください。
+
+    Args:
+        model_class: Pydanticモデルのクラス
+
+    Returns:
+        Tuple[Dict, str]: (スキーマの辞書, JSON文字列)
+    """
+    schema = model_class.model_json_schema()
+    return schema, orjson.dumps(schema).decode()
+
+
+def find_json(text: str) -> Tuple[Any, str]:
+    """
+    LLMの応答テキストからJSONを探して解析する
+
+    スキーマを指定した応答は全体がJSONなので、まず全体を orjson で解析します。
+    解析できなければ、コードブロックがあればその中を、なければ全体を対象に、
+    「{」または「[」の位置から順にJSONとして読み取れるものを探します。
+    文字列の分割や貪欲な正規表現と違い、中間文字列を作らずに読み取れます。
+
+    Args:
+        text: LLMの応答テキスト
+
+    Returns:
+        Tuple[Any, str]: (解析結果, JSON部分の文字列)
+
+    Raises:
+        json.JSONDecodeError: JSONが見つからない場合
+    """
+    stripped = text.strip()
+    if stripped[:1] in ('{', '['):
+        try:
+            return orjson.loads(stripped), stripped
+        except orjson.JSONDecodeError:
+            pass
+
+    # コードブロックの記号がなければ正規表現での検索を省く
+    match = _JSON_BLOCK_RE.search(text) if '```' in text else None
+    payload = match.group(1) if match else text
+
+    for start in _JSON_START_RE.finditer(payload):
+        try:
+            obj, end = _JSON_DECODER.raw_decode(payload, start.start())
+        except json.JSONDecodeError:
+            continue
+        return obj, payload[start.start():end]
+
+    raise json.JSONDecodeError("JSONが見つかりません", payload, 0)
+
 
 class StructuredLLMClient:
     """
@@ -34,27 +112,35 @@ class StructuredLLMClient:
     LLMから構造化データを取得します。
     """
 
-    def __init__(self, base_url: str = None, model: str = None):
+    def __init__(self, base_url: str = None, model: str = None,
+                 test_mode: bool = DEFAULT_TEST_MODE):
         """
         クライアントを初期化
 
         Args:
             base_url: OllamaサーバーのURL
             model: モデル名
+            test_mode: テストモード用のログを記録するか
         """
         self.base_url = base_url or OLLAMA_BASE_URL
         self.model = model or OLLAMA_MODEL
 
-        # テストモード用のログ保存リスト
-        self.request_log = []
-        self.response_log = []
+        # HTTP接続を使い回すセッション（呼び出しごとの接続・切断を避けるため）
+        self._session = create_http_session()
+
+        # テストモード以外ではログを記録しない（クライアントは使い回すため、プロンプトや応答を溜め込まないように）
+        self.test_mode = test_mode
+        # テストモード用のログ（上限を超えると古いものから捨てる）
+        self.request_log = deque(maxlen=LLM_LOG_MAX)
+        self.response_log = deque(maxlen=LLM_LOG_MAX)
 
     def generate_structured(
         self,
         prompt: str,
         response_model: Type[T],
         system_prompt: Optional[str] = None,
-        enable_two_stage: bool = True
+        enable_two_stage: bool = True,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS
     ) -> T:
         """
         構造化データを生成する
@@ -64,20 +150,62 @@ class StructuredLLMClient:
             response_model: Pydanticモデルクラス
             system_prompt: システムプロンプト
             enable_two_stage: 2段階応答パターンを使用するか
+            timeout: 1回のLLM呼び出しで応答を待つ最大時間（秒）
 
         Returns:
             response_model型のインスタンス
+
+        Raises:
+            TimeoutError: LLMの応答が timeout 秒以内に返らなかった場合
         """
         if enable_two_stage:
-            return self._two_stage_generation(prompt, response_model, system_prompt)
+            return self._two_stage_generation(prompt, response_model, system_prompt, timeout)
         else:
-            return self._direct_generation(prompt, response_model, system_prompt)
+            return self._direct_generation(prompt, response_model, system_prompt, timeout)
+
+    def generate_text(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS
+    ) -> str:
+        """
+        構造化せずにテキストのまま生成する（1段階）
+
+        出力形式をプロンプトで指定し、呼び出し側で解析する場合に使います。
+
+        Args:
+            prompt: ユーザーの入力プロンプト
+            system_prompt: システムプロンプト
+            timeout: LLMの応答を待つ最大時間（秒）
+
+        Returns:
+            str: LLMからの応答
+
+        Raises:
+            TimeoutError: LLMの応答が timeout 秒以内に返らなかった場合
+        """
+        response = self._call_ollama(prompt, system_prompt, timeout=timeout)
+
+        # ログに記録
+        self._log_request({
+            'stage': 'text',
+            'prompt': prompt,
+            'system_prompt': system_prompt
+        })
+        self._log_response({
+            'stage': 'text',
+            'response': response
+        })
+
+        return response
 
     def _two_stage_generation(
         self,
         prompt: str,
         response_model: Type[T],
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS
     ) -> T:
         """
         2段階応答パターンで構造化データを生成
@@ -92,42 +220,46 @@ class StructuredLLMClient:
 
 あなたの思考プロセスを詳しく説明してください。"""
 
-        stage1_response = self._call_ollama(stage1_prompt, system_prompt)
+        stage1_response = self._call_ollama(stage1_prompt, system_prompt, timeout=timeout)
 
         # ログに記録
-        self.request_log.append({
+        self._log_request({
             'stage': 1,
             'prompt': stage1_prompt,
             'system_prompt': system_prompt
         })
-        self.response_log.append({
+        self._log_response({
             'stage': 1,
             'response': stage1_response
         })
 
         # ステップ2: 構造化データへの変換
-        stage2_prompt = f"""前のステップでの思考内容:
-{stage1_response}
-
-上記の思考内容に基づいて、以下の構造化データ形式で結果を出力してください。
-
-元のタスク:
-{prompt}
+        # ステップ1の会話の続きとして依頼する（元のタスクと思考内容を送り直さないため、
+        # Ollama側でステップ1と共通の先頭部分の計算を再利用できる）
+        schema, schema_json = _model_schema(response_model)
+        stage2_prompt = f"""上記の思考内容に基づいて、以下の構造化データ形式で結果を出力してください。
 
 構造化データのスキーマ:
-{response_model.model_json_schema()}
+{schema_json}
 
 JSON形式で出力してください。"""
 
-        stage2_response = self._call_ollama(stage2_prompt, system_prompt)
+        # スキーマを指定して、スキーマに沿ったJSONだけを出力させる
+        stage2_response = self._call_ollama(
+            stage2_prompt, system_prompt, format=schema, timeout=timeout,
+            history=[
+                {'role': 'user', 'content': stage1_prompt},
+                {'role': 'assistant', 'content': stage1_response}
+            ]
+        )
 
         # ログに記録
-        self.request_log.append({
+        self._log_request({
             'stage': 2,
             'prompt': stage2_prompt,
             'system_prompt': system_prompt
         })
-        self.response_log.append({
+        self._log_response({
             'stage': 2,
             'response': stage2_response
         })
@@ -139,29 +271,31 @@ JSON形式で出力してください。"""
         self,
         prompt: str,
         response_model: Type[T],
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS
     ) -> T:
         """
         直接的な構造化データ生成（1段階）
         """
+        schema, schema_json = _model_schema(response_model)
         full_prompt = f"""{prompt}
 
 以下の構造化データ形式で結果を出力してください。
 
 構造化データのスキーマ:
-{response_model.model_json_schema()}
+{schema_json}
 
 JSON形式で出力してください。"""
 
-        response = self._call_ollama(full_prompt, system_prompt)
+        response = self._call_ollama(full_prompt, system_prompt, format=schema, timeout=timeout)
 
         # ログに記録
-        self.request_log.append({
+        self._log_request({
             'stage': 'direct',
             'prompt': full_prompt,
             'system_prompt': system_prompt
         })
-        self.response_log.append({
+        self._log_response({
             'stage': 'direct',
             'response': response
         })
@@ -171,7 +305,10 @@ JSON形式で出力してください。"""
     def _call_ollama(
         self,
         prompt: str,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        format: Optional[Dict[str, Any]] = None,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        history: Optional[List[Dict[str, str]]] = None
     ) -> str:
         """
         Ollama APIを呼び出す
@@ -179,6 +316,9 @@ JSON形式で出力してください。"""
         Args:
             prompt: プロンプト
             system_prompt: システムプロンプト
+            format: 出力を制約するJSONスキーマ（Ollamaの構造化出力）
+            timeout: 応答を待つ最大時間（秒）
+            history: プロンプトの前に置く会話（role と content を持つメッセージのリスト）
 
         Returns:
             LLMからの応答
@@ -191,6 +331,9 @@ JSON形式で出力してください。"""
                 'content': system_prompt
             })
 
+        if history:
+            messages.extend(history)
+
         messages.append({
             'role': 'user',
             'content': prompt
@@ -202,15 +345,23 @@ JSON形式で出力してください。"""
             'stream': False
         }
 
+        # フォーマット指定があれば追加
+        if format:
+            request_data['format'] = format
+
         try:
-            response = requests.post(
+            response = self._session.post(
                 f"{self.base_url}/api/chat",
-                json=request_data,
-                timeout=120
+                data=orjson.dumps(request_data),
+                headers=_JSON_HEADERS,
+                timeout=timeout
             )
             response.raise_for_status()
-            response_data = response.json()
+            response_data = orjson.loads(response.content)
             return response_data.get('message', {}).get('content', '')
+        except requests.Timeout as e:
+            # 呼び出し側でやり直せるよう、タイムアウトは他のエラーと区別する
+            raise TimeoutError(f"Ollama API呼び出しタイムアウト: {str(e)}") from e
         except Exception as e:
             raise Exception(f"Ollama API呼び出しエラー: {str(e)}")
 
@@ -225,12 +376,9 @@ JSON形式で出力してください。"""
         Returns:
             model_classのインスタンス
         """
-        # JSONを抽出
-        json_str = self._extract_json(response)
-
-        # JSONをパース
+        # JSONを抽出してパース
         try:
-            data = json.loads(json_str)
+            data, _ = find_json(response)
             return model_class.model_validate(data)
         except (json.JSONDecodeError, Exception) as e:
             raise ValueError(f"JSONパースエラー: {str(e)}\n応答: {response}")
@@ -245,55 +393,52 @@ JSON形式で出力してください。"""
         Returns:
             JSON文字列
         """
-        # マークダウンのコードブロックを削除
-        if '```json' in text:
-            text = text.split('```json')[1].split('```')[0]
-        elif '```' in text:
-            text = text.split('```')[1].split('```')[0]
-
-        # 正規表現でJSON部分を抽出
-        import re
-        json_match = re.search(r'(\{[\s\S]*\}|\[[\s\S]*\])', text)
-        if json_match:
-            return json_match.group(1)
-
-        return text.strip()
+        try:
+            return find_json(text)[1]
+        except json.JSONDecodeError:
+            return text.strip()
 
     def check_connection(self) -> bool:
         """
         Ollamaサーバーへの接続を確認
         """
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
-        except Exception:
-            return False
+        return fetch_model_names(self._session, self.base_url) is not None
+
+    def close(self):
+        """
+        使い回しているHTTP接続を閉じる
+        """
+        self._session.close()
+
+    def _log_request(self, entry: Dict[str, Any]):
+        """テストモードのときだけリクエストを記録"""
+        if self.test_mode:
+            self.request_log.append(entry)
+
+    def _log_response(self, entry: Dict[str, Any]):
+        """テストモードのときだけレスポンスを記録"""
+        if self.test_mode:
+            self.response_log.append(entry)
 
     def clear_logs(self):
         """ログをクリア"""
-        self.request_log = []
-        self.response_log = []
+        self.request_log.clear()
+        self.response_log.clear()
 
     def get_logs(self) -> Dict[str, List]:
         """ログを取得"""
         return {
-            'requests': self.request_log,
-            'responses': self.response_log
+            'requests': list(self.request_log),
+            'responses': list(self.response_log)
         }
 
 
-# グローバルインスタンス
-_structured_client = None
-
-
+@functools.lru_cache(maxsize=None)
 def get_structured_llm_client() -> StructuredLLMClient:
     """
     構造化LLMクライアントのシングルトンインスタンスを取得
     """
-    global _structured_client
-    if _structured_client is None:
-        _structured_client = StructuredLLMClient()
-    return _structured_client
+    return StructuredLLMClient()
 
 
 # テスト用
@@ -10,11 +10,40 @@ import os
 # os.path.dirname(__file__): このファイル（config.py）があるディレクトリを取得
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'ai_secretary.db')
 
+# データベースの定期メンテナンス（統計更新・WALの切り詰め）の間隔（秒）
+DB_MAINTENANCE_INTERVAL_SECONDS = 24 * 60 * 60  # 1日
+
+# ===== キャッシュ設定 =====
+# 属性・目標・お願いの一覧取得結果をメモリに保持する秒数
+# （更新時には即座に破棄されるため、主に他プロセスからの更新の反映遅延の上限）
+QUERY_CACHE_TTL_SECONDS = 30
+# 情報整理やチャットでのLLMの出力（llm_cache）を保持する日数（定期メンテナンスで古いものを削除する）
+LLM_CACHE_MAX_AGE_DAYS = 30
+# チャットの応答をメモリに保持する件数（同じ内容のリクエストにはLLMを呼び出さずに応答する。0で無効）
+# （使い回すのは SESSION_TIMEOUT_SECONDS 以内に保存した応答だけ）
+OLLAMA_RESPONSE_CACHE_SIZE = 256
+# チャットの応答をデータベース（llm_cache）にも保存し、再起動後も使い回すか
+# （使い回すのは SESSION_TIMEOUT_SECONDS 以内に保存した応答だけ）
+# （環境変数 MEMORY_ASSISTANT_LLM_CACHE=0 で無効。毎回LLMの応答を確かめたいテストなどで使う）
+OLLAMA_DISK_CACHE = os.environ.get('MEMORY_ASSISTANT_LLM_CACHE', '1') != '0'
+
+# ===== サーバー設定 =====
+# 開発用サーバー（python run.py）の待ち受けアドレスとポート
+SERVER_HOST = '0.0.0.0'
+SERVER_PORT = 5000
+# デバッグモード（自動リロード・詳細なエラー表示）は環境変数 FLASK_DEBUG=1 のときだけ有効にする
+DEBUG = os.environ.get('FLASK_DEBUG') == '1'
+
 # ===== Ollama設定 =====
 # OllamaサーバーのURL（ローカルで実行されるLLMサーバー）
 OLLAMA_BASE_URL = "http://localhost:11434"
 # 使用するモデル名（設計書で指定されたモデル）
 OLLAMA_MODEL = "llama3.1:8b"
+# Ollamaサーバーとの間で使い回すHTTP接続の最大数
+# （同時に呼び出すスレッド数がこれを超えても動作するが、超えた分の接続は使い捨てになる）
+OLLAMA_HTTP_POOL_SIZE = 16
+# 接続確認・モデル一覧（/api/tags）の取得結果を使い回す秒数
+OLLAMA_TAGS_CACHE_TTL_SECONDS = 60
 
 # ===== セッション設定 =====
 # Flaskセッション用の秘密鍵（本番環境では環境変数から取得することを推奨）
@@ -27,9 +56,22 @@ SESSION_TIMEOUT_SECONDS = 300  # 5分 = 300秒
 # 履歴リセットのトリガーワード
 RESET_TRIGGER_WORDS = ["ありがとう", "ありがとうございます"]
 
+# ===== 管理画面設定 =====
+# 管理画面APIで1回に返すレコード数（既定値と上限）
+ADMIN_PAGE_SIZE = 200
+ADMIN_MAX_PAGE_SIZE = 1000
+
 # ===== テストモード設定 =====
 # テストモードのデフォルト状態（True: テストモードON）
 DEFAULT_TEST_MODE = False
+# テストモード用のLLM通信ログを保持する最大件数（超えた分は古いものから捨てる）
+LLM_LOG_MAX = 1000
+
+# ===== 記憶の抽出設定 =====
+# 処理待ちの会話をまとめて1回のLLM呼び出しで抽出する最大件数
+EXTRACTION_MAX_BATCH = 8
+# テストモード用の抽出ログを保持する最大件数（超えた分は古いものから捨てる）
+EXTRACTION_LOG_MAX = 512
 
 # ===== 記憶の整理設定 =====
 # 記憶が古くなるにつれて圧縮する閾値（日数）
@@ -39,3 +81,29 @@ MEMORY_COMPRESSION_THRESHOLDS = {
     'old': 90,        # 90日以内: 強い圧縮
     'ancient': 365    # 365日以上: 最大圧縮
 }
+# 情報整理でLLMを同時に呼び出す最大数（カテゴリごとの整理や項目ごとの呼び出しは並行実行する）
+# 環境変数 ORGANIZER_CONCURRENCY で変更できる（未指定の場合は、Ollamaサーバーと同じ環境で
+# OLLAMA_NUM_PARALLEL が設定されていればその値に合わせ、サーバー側で待たされないようにする）
+ORGANIZE_MAX_CONCURRENT_LLM = int(
+    os.environ.get('ORGANIZER_CONCURRENCY') or os.environ.get('OLLAMA_NUM_PARALLEL') or 2
+)
+# この文字数以下で文末が句点などで終わる整ったテキストは、整形をLLMに依頼しない
+FORMAT_SKIP_MAX_LENGTH = 80
+# 1ステップで整形に使う時間の目安（秒）
+# （MAX_ITEMS_PER_STEP 件ずつ整形し、この時間を過ぎたら残りは次回の整理に回す）
+FORMAT_STEP_BUDGET_SECONDS = 120
+# 件数付きの処理中通知をコールバックに送る最短間隔（秒）（ステップごと、最後の1件は必ず送る）
+PROGRESS_NOTIFY_INTERVAL_SECONDS = 0.1
+# 情報整理の処理ログを保持する最大件数（超えた分は古いものから捨てる）
+ORGANIZATION_LOG_MAX = 2000
+# 重複・矛盾の検出プロンプトに載せる各項目の最大文字数（統合には全文を使う）
+DETECTION_SNIPPET_LENGTH = 200
+# 重複検出をLLMに依頼する項目の文字2-gramの類似度（Jaccard係数）の下限
+# （どの項目ともこれ未満の項目は重複候補にしない）
+DUPLICATE_SIMILARITY_THRESHOLD = 0.3
+# 情報整理で1回のLLM呼び出しの応答を待つ最大時間（秒）（超えた呼び出しは打ち切ってやり直す）
+ORGANIZE_LLM_TIMEOUT_SECONDS = 60
+# 情報整理でLLMの呼び出しがタイムアウトしたときにやり直す回数
+ORGANIZE_LLM_RETRIES = 2
+# やり直すまでの待ち時間の初期値（秒）（やり直すたびに2倍にする）
+ORGANIZE_LLM_RETRY_BACKOFF_SECONDS = 1.0
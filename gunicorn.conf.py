@@ -0,0 +1,59 @@
+"""
+gunicorn 設定ファイル
+====================
+本番環境でアプリケーションを起動するための設定です。
+
+使用方法:
+    gunicorn -c gunicorn.conf.py
+
+開発用サーバー（python run.py）は1リクエストずつ処理するため、
+状態確認APIのポーリングと情報整理・記憶抽出が重なると応答が遅れます。
+gunicorn のスレッドワーカーで複数のリクエストを並行して処理します。
+"""
+
+import os
+
+# 起動するアプリケーション
+wsgi_app = 'app.main:app'
+
+# 待ち受けアドレス
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# ワーカープロセス数
+# 情報整理の進捗ログやテストモードのログはプロセスごとのメモリに保持されるため、
+# 既定では1プロセスにし、並行処理はスレッドで行う
+# （複数プロセスにする場合は環境変数 WEB_CONCURRENCY で指定する）
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# スレッドワーカー（LLMの応答待ちの間も他のリクエストを処理できる）
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# LLMの呼び出しは時間がかかるため、タイムアウトを長めにする（秒）
+timeout = 120
+
+# アプリを読み込んでからフォークする
+# （記憶処理の実行状態を共有メモリで全ワーカーから参照できるようにするため）
+preload_app = True
+
+
+def pre_fork(server, worker):
+    """
+    ワーカーをフォークする直前に呼ばれる
+
+    SQLite接続はフォークをまたいで使えないため、
+    アプリ読み込み時に開いた接続を閉じておきます。
+    """
+    from app.database import close_all_connections
+    close_all_connections()
+
+
+def post_fork(server, worker):
+    """
+    ワーカーをフォークした直後に呼ばれる
+
+    定期実行する処理はマスタープロセスでは開始せず、
+    ワーカーごとにここで開始します。
+    """
+    from app.main import start_background_jobs
+    start_background_jobs()
@@ -13,12 +13,6 @@ MCP経由で記憶を読み取るためのツール定義です。
 - 直接実行しないでください
 """
 
-import sys
-import os
-
-# 親ディレクトリをパスに追加（database.pyをインポートするため）
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-
 from app.database import (
     get_all_attributes,
     get_all_memories,
@@ -144,6 +138,27 @@ def get_assistant_requests_tool() -> list:
     ]
 
 
+# 優先度ごとの★（優先度が高いほど★が多い、インデックスが優先度）
+_PRIORITY_MARKS = tuple("★" * (11 - priority) for priority in range(11))
+
+
+def _priority_mark(priority) -> str:
+    """
+    目標の優先度を★の数で表す
+
+    Args:
+        priority: 優先度（1:最高 ～ 10:最低、Noneの場合は5として扱う）
+
+    Returns:
+        str: ★の文字列
+    """
+    if priority is None:
+        priority = 5
+    if 0 <= priority < len(_PRIORITY_MARKS):
+        return _PRIORITY_MARKS[priority]
+    return "★" * (11 - priority)
+
+
 def format_context_for_llm(context: dict) -> str:
     """
     コンテキストをLLM用の文字列にフォーマットする
@@ -159,31 +174,31 @@ def format_context_for_llm(context: dict) -> str:
     # ユーザー属性
     if context['attributes']:
         parts.append("【ユーザーの属性】")
-        for attr in context['attributes']:
-            parts.append(f"- {attr['attribute_name']}: {attr['attribute_value']}")
+        parts.extend([
+            f"- {attr['attribute_name']}: {attr['attribute_value']}"
+            for attr in context['attributes']
+        ])
         parts.append("")
 
     # ユーザーの記憶
     if context['memories']:
         parts.append("【ユーザーの記憶】")
-        for mem in context['memories']:
-            parts.append(f"- {mem['memory_content']}")
+        parts.extend([f"- {mem['memory_content']}" for mem in context['memories']])
         parts.append("")
 
     # ユーザーの目標
     if context['goals']:
         parts.append("【ユーザーの目標】")
-        for goal in context['goals']:
-            priority = goal['priority'] if goal['priority'] is not None else 5
-            priority_mark = "★" * (11 - priority)  # 優先度が高いほど★が多い
-            parts.append(f"- {goal['goal_content']} {priority_mark}")
+        parts.extend([
+            f"- {goal['goal_content']} {_priority_mark(goal['priority'])}"
+            for goal in context['goals']
+        ])
         parts.append("")
 
     # アシスタントへのお願い
     if context['requests']:
         parts.append("【アシスタントへのお願い】")
-        for req in context['requests']:
-            parts.append(f"- {req['request_content']}")
+        parts.extend([f"- {req['request_content']}" for req in context['requests']])
         parts.append("")
 
     return "\n".join(parts) if parts else "（保存された情報はありません）"
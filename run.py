@@ -9,6 +9,9 @@ AI秘書 起動スクリプト
 または、直接appモジュールを実行:
     python -m app.main
 
+本番環境では gunicorn で起動:
+    gunicorn -c gunicorn.conf.py
+
 起動後:
     ブラウザで http://localhost:5000 にアクセスしてください
 """
@@ -21,11 +24,15 @@ project_root = os.path.dirname(__file__)
 sys.path.insert(0, project_root)
 
 # メインアプリケーションをインポートして起動
-from app.main import app
+from app.main import app, start_background_jobs
+from config import DEBUG, SERVER_HOST, SERVER_PORT
 
 if __name__ == '__main__':
+    # データベースの定期メンテナンスなどを開始
+    start_background_jobs()
+
     # アプリケーションを起動
-    # debug=True: エラー時に詳細情報を表示、ファイル変更時に自動リロード
+    # debug: 環境変数 FLASK_DEBUG=1 のときのみ詳細なエラー表示と自動リロードを有効にする
     # host='0.0.0.0': 全てのネットワークインターフェースでリッスン
-    # port=5000: ポート番号
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # threaded=True: 状態確認のポーリングなどを並行して処理する
+    app.run(debug=DEBUG, host=SERVER_HOST, port=SERVER_PORT, threaded=True)
@@ -12,6 +12,7 @@
 // ===== 現在の状態を保持する変数 =====
 let currentTable = 'attributes';  // 現在表示中のテーブル
 let editingId = null;             // 編集中のレコードID（null = 新規追加）
+let loadedData = {};              // テーブルごとに読み込み済みのレコード
 
 
 // ===== DOM要素の取得 =====
@@ -69,15 +70,25 @@ function switchTab(tableName) {
 /**
  * データを読み込んで表示する
  *
+ * サーバーからはページ単位で返されるため、2ページ目以降は
+ * 「さらに読み込む」ボタンから追加で取得します。
+ *
  * @param {string} tableName - テーブル名
+ * @param {number} page - 読み込むページ番号（1始まり）
  */
-async function loadData(tableName) {
+async function loadData(tableName, page = 1) {
     try {
-        const response = await fetch(`/api/data/${tableName}`);
+        const response = await fetch(`/api/data/${tableName}?page=${page}`);
         const data = await response.json();
 
+        // 1ページ目は置き換え、2ページ目以降は追記する
+        const append = page > 1;
+        loadedData[tableName] = append
+            ? (loadedData[tableName] || []).concat(data.data)
+            : data.data;
+
         // テーブルに表示
-        displayData(tableName, data.data);
+        displayData(tableName, data.data, append, data.next_cursor);
     } catch (error) {
         console.error('データの読み込みに失敗:', error);
         alert('データの読み込みに失敗しました');
@@ -90,12 +101,23 @@ async function loadData(tableName) {
  *
  * @param {string} tableName - テーブル名
  * @param {Array} data - 表示するデータ
+ * @param {boolean} append - trueの場合、既存の行の後ろに追加する
+ * @param {number|null} nextPage - 次のページ番号（なければnull）
  */
-function displayData(tableName, data) {
+function displayData(tableName, data, append = false, nextPage = null) {
     const tbody = document.getElementById(`${tableName}-body`);
-    tbody.innerHTML = '';
 
-    if (data.length === 0) {
+    if (append) {
+        // 前回の「さらに読み込む」行を取り除く
+        const moreRow = tbody.querySelector('.load-more-row');
+        if (moreRow) {
+            moreRow.remove();
+        }
+    } else {
+        tbody.innerHTML = '';
+    }
+
+    if (data.length === 0 && !append) {
         // データがない場合
         const tr = document.createElement('tr');
         tr.innerHTML = '<td colspan="7" style="text-align: center; color: #999;">データがありません</td>';
@@ -120,6 +142,16 @@ function displayData(tableName, data) {
 
         tbody.appendChild(tr);
     });
+
+    // 続きがある場合は「さらに読み込む」ボタンを表示
+    if (nextPage) {
+        const tr = document.createElement('tr');
+        tr.className = 'load-more-row';
+        tr.innerHTML = `<td colspan="7" style="text-align: center;">
+            <button class="btn btn-small btn-secondary" onclick="loadData('${tableName}', ${nextPage})">さらに読み込む</button>
+        </td>`;
+        tbody.appendChild(tr);
+    }
 }
 
 
@@ -238,11 +270,8 @@ function showAddForm(tableName) {
  */
 async function editItem(id, tableName) {
     try {
-        const response = await fetch(`/api/data/${tableName}`);
-        const data = await response.json();
-
-        // 該当するアイテムを検索
-        const item = data.data.find(d => d.id === id);
+        // 表示中のデータから該当するアイテムを検索
+        const item = (loadedData[tableName] || []).find(d => d.id === id);
         if (!item) {
             alert('データが見つかりません');
             return;
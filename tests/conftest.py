@@ -4,14 +4,17 @@ Pytest設定ファイル
 テスト用のフィクスチャと設定を定義します。
 """
 
+import functools
 import pytest
+import socket
 import sqlite3
 import tempfile
+import uuid
 import os
-import sys
 
-# プロジェクトルートをパスに追加
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+# チャットの応答をデータベースにキャッシュしない
+# （前回のテスト実行の応答を使い回したり、ai_secretary.db に書き込んだりしないため）
+os.environ.setdefault('MEMORY_ASSISTANT_LLM_CACHE', '0')
 
 import config
 
@@ -29,56 +32,164 @@ def test_db_path():
 
     yield path
 
-    # テスト後にファイルを削除
-    if os.path.exists(path):
-        os.remove(path)
+    # テスト後にファイルを削除（WALモードの付随ファイルも含む）
+    for file_path in (path, path + '-wal', path + '-shm'):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+@pytest.fixture(scope='module')
+def test_db_uri():
+    """
+    テスト用のインメモリデータベース（共有キャッシュ）のURIを提供するフィクスチャ
+
+    ディスクへの書き込みがないため、ファイルを使うより高速です。
+    全ての接続が閉じるとデータベースが消えるため、接続を1本開いたままにします。
+    テーブルの作成はテストモジュールごとに1回だけ行い、テストごとには test_db で中身を消します。
+    """
+    from app import database
+
+    uri = f"file:testdb_{uuid.uuid4().hex}?mode=memory&cache=shared"
+    keeper = sqlite3.connect(uri, uri=True)
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(config, 'DATABASE_PATH', uri)
+        monkeypatch.setattr(database, 'DATABASE_PATH', uri)
+        _reset_database_state(database)
+        database.init_database()
+
+        yield uri
+
+        _reset_database_state(database)
+
+    keeper.close()
 
 
 @pytest.fixture
-def test_db(test_db_path, monkeypatch):
+def test_db(test_db_uri, monkeypatch):
     """
     テスト用データベースをセットアップするフィクスチャ
 
-    config.DATABASE_PATHをテスト用のパスに置き換えます。
+    config.DATABASE_PATHをインメモリデータベースのURIに置き換え、
+    前のテストで書き込んだ行を全て消してから渡します（IDも1から振り直す）。
     """
-    # DATABASE_PATHをテスト用に置き換え
-    monkeypatch.setattr(config, 'DATABASE_PATH', test_db_path)
+    from app import database
+
+    monkeypatch.setattr(config, 'DATABASE_PATH', test_db_uri)
+    monkeypatch.setattr(database, 'DATABASE_PATH', test_db_uri)
+    _reset_database_state(database)
 
-    # appモジュールを再インポートする必要があるため、キャッシュをクリア
-    for module_name in list(sys.modules.keys()):
-        if module_name.startswith('app.'):
-            del sys.modules[module_name]
+    conn = database.get_connection()
+    tables = [
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )
+    ]
+    with database.write_batch():
+        for table in tables:
+            conn.execute(f'DELETE FROM "{table}"')
+        conn.execute('DELETE FROM sqlite_sequence')
 
-    # データベースモジュールをインポートして初期化
+    yield test_db_uri
+
+    _reset_database_state(database)
+
+
+@pytest.fixture
+def test_file_db(test_db_path, monkeypatch):
+    """
+    ファイルのテスト用データベースをセットアップするフィクスチャ
+
+    読み取り専用接続など、ファイルのデータベースでだけ使われる処理のテストに使います。
+    """
+    yield from _setup_database(test_db_path, monkeypatch)
+
+
+def _setup_database(database_path, monkeypatch):
+    """
+    DATABASE_PATHを置き換えてデータベースを初期化する
+
+    Args:
+        database_path: データベースファイルのパス、または file: 形式のURI
+        monkeypatch: pytest の monkeypatch フィクスチャ
+
+    Yields:
+        str: database_path
+    """
     from app import database
 
-    # database.pyでインポートされたDATABASE_PATHもパッチ
-    monkeypatch.setattr(database, 'DATABASE_PATH', test_db_path)
+    # DATABASE_PATHをテスト用に置き換え
+    # （接続プールとクエリキャッシュはパスごとに分かれるため、モジュールを読み込み直す必要はない）
+    monkeypatch.setattr(config, 'DATABASE_PATH', database_path)
+    monkeypatch.setattr(database, 'DATABASE_PATH', database_path)
+    _reset_database_state(database)
 
     database.init_database()
 
-    yield test_db_path
+    yield database_path
+
+    # テスト後のクリーンアップ（一時ファイルを削除できるよう接続を閉じる）
+    _reset_database_state(database)
+
+
+def _reset_database_state(database):
+    """
+    前のテストの接続・クエリキャッシュを破棄する
+
+    Args:
+        database: app.database モジュール
+    """
+    database.close_all_connections()
+    database._invalidate()
+
+
+@pytest.fixture(scope='session')
+def dead_server_url():
+    """
+    接続を即座に拒否されるサーバーのURLを提供するフィクスチャ
+
+    空いているポートを一度確保してすぐ閉じることで、
+    待ち受けているプロセスのないポートを得ます（接続はタイムアウトを待たずに拒否される）。
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
 
-    # テスト後のクリーンアップ
-    for module_name in list(sys.modules.keys()):
-        if module_name.startswith('app.'):
-            del sys.modules[module_name]
+@pytest.fixture(scope='module')
+def shared_ollama_client():
+    """
+    テストモジュール内で使い回すOllamaClientを提供するフィクスチャ
+
+    HTTP接続（keep-alive）をテスト間で使い回すため、クライアントはモジュールごとに1つだけ作ります。
+    """
+    from app.ollama_client import OllamaClient
+    client = OllamaClient(test_mode=True)
+
+    yield client
+
+    client.close()
 
 
 @pytest.fixture
-def ollama_client():
+def ollama_client(shared_ollama_client):
     """
     テスト用のOllamaClientインスタンスを提供するフィクスチャ
+
+    前のテストのログと応答キャッシュを消してから渡します
+    （同じプロンプトのテストでも毎回Ollamaに問い合わせるため）。
     """
-    from app.ollama_client import OllamaClient
-    client = OllamaClient()
-    client.clear_logs()
-    return client
+    shared_ollama_client.clear_logs()
+    with shared_ollama_client._cache_lock:
+        shared_ollama_client._response_cache.clear()
+    return shared_ollama_client
 
 
+@functools.lru_cache(maxsize=1)
 def is_ollama_available():
     """
-    Ollamaサーバーが利用可能かチェックする
+    Ollamaサーバーが利用可能かチェックする（結果はテスト実行中使い回す）
     """
     try:
         import requests
@@ -88,8 +199,17 @@ def is_ollama_available():
         return False
 
 
-# Ollamaが利用可能かどうかを示すマーカー
-requires_ollama = pytest.mark.skipif(
-    not is_ollama_available(),
-    reason="Ollamaサーバーが利用できません"
-)
+# Ollamaが必要な統合テストを示すマーカー
+# （既定では pytest.ini の設定で除外し、pytest -m integration で実行する）
+requires_ollama = pytest.mark.integration
+
+
+def pytest_runtest_setup(item):
+    """
+    統合テストの実行前に、Ollamaサーバーが利用できなければスキップする
+
+    サーバーへの問い合わせは統合テストを実行するときだけ行います
+    （テストの収集時には問い合わせない）。
+    """
+    if item.get_closest_marker('integration') and not is_ollama_available():
+        pytest.skip("Ollamaサーバーが利用できません")
@@ -7,11 +7,11 @@ app/database.py のユニットテストです。
 
 import pytest
 import sqlite3
-import sys
+import threading
 import os
 
-# プロジェクトルートをパスに追加
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from app import database
+from app.db_pool import SQLiteConnectionPool
 
 
 class TestDatabaseInit:
@@ -35,21 +35,40 @@ class TestDatabaseInit:
         assert 'user_goals' in tables
         assert 'assistant_requests' in tables
 
+    def test_init_database_creates_indexes(self, test_db):
+        """init_database が一覧取得用のインデックスを作成することを確認"""
+        conn = sqlite3.connect(test_db)
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
+        indexes = [row[0] for row in cursor.fetchall()]
+        conn.close()
+
+        assert 'idx_attr_updated' in indexes
+        assert 'idx_attr_name' in indexes
+        assert 'idx_mem_active_updated' in indexes
+        assert 'idx_goals_status_pri' in indexes
+        assert 'idx_req_active_updated' in indexes
+
+    def test_optimize_database_truncates_wal(self, test_db):
+        """optimize_database 実行後にWALファイルが切り詰められることを確認"""
+        database.add_memory("WALに書き込まれる記憶", "general")
+        database.optimize_database()
+
+        wal_path = test_db + '-wal'
+        assert not os.path.exists(wal_path) or os.path.getsize(wal_path) == 0
+
 
 class TestUserAttributes:
     """ユーザー属性（user_attributes）テーブルのテスト"""
 
     def test_add_attribute(self, test_db):
         """属性を追加できることを確認"""
-        from app import database
-
         record_id = database.add_attribute("名前", "テスト太郎")
         assert record_id > 0
 
     def test_add_attribute_updates_existing(self, test_db):
         """同じ属性名で追加すると更新されることを確認"""
-        from app import database
-
         id1 = database.add_attribute("年齢", "25歳")
         id2 = database.add_attribute("年齢", "26歳")
 
@@ -63,19 +82,28 @@ class TestUserAttributes:
 
     def test_get_all_attributes(self, test_db):
         """全ての属性を取得できることを確認"""
-        from app import database
-
-        database.add_attribute("名前", "テスト太郎")
-        database.add_attribute("年齢", "30歳")
-        database.add_attribute("職業", "エンジニア")
+        database.add_attributes_bulk([
+            ("名前", "テスト太郎"),
+            ("年齢", "30歳"),
+            ("職業", "エンジニア"),
+        ])
 
         attributes = database.get_all_attributes()
         assert len(attributes) == 3
 
+    def test_add_attributes_bulk(self, test_db):
+        """複数の属性をまとめて追加・更新できることを確認"""
+        database.add_attribute("年齢", "25歳")
+        count = database.add_attributes_bulk([("名前", "テスト太郎"), ("年齢", "26歳")])
+
+        assert count == 2
+
+        attributes = {a['attribute_name']: a['attribute_value']
+                      for a in database.get_all_attributes()}
+        assert attributes == {"名前": "テスト太郎", "年齢": "26歳"}
+
     def test_update_attribute(self, test_db):
         """属性を更新できることを確認"""
-        from app import database
-
         record_id = database.add_attribute("趣味", "読書")
         result = database.update_attribute(record_id, "ゲーム")
 
@@ -87,8 +115,6 @@ class TestUserAttributes:
 
     def test_delete_attribute(self, test_db):
         """属性を削除できることを確認"""
-        from app import database
-
         record_id = database.add_attribute("削除テスト", "値")
         result = database.delete_attribute(record_id)
 
@@ -103,25 +129,68 @@ class TestUserMemories:
 
     def test_add_memory(self, test_db):
         """記憶を追加できることを確認"""
-        from app import database
-
         record_id = database.add_memory("テスト記憶", "general")
         assert record_id > 0
 
     def test_add_memory_with_category(self, test_db):
         """カテゴリ付きで記憶を追加できることを確認"""
-        from app import database
-
         record_id = database.add_memory("好きな食べ物はラーメン", "preference")
         memories = database.get_all_memories()
 
         memory = next(m for m in memories if m['id'] == record_id)
         assert memory['memory_category'] == 'preference'
 
+    def test_add_memory_skips_duplicate_content(self, test_db):
+        """同じ内容の有効な記憶は追加せず、既存のIDを返すことを確認"""
+        id1 = database.add_memory("猫が好き", "preference")
+        id2 = database.add_memory("猫が好き", "general")
+
+        assert id2 == id1
+        assert len(database.get_all_memories()) == 1
+
+        # 論理削除した記憶と同じ内容は改めて追加できる
+        database.delete_memory(id1)
+        assert database.add_memory("猫が好き", "preference") != id1
+
+    def test_add_memories_bulk_skips_duplicates(self, test_db):
+        """まとめて追加するときも既存・同じ一括内の重複を除くことを確認"""
+        database.add_memory("犬を飼っている", "general")
+        count = database.add_memories_bulk([
+            ("犬を飼っている", "general"),
+            ("毎朝走る", "event"),
+            ("毎朝走る", "event"),
+        ])
+
+        assert count == 1
+        contents = sorted(m['memory_content'] for m in database.get_all_memories())
+        assert contents == ["毎朝走る", "犬を飼っている"]
+
+    def test_init_database_adds_content_hash_to_old_schema(self, test_db_path, monkeypatch):
+        """content_hash 列のない古いデータベースを移行できることを確認"""
+        conn = sqlite3.connect(test_db_path)
+        conn.execute(
+            "CREATE TABLE user_memories (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "memory_content TEXT NOT NULL, memory_category TEXT DEFAULT 'general', "
+            "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, "
+            "updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, "
+            "last_accessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, "
+            "access_count INTEGER DEFAULT 0, compression_level INTEGER DEFAULT 0, "
+            "is_active INTEGER DEFAULT 1)"
+        )
+        conn.execute("INSERT INTO user_memories (memory_content) VALUES ('古い記憶')")
+        conn.commit()
+        conn.close()
+
+        monkeypatch.setattr(database, 'DATABASE_PATH', test_db_path)
+        database.close_all_connections()
+
+        database.init_database()
+
+        # 移行前からある記憶とも重複を判定できる
+        assert database.add_memories_bulk([("古い記憶", "general")]) == 0
+
     def test_get_all_memories_active_only(self, test_db):
         """アクティブな記憶のみを取得できることを確認"""
-        from app import database
-
         id1 = database.add_memory("アクティブ記憶", "general")
         id2 = database.add_memory("削除予定記憶", "general")
         database.delete_memory(id2)  # 論理削除
@@ -130,20 +199,48 @@ class TestUserMemories:
         assert len(memories) == 1
         assert memories[0]['memory_content'] == "アクティブ記憶"
 
+    def test_get_memories_needing_compression(self, test_db):
+        """経過日数と現在の圧縮レベルから圧縮対象だけを取得できることを確認"""
+        ids = [database.add_memory(f"記憶{i}", "general") for i in range(4)]
+        with database.write_batch() as conn:
+            conn.executemany(
+                "UPDATE user_memories SET created_at = datetime('now', ?), "
+                "compression_level = ? WHERE id = ?",
+                [
+                    ('-3 days', 0, ids[0]),     # 新しいので対象外
+                    ('-40 days', 0, ids[1]),    # レベル1へ
+                    ('-400 days', 1, ids[2]),   # レベル3へ
+                    ('-40 days', 1, ids[3]),    # 圧縮済みなので対象外
+                ]
+            )
+
+        rows = database.get_memories_needing_compression(30, 90, 365)
+
+        assert [(row['id'], row['target_level']) for row in rows] == [(ids[1], 1), (ids[2], 3)]
+
     def test_get_recent_memories(self, test_db):
         """最近の記憶を取得できることを確認"""
-        from app import database
-
-        for i in range(15):
-            database.add_memory(f"記憶{i}", "general")
+        database.add_memories_bulk([(f"記憶{i}", "general") for i in range(15)])
 
         recent = database.get_recent_memories(limit=5)
         assert len(recent) == 5
 
+    def test_get_all_memories_paginated(self, test_db):
+        """limit と offset でページ単位に取得できることを確認"""
+        for i in range(5):
+            database.add_memory(f"記憶{i}", "general")
+
+        first_page = database.get_all_memories(limit=2)
+        last_page = database.get_all_memories(limit=2, offset=4)
+
+        assert len(first_page) == 2
+        assert len(last_page) == 1
+        # 更新日時が同じ場合はIDの降順で並ぶ
+        assert [m['memory_content'] for m in first_page] == ["記憶4", "記憶3"]
+        assert last_page[0]['memory_content'] == "記憶0"
+
     def test_update_memory(self, test_db):
         """記憶を更新できることを確認"""
-        from app import database
-
         record_id = database.add_memory("元の記憶", "general")
         result = database.update_memory(record_id, "更新された記憶")
 
@@ -153,10 +250,23 @@ class TestUserMemories:
         memory = next(m for m in memories if m['id'] == record_id)
         assert memory['memory_content'] == "更新された記憶"
 
+    def test_update_memory_unchanged_skips_write(self, test_db):
+        """同じ内容で更新した場合は書き込まずに成功を返すことを確認"""
+        record_id = database.add_memory("変わらない記憶", "general")
+        conn = database.get_connection()
+        conn.execute(
+            "UPDATE user_memories SET updated_at = '2000-01-01 00:00:00' WHERE id = ?",
+            (record_id,)
+        )
+
+        assert database.update_memory(record_id, "変わらない記憶") is True
+        assert database.update_memory(9999, "存在しない記憶") is False
+
+        memory = next(m for m in database.get_all_memories() if m['id'] == record_id)
+        assert memory['updated_at'] == '2000-01-01 00:00:00'
+
     def test_delete_memory_logical(self, test_db):
         """記憶を論理削除できることを確認"""
-        from app import database
-
         record_id = database.add_memory("論理削除テスト", "general")
         result = database.delete_memory(record_id, hard_delete=False)
 
@@ -172,8 +282,6 @@ class TestUserMemories:
 
     def test_delete_memory_hard(self, test_db):
         """記憶を物理削除できることを確認"""
-        from app import database
-
         record_id = database.add_memory("物理削除テスト", "general")
         result = database.delete_memory(record_id, hard_delete=True)
 
@@ -185,8 +293,6 @@ class TestUserMemories:
 
     def test_increment_memory_access(self, test_db):
         """記憶のアクセス回数をインクリメントできることを確認"""
-        from app import database
-
         record_id = database.add_memory("アクセステスト", "general")
 
         # 3回アクセス
@@ -203,18 +309,12 @@ class TestUserGoals:
 
     def test_add_goal(self, test_db):
         """目標を追加できることを確認"""
-        from app import database
-
         record_id = database.add_goal("テスト目標", priority=3)
         assert record_id > 0
 
     def test_get_all_goals(self, test_db):
         """全ての目標を取得できることを確認"""
-        from app import database
-
-        database.add_goal("目標1", priority=5)
-        database.add_goal("目標2", priority=3)
-        database.add_goal("目標3", priority=1)
+        database.add_goals_bulk([("目標1", 5), ("目標2", 3), ("目標3", 1)])
 
         goals = database.get_all_goals()
         assert len(goals) == 3
@@ -224,8 +324,6 @@ class TestUserGoals:
 
     def test_get_all_goals_with_filter(self, test_db):
         """状態フィルタ付きで目標を取得できることを確認"""
-        from app import database
-
         id1 = database.add_goal("進行中目標", priority=5)
         id2 = database.add_goal("完了目標", priority=3)
         database.update_goal(id2, goal_status='completed')
@@ -240,8 +338,6 @@ class TestUserGoals:
 
     def test_update_goal(self, test_db):
         """目標を更新できることを確認"""
-        from app import database
-
         record_id = database.add_goal("元の目標", priority=5)
         result = database.update_goal(
             record_id,
@@ -258,8 +354,6 @@ class TestUserGoals:
 
     def test_update_goal_status_to_completed(self, test_db):
         """目標を完了状態に更新するとcompleted_atが設定されることを確認"""
-        from app import database
-
         record_id = database.add_goal("完了テスト目標")
         database.update_goal(record_id, goal_status='completed')
 
@@ -271,8 +365,6 @@ class TestUserGoals:
 
     def test_delete_goal(self, test_db):
         """目標を削除できることを確認"""
-        from app import database
-
         record_id = database.add_goal("削除テスト目標")
         result = database.delete_goal(record_id)
 
@@ -287,25 +379,21 @@ class TestAssistantRequests:
 
     def test_add_request(self, test_db):
         """お願いを追加できることを確認"""
-        from app import database
-
         record_id = database.add_request("丁寧に話してください", "tone")
         assert record_id > 0
 
     def test_get_all_requests(self, test_db):
         """全てのお願いを取得できることを確認"""
-        from app import database
-
-        database.add_request("丁寧に話してください", "tone")
-        database.add_request("短く答えてください", "format")
+        database.add_requests_bulk([
+            ("丁寧に話してください", "tone"),
+            ("短く答えてください", "format"),
+        ])
 
         requests = database.get_all_requests()
         assert len(requests) == 2
 
     def test_get_all_requests_active_only(self, test_db):
         """アクティブなお願いのみを取得できることを確認"""
-        from app import database
-
         id1 = database.add_request("アクティブなお願い", "general")
         id2 = database.add_request("削除予定のお願い", "general")
         database.delete_request(id2)
@@ -316,8 +404,6 @@ class TestAssistantRequests:
 
     def test_update_request(self, test_db):
         """お願いを更新できることを確認"""
-        from app import database
-
         record_id = database.add_request("元のお願い", "general")
         result = database.update_request(record_id, "更新されたお願い")
 
@@ -329,8 +415,6 @@ class TestAssistantRequests:
 
     def test_delete_request(self, test_db):
         """お願いを削除できることを確認"""
-        from app import database
-
         record_id = database.add_request("削除テストお願い", "general")
         result = database.delete_request(record_id)
 
@@ -343,41 +427,223 @@ class TestAssistantRequests:
 class TestCompressionLevel:
     """圧縮レベル更新のテスト"""
 
-    def test_update_compression_level_for_attribute(self, test_db):
-        """属性の圧縮レベルを更新できることを確認"""
-        from app import database
-
-        record_id = database.add_attribute("テスト属性", "値")
-        result = database.update_compression_level(
-            'user_attributes', record_id, 2
-        )
+    @pytest.mark.parametrize("table_name,add_record,get_records,level", [
+        ('user_attributes', lambda: database.add_attribute("テスト属性", "値"),
+         database.get_all_attributes, 2),
+        ('user_memories', lambda: database.add_memory("テスト記憶", "general"),
+         database.get_all_memories, 3),
+    ], ids=['attribute', 'memory'])
+    def test_update_compression_level(self, test_db, table_name, add_record,
+                                      get_records, level):
+        """属性・記憶の圧縮レベルを更新できることを確認"""
+        record_id = add_record()
+        result = database.update_compression_level(table_name, record_id, level)
 
         assert result is True
 
-        attributes = database.get_all_attributes()
-        attr = next(a for a in attributes if a['id'] == record_id)
-        assert attr['compression_level'] == 2
+        record = next(r for r in get_records() if r['id'] == record_id)
+        assert record['compression_level'] == level
 
-    def test_update_compression_level_for_memory(self, test_db):
-        """記憶の圧縮レベルを更新できることを確認"""
-        from app import database
+    def test_update_compression_level_invalid_table(self, test_db):
+        """不正なテーブル名でエラーが発生することを確認"""
+        with pytest.raises(ValueError) as exc_info:
+            database.update_compression_level('invalid_table', 1, 1)
 
-        record_id = database.add_memory("テスト記憶", "general")
-        result = database.update_compression_level(
-            'user_memories', record_id, 3
+        assert "不正なテーブル名" in str(exc_info.value)
+
+    def test_update_compression_levels_bulk(self, test_db):
+        """複数レコードの圧縮レベルをまとめて更新できることを確認"""
+        id1 = database.add_memory("記憶1", "general")
+        id2 = database.add_memory("記憶2", "general")
+        updated = database.update_compression_levels_bulk(
+            'user_memories', [(id1, 1), (id2, 2)]
         )
 
-        assert result is True
+        assert updated == 2
+
+        levels = {m['id']: m['compression_level'] for m in database.get_all_memories()}
+        assert levels == {id1: 1, id2: 2}
+
+
+
+class TestLLMCache:
+    """LLM出力キャッシュのテスト"""
+
+    def test_save_and_get_llm_outputs(self, test_db):
+        """保存した出力をプロンプトのハッシュで取得できることを確認"""
+        key1 = database.prompt_hash("プロンプト1")
+        key2 = database.prompt_hash("プロンプト2")
+        saved = database.save_llm_outputs([(key1, "出力1"), (key2, "出力2")])
+
+        assert saved == 2
+        assert database.get_cached_llm_outputs([key1, "未登録"]) == {key1: "出力1"}
+        assert database.get_cached_llm_outputs([]) == {}
+
+        database.save_llm_outputs([(key1, "出力1（更新）")])
+        assert database.get_cached_llm_outputs([key1]) == {key1: "出力1（更新）"}
+
+    def test_prune_llm_cache_removes_old_outputs(self, test_db):
+        """保持期間を過ぎた出力だけを削除できることを確認"""
+        old_key = database.prompt_hash("古いプロンプト", "model")
+        new_key = database.prompt_hash("新しいプロンプト", "model")
+        database.save_llm_outputs([(old_key, "古い出力"), (new_key, "新しい出力")])
+        with database.write_batch() as conn:
+            conn.execute(
+                "UPDATE llm_cache SET created_at = datetime('now', '-40 days') WHERE hash = ?",
+                (old_key,)
+            )
+
+        assert database.prune_llm_cache(30) == 1
+        assert database.get_cached_llm_outputs([old_key, new_key]) == {new_key: "新しい出力"}
+        # モデルが違えば別のキーになる
+        assert database.prompt_hash("新しいプロンプト", "other") != new_key
+
+    def test_get_recent_llm_output(self, test_db):
+        """保存してから指定秒数以内の出力だけを、経過秒数とともに取得できることを確認"""
+        old_key = database.prompt_hash("古い応答")
+        new_key = database.prompt_hash("新しい応答")
+        database.save_llm_outputs([(old_key, "古い出力"), (new_key, "新しい出力")])
+        with database.write_batch() as conn:
+            conn.execute(
+                "UPDATE llm_cache SET created_at = datetime('now', '-10 minutes') WHERE hash = ?",
+                (old_key,)
+            )
+
+        assert database.get_recent_llm_output(old_key, 300) is None
+        output, age = database.get_recent_llm_output(new_key, 300)
+        assert output == "新しい出力"
+        assert 0 <= age < 60
+        # 期間を指定しない一括取得では古い出力も返す
+        assert len(database.get_cached_llm_outputs([old_key, new_key])) == 2
+
+
+class TestConnectionPool:
+    """接続プール（SQLiteConnectionPool）のテスト"""
+
+    def test_pool_reuses_connection_per_thread(self, test_db):
+        """同じスレッドでは同じ接続、別スレッドでは別の接続が返ることを確認"""
+        pool = SQLiteConnectionPool("PRAGMA foreign_keys=ON;")
+        conn = pool.get(test_db)
+        assert pool.get(test_db) is conn
+        assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(pool.get(test_db)))
+        thread.start()
+        thread.join()
+        assert other[0] is not conn
+
+        pool.close_all()
+
+    def test_pool_reopens_after_close_all(self, test_db):
+        """close_all の後は新しい接続が開かれることを確認"""
+        pool = SQLiteConnectionPool()
+        conn = pool.get(test_db)
+        pool.close_all()
+
+        assert pool.peek() is None
+        new_conn = pool.get(test_db)
+        assert new_conn is not conn
+        assert new_conn.execute("SELECT 1").fetchone()[0] == 1
+
+        pool.close_all()
+
+
+class TestReadOnlyConnection:
+    """読み取り専用接続のテスト"""
+
+    def test_ro_connection_rejects_writes(self, test_file_db):
+        """読み取り専用接続では書き込みができないことを確認"""
+        conn = database.get_ro_connection()
+        assert conn is not database.get_connection()
+
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM user_memories")
+
+    def test_cached_reads_do_not_open_write_connection(self, test_file_db):
+        """読み取りだけのスレッドでは書き込み用接続を開かないことを確認"""
+        opened = []
+
+        def read():
+            database.get_all_attributes()
+            opened.append(database._rw_pool.peek())
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+
+        assert opened == [None]
+
+    def test_reads_see_uncommitted_writes_in_batch(self, test_db):
+        """トランザクション中は未確定の書き込みも読み取れることを確認"""
+        with database.write_batch():
+            database.add_memory("未確定の記憶", "general")
+            assert len(database.get_all_memories()) == 1
+
+
+class TestWriteBatch:
+    """書き込みバッチ（write_batch）のテスト"""
+
+    def test_write_batch_commits_all(self, test_db):
+        """ブロック内の書き込みがまとめて確定されることを確認"""
+        with database.write_batch():
+            database.add_attribute("名前", "テスト太郎")
+            database.add_memory("バッチ記憶", "general")
+
+        assert len(database.get_all_attributes()) == 1
+        assert len(database.get_all_memories()) == 1
+
+    def test_write_batch_rolls_back_on_error(self, test_db):
+        """例外が発生した場合に全ての書き込みが取り消されることを確認"""
+        with pytest.raises(RuntimeError):
+            with database.write_batch():
+                database.add_memory("取り消される記憶", "general")
+                raise RuntimeError("テスト用エラー")
+
+        assert database.get_all_memories() == []
+
+    def test_write_batch_nested(self, test_db):
+        """入れ子のバッチで内側だけを取り消せることを確認"""
+        with database.write_batch():
+            database.add_memory("外側の記憶", "general")
+            with pytest.raises(RuntimeError):
+                with database.write_batch():
+                    database.add_memory("内側の記憶", "general")
+                    raise RuntimeError("テスト用エラー")
 
         memories = database.get_all_memories()
-        memory = next(m for m in memories if m['id'] == record_id)
-        assert memory['compression_level'] == 3
+        assert [m['memory_content'] for m in memories] == ["外側の記憶"]
 
-    def test_update_compression_level_invalid_table(self, test_db):
-        """不正なテーブル名でエラーが発生することを確認"""
-        from app import database
 
-        with pytest.raises(ValueError) as exc_info:
-            database.update_compression_level('invalid_table', 1, 1)
+class TestQueryCache:
+    """クエリ結果キャッシュのテスト"""
 
-        assert "不正なテーブル名" in str(exc_info.value)
+    def test_get_all_attributes_is_cached(self, test_db):
+        """一覧取得の結果がキャッシュされることを確認"""
+        database.add_attribute("名前", "テスト太郎")
+        assert len(database.get_all_attributes()) == 1
+
+        # キャッシュを経由しない別接続で直接書き込む
+        conn = sqlite3.connect(test_db)
+        conn.execute(
+            "INSERT INTO user_attributes (attribute_name, attribute_value) VALUES (?, ?)",
+            ("年齢", "30歳")
+        )
+        conn.commit()
+        conn.close()
+
+        assert len(database.get_all_attributes()) == 1
+
+    def test_mutation_invalidates_cache(self, test_db):
+        """追加・更新・削除でキャッシュが破棄されることを確認"""
+        goal_id = database.add_goal("目標1")
+        assert len(database.get_all_goals()) == 1
+
+        database.add_goal("目標2")
+        assert len(database.get_all_goals()) == 2
+
+        database.update_goal(goal_id, goal_status='completed')
+        assert len(database.get_all_goals(status_filter='active')) == 1
+
+        database.delete_goal(goal_id)
+        assert len(database.get_all_goals()) == 1
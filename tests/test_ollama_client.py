@@ -9,12 +9,17 @@ app/ollama_client.py のユニットテストです。
 """
 
 import pytest
-import sys
-import os
-
-# プロジェクトルートをパスに追加
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import config
+from app import database
+from app.ollama_client import (
+    OllamaClient,
+    DEFAULT_SYSTEM_PROMPT,
+    get_ollama_client,
+    _build_messages
+)
 from tests.conftest import requires_ollama
 
 
@@ -23,20 +28,14 @@ class TestOllamaClientUnit:
 
     def test_client_initialization_default(self):
         """デフォルト設定でクライアントを初期化できることを確認"""
-        from app.ollama_client import OllamaClient
-        import config
-
         client = OllamaClient()
 
         assert client.base_url == config.OLLAMA_BASE_URL
         assert client.model == config.OLLAMA_MODEL
-        assert client.request_log == []
-        assert client.response_log == []
+        assert client.get_logs() == {'requests': [], 'responses': []}
 
     def test_client_initialization_custom(self):
         """カスタム設定でクライアントを初期化できることを確認"""
-        from app.ollama_client import OllamaClient
-
         client = OllamaClient(
             base_url="http://custom:8080",
             model="custom-model"
@@ -45,10 +44,170 @@ class TestOllamaClientUnit:
         assert client.base_url == "http://custom:8080"
         assert client.model == "custom-model"
 
+    def test_client_reuses_http_connections(self):
+        """HTTP接続を使い回すセッションを持つことを確認"""
+        client = OllamaClient()
+        adapter = client._session.get_adapter(client.base_url)
+
+        assert adapter._pool_maxsize == config.OLLAMA_HTTP_POOL_SIZE
+        client.close()
+
+    def test_generate_stream_parses_lines(self):
+        """ストリーミング応答の各行から断片を取り出し、全体をログに記録することを確認"""
+        client = OllamaClient(test_mode=True)
+        response = MagicMock()
+        response.__enter__.return_value = response
+        response.iter_lines.return_value = [
+            '{"message": {"content": "こんに"}}'.encode(),
+            b'',
+            '{"message": {"content": "ちは"}}'.encode(),
+            b'{"done": true}',
+        ]
+
+        with patch.object(client._session, 'post', return_value=response):
+            chunks = list(client.generate_stream("テスト"))
+
+        assert chunks == ["こんに", "ちは"]
+        assert client.response_log[-1] == {'content': "こんにちは"}
+
+    def test_messages_are_built_in_order(self):
+        """システムプロンプト、コンテキスト、履歴、入力の順にメッセージを組み立てることを確認"""
+        history = [{'role': 'user', 'content': '前の発言'}]
+        messages = _build_messages("今の発言", "指示", "名前: 太郎", history)
+
+        assert [m['role'] for m in messages] == ['system', 'system', 'user', 'user']
+        assert messages[1]['content'].endswith("名前: 太郎")
+        assert messages[-1] == {'role': 'user', 'content': "今の発言"}
+        assert _build_messages("入力", None, None, None) == [{'role': 'user', 'content': "入力"}]
+
+    def test_logs_are_not_kept_outside_test_mode(self):
+        """テストモードでなければ通信ログを溜め込まないことを確認"""
+        client = OllamaClient(test_mode=False)
+        response = MagicMock()
+        response.__enter__.return_value = response
+        response.iter_lines.return_value = [b'{"message": {"content": "ok"}}']
+
+        with patch.object(client._session, 'post', return_value=response):
+            assert list(client.generate_stream("テスト")) == ["ok"]
+
+        assert client.get_logs() == {'requests': [], 'responses': []}
+
+    def test_log_flag_is_per_call(self):
+        """呼び出しごとの log 指定で、test_mode を変えずにログを記録できることを確認"""
+        client = OllamaClient(test_mode=False)
+        response = MagicMock()
+        response.content = '{"message": {"content": "ok"}}'.encode()
+
+        with patch.object(client._session, 'post', return_value=response):
+            client.generate("記録する", log=True)
+            client.generate("記録しない")
+
+        logs = client.get_logs()
+        assert client.test_mode is False
+        assert [r['data']['messages'][-1]['content'] for r in logs['requests']] == ["記録する"]
+        assert len(logs['responses']) == 1
+
+    def test_generate_reuses_cached_response(self):
+        """同じ内容のリクエストにはLLMを呼び出さずに応答することを確認"""
+        client = OllamaClient(test_mode=True)
+        response = MagicMock()
+        response.content = '{"message": {"content": "こんにちは！"}}'.encode()
+
+        with patch.object(client._session, 'post', return_value=response) as mock_post:
+            first = client.generate("こんにちは", system_prompt="テスト")
+            second = client.generate("こんにちは", system_prompt="テスト")
+            other = client.generate("こんばんは", system_prompt="テスト")
+
+        assert first == second == other == "こんにちは！"
+        assert mock_post.call_count == 2
+        assert client.response_log[1] == {'content': "こんにちは！", 'cached': True}
+
+    def test_cached_response_expires_after_session_timeout(self, monkeypatch):
+        """セッションの有効期間を過ぎたメモリ上の応答は使い回さないことを確認"""
+        clock = [1000.0]
+        monkeypatch.setattr('app.ollama_client.time', SimpleNamespace(monotonic=lambda: clock[0]))
+        client = OllamaClient()
+        response = MagicMock()
+        response.content = '{"message": {"content": "こんにちは！"}}'.encode()
+
+        with patch.object(client._session, 'post', return_value=response) as mock_post:
+            client.generate("こんにちは")
+            clock[0] += config.SESSION_TIMEOUT_SECONDS - 1
+            client.generate("こんにちは")
+            assert mock_post.call_count == 1
+
+            clock[0] += 2
+            client.generate("こんにちは")
+            assert mock_post.call_count == 2
+
+    def test_disk_cached_response_keeps_its_age_in_memory(self, test_db, monkeypatch):
+        """データベースから読み込んだ応答は、保存した時点から期限を数えることを確認"""
+        monkeypatch.setattr('app.ollama_client.OLLAMA_DISK_CACHE', True)
+        response = MagicMock()
+        response.content = '{"message": {"content": "保存された応答"}}'.encode()
+        writer = OllamaClient()
+        with patch.object(writer._session, 'post', return_value=response):
+            writer.generate("こんにちは")
+
+        def set_saved_seconds_ago(seconds):
+            with database.write_batch() as conn:
+                conn.execute("UPDATE llm_cache SET created_at = datetime('now', ?)",
+                             (f'-{seconds} seconds',))
+
+        # 期限の10秒前に保存されたことにする
+        set_saved_seconds_ago(config.SESSION_TIMEOUT_SECONDS - 10)
+
+        clock = [1000.0]
+        monkeypatch.setattr('app.ollama_client.time', SimpleNamespace(monotonic=lambda: clock[0]))
+        reader = OllamaClient()
+        with patch.object(reader._session, 'post', return_value=response) as mock_post:
+            reader.generate("こんにちは")
+            assert mock_post.call_count == 0
+
+            # メモリに移した時点から数え直さず、元の期限で切れる
+            clock[0] += 20
+            set_saved_seconds_ago(config.SESSION_TIMEOUT_SECONDS + 10)
+            reader.generate("こんにちは")
+            assert mock_post.call_count == 1
+
+    def test_generate_reuses_response_saved_in_database(self, test_db, monkeypatch):
+        """データベースに保存した応答を、新しいクライアント（再起動後）でも使い回すことを確認"""
+        monkeypatch.setattr('app.ollama_client.OLLAMA_DISK_CACHE', True)
+        response = MagicMock()
+        response.content = '{"message": {"content": "保存された応答"}}'.encode()
+
+        first = OllamaClient()
+        with patch.object(first._session, 'post', return_value=response) as mock_post:
+            assert first.generate("こんにちは") == "保存された応答"
+        assert mock_post.call_count == 1
+
+        second = OllamaClient()
+        with patch.object(second._session, 'post', return_value=response) as mock_post:
+            assert second.generate("こんにちは") == "保存された応答"
+        assert mock_post.call_count == 0
+
+        # セッションの有効期間を過ぎた応答は使い回さない
+        with database.write_batch() as conn:
+            conn.execute("UPDATE llm_cache SET created_at = datetime('now', '-1 day')")
+        third = OllamaClient()
+        with patch.object(third._session, 'post', return_value=response) as mock_post:
+            third.generate("こんにちは")
+        assert mock_post.call_count == 1
+
+    def test_model_list_is_reused_within_ttl(self):
+        """接続確認とモデル一覧の取得で /api/tags の結果を使い回すことを確認"""
+        client = OllamaClient(base_url="http://tags-cache-test:11434")
+        response = MagicMock()
+        response.content = b'{"models": [{"name": "llama3.1:8b"}]}'
+
+        with patch.object(client._session, 'get', return_value=response) as mock_get:
+            assert client.check_connection() is True
+            assert client.get_available_models() == ["llama3.1:8b"]
+
+        assert mock_get.call_count == 1
+
     def test_clear_logs(self):
         """ログをクリアできることを確認"""
-        from app.ollama_client import OllamaClient
-
         client = OllamaClient()
         client.request_log = [{"test": "data"}]
         client.response_log = [{"test": "data"}]
@@ -60,8 +219,6 @@ class TestOllamaClientUnit:
 
     def test_get_logs(self):
         """ログを取得できることを確認"""
-        from app.ollama_client import OllamaClient
-
         client = OllamaClient()
         client.request_log = [{"request": "test"}]
         client.response_log = [{"response": "test"}]
@@ -73,16 +230,12 @@ class TestOllamaClientUnit:
 
     def test_default_system_prompt_exists(self):
         """デフォルトシステムプロンプトが定義されていることを確認"""
-        from app.ollama_client import DEFAULT_SYSTEM_PROMPT
-
         assert DEFAULT_SYSTEM_PROMPT is not None
         assert len(DEFAULT_SYSTEM_PROMPT) > 0
         assert "AI秘書" in DEFAULT_SYSTEM_PROMPT
 
     def test_get_ollama_client_singleton(self):
         """get_ollama_clientがシングルトンを返すことを確認"""
-        from app.ollama_client import get_ollama_client
-
         client1 = get_ollama_client()
         client2 = get_ollama_client()
 
@@ -92,32 +245,27 @@ class TestOllamaClientUnit:
 class TestOllamaClientConnectionError:
     """接続エラー時の動作テスト"""
 
-    def test_generate_connection_error(self):
+    def test_generate_connection_error(self, dead_server_url):
         """サーバーに接続できない場合のエラーハンドリングを確認"""
-        from app.ollama_client import OllamaClient
-
-        # 存在しないサーバーに接続
-        client = OllamaClient(base_url="http://localhost:99999")
+        # 待ち受けていないポートに接続
+        client = OllamaClient(base_url=dead_server_url, test_mode=True)
         response = client.generate("テスト")
 
         assert "エラー" in response
+        assert "接続できません" in response
         assert len(client.response_log) > 0
         assert 'error' in client.response_log[-1]
 
-    def test_check_connection_failure(self):
+    def test_check_connection_failure(self, dead_server_url):
         """接続確認が失敗することを確認"""
-        from app.ollama_client import OllamaClient
-
-        client = OllamaClient(base_url="http://localhost:99999")
+        client = OllamaClient(base_url=dead_server_url)
         result = client.check_connection()
 
         assert result is False
 
-    def test_get_available_models_failure(self):
+    def test_get_available_models_failure(self, dead_server_url):
         """モデル取得が失敗した場合に空リストを返すことを確認"""
-        from app.ollama_client import OllamaClient
-
-        client = OllamaClient(base_url="http://localhost:99999")
+        client = OllamaClient(base_url=dead_server_url)
         models = client.get_available_models()
 
         assert models == []
@@ -155,8 +303,6 @@ class TestOllamaClientIntegration:
 
     def test_generate_with_system_prompt(self, ollama_client):
         """システムプロンプト付きで応答を生成できることを確認"""
-        from app.ollama_client import DEFAULT_SYSTEM_PROMPT
-
         response = ollama_client.generate(
             "こんにちは",
             system_prompt=DEFAULT_SYSTEM_PROMPT
@@ -241,18 +387,17 @@ class TestOllamaClientStreaming:
 
     def test_generate_stream(self, ollama_client):
         """ストリーミングモードで応答を生成できることを確認"""
-        chunks = list(ollama_client.generate_stream("こんにちは"))
-
-        assert len(chunks) > 0
         # 全てのチャンクを結合すると応答になる
-        full_response = ''.join(chunks)
+        full_response = ''.join(ollama_client.generate_stream("こんにちは"))
+
         assert len(full_response) > 0
         assert "ストリーミングエラー" not in full_response
 
     def test_generate_stream_logs(self, ollama_client):
         """ストリーミングモードでもログが記録されることを確認"""
         # ストリーミング応答を全て消費
-        list(ollama_client.generate_stream("テスト"))
+        for _ in ollama_client.generate_stream("テスト"):
+            pass
 
         logs = ollama_client.get_logs()
         assert len(logs['requests']) > 0
@@ -265,8 +410,6 @@ class TestOllamaClientEndToEnd:
 
     def test_conversation_flow(self, ollama_client):
         """会話フローが正しく動作することを確認"""
-        from app.ollama_client import DEFAULT_SYSTEM_PROMPT
-
         history = []
 
         # 最初のメッセージ
@@ -9,23 +9,30 @@ LLM処理のテストを行います。
 """
 
 import pytest
+from contextlib import nullcontext
 from unittest.mock import Mock, patch, MagicMock
 from pydantic import BaseModel, Field
 from typing import List
 
-from app.structured_llm_client import StructuredLLMClient
+from app.structured_llm_client import StructuredLLMClient, _model_schema
 from app.extraction_models import (
     ExtractedMemories,
     AttributeItem,
     MemoryItem,
     GoalItem,
     RequestItem,
-    DuplicateList,
+    BatchExtractedMemories,
+    TurnExtractedMemories,
     DuplicatePair,
-    FormattedText
+    FormattedText,
+    FormattedItem,
+    FormattedTextList,
+    MergedContent,
+    CompressedContent
 )
-from app.memory_extractor import MemoryExtractor
-from app.memory_organizer import MemoryOrganizer
+from app.memory_extractor import MemoryExtractor, EXTRACTION_SYSTEM_PROMPT
+from app import memory_organizer
+from app.memory_organizer import MemoryOrganizer, FORMAT_PROMPT, FORMAT_SYSTEM_PROMPT
 
 
 # テスト用のPydanticモデル
@@ -66,6 +73,16 @@ class TestStructuredLLMClient:
 
             # LLMが2回呼び出されたことを確認
             assert mock_call.call_count == 2
+            # 構造化データへの変換ではスキーマで出力を制約する
+            assert 'format' not in mock_call.call_args_list[0].kwargs
+            assert mock_call.call_args_list[1].kwargs['format'] == SimplePerson.model_json_schema()
+            # 変換はステップ1の会話の続きとして依頼し、元のタスクを送り直さない
+            stage1_prompt = mock_call.call_args_list[0].args[0]
+            assert mock_call.call_args_list[1].kwargs['history'] == [
+                {'role': 'user', 'content': stage1_prompt},
+                {'role': 'assistant', 'content': stage1_response},
+            ]
+            assert "私は田中太郎で" not in mock_call.call_args_list[1].args[0]
 
     def test_direct_generation_with_mock(self):
         """1段階生成のテスト（モック使用）"""
@@ -87,6 +104,30 @@ class TestStructuredLLMClient:
             assert result.age == 25
             assert mock_call.call_count == 1
 
+    def test_schema_is_built_once_per_model(self):
+        """スキーマはモデルごとに1回だけ生成し、JSON文字列でプロンプトに埋め込むことを確認"""
+        client = StructuredLLMClient()
+        _model_schema.cache_clear()
+
+        with patch.object(client, '_call_ollama', return_value='{"name": "a", "age": 1}') as mock_call, \
+                patch.object(SimplePerson, 'model_json_schema',
+                             wraps=SimplePerson.model_json_schema) as mock_schema:
+            client.generate_structured("a", SimplePerson, enable_two_stage=False)
+            client.generate_structured("b", SimplePerson, enable_two_stage=False)
+
+        assert mock_schema.call_count == 1
+        assert '"properties"' in mock_call.call_args.args[0]
+
+    def test_logs_only_in_test_mode(self):
+        """テストモードのときだけ通信ログを記録することを確認"""
+        for test_mode, expected in ((False, 0), (True, 1)):
+            client = StructuredLLMClient(test_mode=test_mode)
+            with patch.object(client, '_call_ollama', return_value='{"name": "a", "age": 1}'):
+                client.generate_structured("a", SimplePerson, enable_two_stage=False)
+
+            logs = client.get_logs()
+            assert len(logs['requests']) == len(logs['responses']) == expected
+
     def test_json_extraction(self):
         """JSON抽出のテスト"""
         client = StructuredLLMClient()
@@ -101,6 +142,15 @@ class TestStructuredLLMClient:
         result2 = client._extract_json(text2)
         assert '{"name": "test2", "age": 30}' in result2
 
+        # 思考部分の後ろに続くJSON（途中の「[」はJSONとして読めないので飛ばす）
+        text3 = '[考察] 名前はtest3です。\n{"name": "test3", "age": 40} 以上です。'
+        result3 = client._extract_json(text3)
+        assert result3 == '{"name": "test3", "age": 40}'
+
+        # スキーマ指定時の応答（全体がJSON）
+        text4 = '\n{"name": "テスト4", "age": 50}\n'
+        assert client._parse_to_model(text4, SimplePerson).name == "テスト4"
+
 
 class TestMemoryExtractorWithMock:
     """記憶抽出のテスト（モック使用）"""
@@ -190,48 +240,299 @@ class TestMemoryExtractorWithMock:
                 'requests': []
             }
 
+    def test_extract_memories_sends_static_part_as_system_prompt(self):
+        """固定部分をシステムプロンプトとして送り、会話部分だけをプロンプトにするテスト"""
+        extractor = MemoryExtractor()
+
+        with patch.object(extractor.client, 'generate_structured') as mock_gen:
+            mock_gen.return_value = ExtractedMemories()
+
+            extractor.extract_memories(user_input="猫が好きです", ai_response="")
+
+            kwargs = mock_gen.call_args.kwargs
+            assert kwargs['system_prompt'] == EXTRACTION_SYSTEM_PROMPT
+            assert "猫が好きです" in kwargs['prompt']
+            assert "## ルール" not in kwargs['prompt']
+
+    def test_extraction_log_skipped_outside_test_mode(self):
+        """テストモードでなければログを記録しないテスト"""
+        extractor = MemoryExtractor(test_mode=False)
+
+        with patch.object(extractor.client, 'generate_structured') as mock_gen:
+            mock_gen.return_value = ExtractedMemories()
+
+            extractor.extract_memories(user_input="こんにちは", ai_response="")
+
+        assert extractor.get_logs() == []
+
+    def test_pending_turns_keep_their_log_flag(self):
+        """キューに入れた時点のログ記録有無で、会話ごとにログを記録するテスト"""
+        extractor = MemoryExtractor(test_mode=False)
+        extractor.enqueue_input("テストモードの発言", log=True)
+        extractor.enqueue_input("通常の発言", log=False)
+
+        with patch.object(extractor.client, 'generate_structured') as mock_gen:
+            mock_gen.return_value = ExtractedMemories()
+            results = extractor.process_pending()
+
+        # ログの記録有無が異なる会話は別々に抽出する
+        assert len(results) == 2
+        assert mock_gen.call_count == 2
+        logged_inputs = [log['user_input'] for log in extractor.get_logs()
+                         if log['type'] == 'extraction_request']
+        assert logged_inputs == ["テストモードの発言"]
+
+    def test_extraction_log_is_bounded(self):
+        """抽出ログが上限を超えると古いものから捨てられるテスト"""
+        extractor = MemoryExtractor()
+        maxlen = extractor.extraction_log.maxlen
+
+        for i in range(maxlen + 10):
+            extractor.extraction_log.append({'type': 'test', 'index': i})
+
+        logs = extractor.get_logs()
+        assert len(logs) == maxlen
+        assert logs[0]['index'] == 10
+
+        extractor.clear_logs()
+        assert extractor.get_logs() == []
+
+    def test_parse_json_response_skips_noise(self):
+        """前後に文章や壊れた括弧があってもJSONを読み取れるテスト"""
+        extractor = MemoryExtractor()
+
+        result = extractor._parse_json_response(
+            '結果は {以下の通り} です: {"memories": [{"content": "猫が好き"}]} 以上 {'
+        )
+
+        assert result['memories'] == [{'content': '猫が好き'}]
+        assert result['attributes'] == []
+
+    def test_extract_memories_batch_with_mock(self):
+        """複数の会話をまとめて抽出し、会話ごとに振り分けるテスト"""
+        extractor = MemoryExtractor()
+
+        with patch.object(extractor.client, 'generate_structured') as mock_gen:
+            mock_gen.return_value = BatchExtractedMemories(results=[
+                TurnExtractedMemories(
+                    turn=2,
+                    memories=[MemoryItem(content="ラーメンが好き", category="preference")]
+                ),
+                TurnExtractedMemories(
+                    turn=1,
+                    attributes=[AttributeItem(name="名前", value="田中太郎")]
+                ),
+            ])
+
+            results = extractor.extract_memories_batch([
+                ("私は田中太郎です", ""),
+                ("ラーメンが好きです", "よろしくお願いします"),
+                ("こんにちは", ""),
+            ])
+
+            # LLMの呼び出しは1回のみ
+            assert mock_gen.call_count == 1
+            assert mock_gen.call_args.kwargs['response_model'] is BatchExtractedMemories
+
+            assert len(results) == 3
+            assert results[0]['attributes'][0]['value'] == "田中太郎"
+            assert results[1]['memories'][0]['content'] == "ラーメンが好き"
+            assert results[2] == extractor._empty_result()
+
+    def test_extract_memories_batch_single_turn(self):
+        """1件だけの場合は通常の抽出を使うテスト"""
+        extractor = MemoryExtractor()
+
+        with patch.object(extractor.client, 'generate_structured') as mock_gen:
+            mock_gen.return_value = ExtractedMemories()
+
+            results = extractor.extract_memories_batch([("こんにちは", "")])
+
+            assert len(results) == 1
+            assert mock_gen.call_args.kwargs['response_model'] is ExtractedMemories
+
 
 class TestMemoryOrganizerWithMock:
     """情報整理のテスト（モック使用）"""
 
     def test_detect_duplicates_with_mock(self):
-        """重複検出のテスト"""
+        """重複検出のテスト（1行1組の応答を解析する）"""
         organizer = MemoryOrganizer()
 
-        with patch.object(organizer.client, 'generate_structured') as mock_gen:
-            # モックの戻り値を設定
-            mock_result = DuplicateList(
-                duplicates=[
-                    DuplicatePair(id1=1, id2=2, reason="同じ内容")
-                ]
-            )
-            mock_gen.return_value = mock_result
+        with patch.object(organizer, '_load_cached_outputs', return_value={}), \
+                patch.object(organizer, '_save_outputs'), \
+                patch.object(organizer.client, 'generate_text') as mock_gen:
+            mock_gen.return_value = "1,2,同じ内容\nID:3, ID:4, 同じ趣味\n以上です"
 
-            # テストデータ
-            items = [
+            result = organizer._detect_duplicates('episodes', [[
                 {'id': 1, 'memory_content': 'プログラミングが好き'},
-                {'id': 2, 'memory_content': 'プログラミングが好きです'}
-            ]
+                {'id': 2, 'memory_content': 'プログラミングが好きです'},
+            ]], 'memory_content')
+
+        assert [(d.id1, d.id2, d.reason) for d in result] == [
+            (1, 2, "同じ内容"),
+            (3, 4, "同じ趣味"),
+        ]
+
+    def test_parse_detection_lines(self):
+        """「なし」や説明文を読み飛ばして検出結果を解析するテスト"""
+        assert memory_organizer._parse_duplicate_lines("なし").duplicates == []
+
+        conflicts = memory_organizer._parse_conflict_lines(
+            "矛盾は次の通りです。\n- 2，5，5，職業が変わった, 転職"
+        ).conflicts
+        assert [c.model_dump() for c in conflicts] == [
+            {'id1': 2, 'id2': 5, 'newer_id': 5, 'reason': "職業が変わった, 転職"}
+        ]
+
+    def test_merge_duplicate_requests_returns_changes(self):
+        """統合結果を取得し直さずに整形対象へ反映できるテスト"""
+        organizer = MemoryOrganizer()
+        requests = [
+            {'id': 1, 'request_content': '敬語で話して'},
+            {'id': 2, 'request_content': '丁寧語で話して'},
+            {'id': 3, 'request_content': '短く答えて'},
+        ]
+
+        with patch.object(organizer, '_load_cached_outputs', return_value={}), \
+                patch.object(organizer, '_save_outputs'), \
+                patch.object(organizer.client, 'generate_text', return_value="1,2,同じ内容"), \
+                patch.object(organizer.client, 'generate_structured') as mock_gen, \
+                patch.object(memory_organizer, 'update_request') as mock_update, \
+                patch.object(memory_organizer, 'delete_request') as mock_delete, \
+                patch.object(memory_organizer, 'write_batch', nullcontext):
+            mock_gen.return_value = MergedContent(merged="敬語で話してください。")
+
+            merged, changes = organizer._merge_duplicate_requests(requests)
+
+        assert merged == 1
+        mock_update.assert_called_once_with(1, "敬語で話してください。")
+        mock_delete.assert_called_once_with(2)
+        assert organizer._apply_changes(requests, changes) == [
+            {'id': 1, 'request_content': '敬語で話してください。'},
+            {'id': 3, 'request_content': '短く答えて'},
+        ]
+        # 取得済みの辞書は書き換えない
+        assert requests[0]['request_content'] == '敬語で話して'
+
+    def test_merge_duplicate_episodes_with_mock(self):
+        """完全一致は削除し、似たエピソードは検出から統合まで実際の処理を通すテスト"""
+        organizer = MemoryOrganizer()
+        episodes = [
+            {'id': 1, 'memory_content': 'プログラミングが好き'},
+            {'id': 2, 'memory_content': 'プログラミングが好きです'},
+            {'id': 3, 'memory_content': '週末は山に登る'},
+            {'id': 4, 'memory_content': '週末は山に登る'},
+        ]
+
+        with patch.object(organizer, '_load_cached_outputs', return_value={}), \
+                patch.object(organizer, '_save_outputs'), \
+                patch.object(organizer.client, 'generate_text', return_value="1,2,同じ内容") as mock_detect, \
+                patch.object(organizer.client, 'generate_structured',
+                             return_value=MergedContent(merged="プログラミングが好きです。")), \
+                patch.object(memory_organizer, 'update_memory') as mock_update, \
+                patch.object(memory_organizer, 'delete_memory') as mock_delete, \
+                patch.object(memory_organizer, 'write_batch', nullcontext):
+            merged, changes = organizer._merge_duplicate_episodes(episodes)
+
+        assert merged == 2
+        assert mock_detect.call_count == 1
+        mock_update.assert_called_once_with(1, "プログラミングが好きです。")
+        assert sorted(call.args[0] for call in mock_delete.call_args_list) == [2, 4]
+        assert organizer._apply_changes(episodes, changes) == [
+            {'id': 1, 'memory_content': 'プログラミングが好きです。'},
+            {'id': 3, 'memory_content': '週末は山に登る'},
+        ]
+
+    def test_exact_duplicates_are_removed_without_llm(self):
+        """内容が完全に一致するお願いはLLMを使わずに1件にまとめるテスト"""
+        organizer = MemoryOrganizer()
+        requests = [
+            {'id': 1, 'request_content': '敬語で話して'},
+            {'id': 2, 'request_content': '短く答えて'},
+            {'id': 3, 'request_content': '敬語で話して '},
+        ]
+
+        with patch.object(organizer.client, 'generate_text') as mock_text, \
+                patch.object(organizer.client, 'generate_structured') as mock_gen, \
+                patch.object(memory_organizer, 'delete_request') as mock_delete, \
+                patch.object(memory_organizer, 'write_batch', nullcontext):
+            merged, changes = organizer._merge_duplicate_requests(requests)
+
+        assert merged == 1
+        assert changes == {3: None}
+        mock_delete.assert_called_once_with(3)
+        mock_text.assert_not_called()
+        mock_gen.assert_not_called()
+
+    def test_detect_conflicts_keeps_newest_of_same_name(self):
+        """同じ内容の目標は、LLMを使わずに更新日時が新しいものを残すテスト"""
+        organizer = MemoryOrganizer()
+        goals = [
+            {'id': 1, 'goal_content': '英語を勉強する', 'goal_status': 'active', 'updated_at': '2024-01-01'},
+            {'id': 2, 'goal_content': '英語を勉強する', 'goal_status': 'active', 'updated_at': '2024-03-01'},
+            {'id': 3, 'goal_content': '英語を勉強する', 'goal_status': 'active', 'updated_at': '2024-02-01'},
+        ]
+
+        with patch.object(organizer.client, 'generate_text') as mock_text, \
+                patch.object(memory_organizer, 'update_goal') as mock_update, \
+                patch.object(memory_organizer, 'write_batch', nullcontext):
+            conflicts = organizer._detect_conflicts(goals, 'goal_content', 'goal_status')
+            resolved, changes = organizer._resolve_goal_conflicts(conflicts, goals)
+
+        mock_text.assert_not_called()
+        assert resolved == 2
+        assert changes == {1: None, 3: None}
+        assert mock_update.call_count == 2
+
+    def test_detect_duplicates_reuses_cached_result(self):
+        """項目が前回から変わっていなければ重複検出の結果を再利用するテスト"""
+        organizer = MemoryOrganizer()
+        saved = {}
 
-            # 重複検出は_merge_duplicate_episodesの中で行われる
-            # ここでは直接テストするため、プライベートメソッドをテスト
-            items_str = "\n".join([
-                f"ID:{item['id']} - {item['memory_content']}"
-                for item in items
-            ])
+        with patch.object(organizer, '_load_cached_outputs', side_effect=lambda hashes: {
+                    key: saved[key] for key in hashes if key in saved
+                }), \
+                patch.object(organizer, '_save_outputs', side_effect=lambda rows: saved.update(rows)), \
+                patch.object(organizer.client, 'generate_text') as mock_gen:
+            mock_gen.return_value = "1,2,同じ内容"
 
-            from app.memory_organizer import DUPLICATE_DETECTION_PROMPT
-            prompt = DUPLICATE_DETECTION_PROMPT.format(items=items_str)
+            groups = [[
+                {'id': 1, 'memory_content': 'プログラミングが好き'},
+                {'id': 2, 'memory_content': 'プログラミングが好きです'},
+            ]]
+            first = organizer._detect_duplicates('episodes', groups, 'memory_content')
+            second = organizer._detect_duplicates('episodes', groups, 'memory_content')
 
-            result = organizer.client.generate_structured(
-                prompt=prompt,
-                response_model=DuplicateList,
-                enable_two_stage=True
-            )
+        assert mock_gen.call_count == 1
+        assert first == second
+        assert (second[0].id1, second[0].id2) == (1, 2)
 
-            assert len(result.duplicates) == 1
-            assert result.duplicates[0].id1 == 1
-            assert result.duplicates[0].id2 == 2
+    def test_merge_pairs_skips_overlapping_pairs(self):
+        """IDを共有するペアを除き、統合に失敗したペアも他の統合を妨げないテスト"""
+        organizer = MemoryOrganizer()
+        by_id = {i: {'id': i, 'memory_content': f"内容{i}"} for i in range(1, 6)}
+        duplicates = [
+            DuplicatePair(id1=1, id2=2, reason="同じ"),
+            DuplicatePair(id1=2, id2=3, reason="同じ"),
+            DuplicatePair(id1=4, id2=5, reason="同じ"),
+        ]
+
+        def fake_generate(prompt, response_model, **kwargs):
+            if "内容4" in prompt:
+                raise Exception("LLMエラー")
+            return MergedContent(merged="統合済み")
+
+        with patch.object(organizer, '_load_cached_outputs', return_value={}), \
+                patch.object(organizer, '_save_outputs'), \
+                patch.object(organizer.client, 'generate_structured', side_effect=fake_generate) as mock_gen:
+            merged = list(organizer._merge_pairs(
+                'episode', 'episodes', 'エピソード', duplicates, by_id, 'memory_content'
+            ))
+
+        assert merged == [(1, 2, "統合済み")]
+        assert mock_gen.call_count == 2
+        assert any(log.get('type') == 'llm_error' for log in organizer.organization_log)
 
     def test_format_text_with_mock(self):
         """テキスト整形のテスト"""
@@ -255,13 +556,252 @@ class TestMemoryOrganizerWithMock:
 
             assert result.formatted == "プログラミングが好きです"
 
+    def test_format_items_batches_and_falls_back(self):
+        """複数項目を1回で整形し、結果が欠けた項目だけ1件ずつ整形するテスト"""
+        organizer = MemoryOrganizer()
+
+        with patch.object(organizer, '_load_cached_outputs', return_value={}), \
+                patch.object(organizer, '_save_outputs'), \
+                patch.object(organizer.client, 'generate_structured') as mock_gen:
+            mock_gen.side_effect = [
+                FormattedTextList(items=[
+                    FormattedItem(id=1, formatted="猫が好きです。"),
+                    FormattedItem(id=99, formatted="存在しない項目"),
+                ]),
+                FormattedText(formatted="犬を飼っています。"),
+            ]
+
+            result = organizer._format_items('episode', {1: "猫すき", 2: "犬かってる"})
+
+            assert result == {1: "猫が好きです。", 2: "犬を飼っています。"}
+            assert mock_gen.call_count == 2
+            assert mock_gen.call_args_list[0].kwargs['response_model'] is FormattedTextList
+            assert mock_gen.call_args_list[1].kwargs['response_model'] is FormattedText
+            assert "犬かってる" in mock_gen.call_args_list[1].kwargs['prompt']
+
+    def test_format_items_uses_cache_and_deduplicates(self):
+        """キャッシュ済みの項目と重複する項目をLLMに送らないテスト"""
+        organizer = MemoryOrganizer()
+        cached = {organizer._cache_key(FORMAT_PROMPT.format(text="猫すき"), FORMAT_SYSTEM_PROMPT): "猫が好きです。"}
+
+        with patch.object(organizer, '_load_cached_outputs', side_effect=lambda hashes: {
+                    key: output for key, output in cached.items() if key in hashes
+                }), \
+                patch.object(organizer, '_save_outputs') as mock_save, \
+                patch.object(organizer.client, 'generate_structured') as mock_gen:
+            mock_gen.return_value = FormattedTextList(items=[
+                FormattedItem(id=2, formatted="犬を飼っています。"),
+                FormattedItem(id=4, formatted="鳥を飼っています。"),
+            ])
+
+            result = organizer._format_items(
+                'episode', {1: "猫すき", 2: "犬かってる", 3: "犬かってる", 4: "鳥かってる"}
+            )
+
+        assert result == {
+            1: "猫が好きです。", 2: "犬を飼っています。",
+            3: "犬を飼っています。", 4: "鳥を飼っています。"
+        }
+        assert mock_gen.call_count == 1
+        prompt = mock_gen.call_args.kwargs['prompt']
+        assert "猫すき" not in prompt
+        assert prompt.count("犬かってる") == 1
+        # 整形済みのテキストを次回LLMに送らないよう、出力自身もキャッシュする
+        saved = dict(mock_save.call_args.args[0])
+        assert saved[organizer._cache_key(
+            FORMAT_PROMPT.format(text="犬を飼っています。"), FORMAT_SYSTEM_PROMPT
+        )] == "犬を飼っています。"
+
+    def test_duplicate_groups_keeps_only_similar_items(self):
+        """似た項目どうしをグループにまとめ、どの項目とも似ていない項目を外すテスト"""
+        from app.memory_organizer import _duplicate_groups
+
+        items = [
+            {'id': 1, 'memory_content': 'プログラミングが好き'},
+            {'id': 2, 'memory_content': '昨日は雨だった'},
+            {'id': 3, 'memory_content': '猫を飼っている'},
+            {'id': 4, 'memory_content': 'プログラミングが好きです'},
+            {'id': 5, 'memory_content': '猫を二匹飼っている'},
+        ]
+
+        groups = _duplicate_groups(items, 'memory_content')
+
+        assert [[item['id'] for item in group] for group in groups] == [[1, 4], [3, 5]]
+
+    def test_detect_duplicates_sends_one_prompt_per_group(self):
+        """グループごとに別のプロンプトで重複を検出するテスト"""
+        organizer = MemoryOrganizer()
+        groups = [
+            [{'id': 1, 'memory_content': '内容A'}, {'id': 2, 'memory_content': '内容A2'}],
+            [{'id': 3, 'memory_content': '内容B'}, {'id': 4, 'memory_content': '内容B2'}],
+        ]
+
+        def fake_generate(prompt, **kwargs):
+            assert ("ID:1" in prompt) != ("ID:3" in prompt)
+            return "1,2,同じ" if "ID:1" in prompt else "3,4,同じ"
+
+        with patch.object(organizer, '_load_cached_outputs', return_value={}), \
+                patch.object(organizer, '_save_outputs'), \
+                patch.object(organizer.client, 'generate_text', side_effect=fake_generate) as mock_gen:
+            duplicates = organizer._detect_duplicates('episodes', groups, 'memory_content')
+
+        assert mock_gen.call_count == 2
+        assert [(d.id1, d.id2) for d in duplicates] == [(1, 2), (3, 4)]
+
+    def test_snippet_truncates_by_characters(self):
+        """検出プロンプト用のテキストを文字数で切り詰めるテスト"""
+        from app.memory_organizer import _snippet
+
+        assert _snippet("短い\nテキスト", 10) == "短い テキスト"
+        assert _snippet("あ" * 20, 10) == "あ" * 9 + "…"
+
+    def test_compiled_prompts_match_templates(self):
+        """組み立て関数のプロンプトがテンプレートの format と一致するテスト"""
+        from app.memory_organizer import (
+            MERGE_PROMPT, COMPRESS_PROMPT, _merge_prompt, _compress_prompt, _format_prompt
+        )
+
+        assert _format_prompt("猫すき") == FORMAT_PROMPT.format(text="猫すき")
+        assert _merge_prompt("A", "B") == MERGE_PROMPT.format(item1="A", item2="B")
+        assert _compress_prompt(2, "内容") == COMPRESS_PROMPT.format(level=2, content="内容")
+
+    def test_format_items_skips_clean_text(self):
+        """整っている短いテキストは整形をLLMに依頼しないテスト"""
+        organizer = MemoryOrganizer()
+
+        with patch.object(organizer.client, 'generate_structured') as mock_gen:
+            result = organizer._format_items('goal', {
+                1: "英語を勉強する。", 2: "毎日走る？", 3: "「また今度」"
+            })
+
+        assert result == {}
+        mock_gen.assert_not_called()
+        assert organizer.organization_log[-1] == {
+            'type': 'format_skipped', 'step': 'goal', 'count': 3
+        }
+
+    def test_format_items_defers_chunks_after_budget(self):
+        """時間の目安を過ぎたら、残りのまとまりを次回の整理に回すテスト"""
+        organizer = MemoryOrganizer()
+        organizer.MAX_ITEMS_PER_STEP = 2
+        texts = {i: f"整形前のテキスト{i}  " for i in range(1, 6)}
+
+        with patch.object(memory_organizer, 'FORMAT_STEP_BUDGET_SECONDS', -1), \
+                patch.object(organizer, '_generate_with_cache', side_effect=lambda step, action, batch, *args, **kwargs: {
+                    item_id: "整形済み。" for item_id in batch
+                }) as mock_gen:
+            result = organizer._format_items('goal', texts)
+
+        assert mock_gen.call_count == 1
+        assert set(result) == {1, 2}
+        assert organizer.organization_log[-1] == {
+            'type': 'format_deferred', 'step': 'goal', 'count': 3
+        }
+
+    def test_processing_notifications_are_throttled(self):
+        """件数付きの処理中通知は間引き、最後の1件と状態の変化は必ず通知するテスト"""
+        organizer = MemoryOrganizer()
+        received = []
+        organizer.set_progress_callback(received.append)
+
+        organizer._notify_progress('goal', 'processing', '整形中', current=1, total=3)
+        organizer._notify_progress('goal', 'processing', '整形中', current=2, total=3)
+        organizer._notify_progress('goal', 'processing', '整形中', current=3, total=3)
+        organizer._notify_progress('goal', 'completed', '完了')
+
+        assert [(r['status'], r['progress']) for r in received] == [
+            ('processing', {'current': 1, 'total': 3}),
+            ('processing', {'current': 3, 'total': 3}),
+            ('completed', None),
+        ]
+        assert len(organizer.organization_log) == 4
+
+    def test_generate_structured_retries_on_timeout(self):
+        """タイムアウトした呼び出しをやり直すテスト"""
+        organizer = MemoryOrganizer()
+
+        with patch.object(organizer.client, 'generate_structured') as mock_gen, \
+                patch.object(memory_organizer.time, 'sleep') as mock_sleep:
+            mock_gen.side_effect = [TimeoutError("タイムアウト"), FormattedText(formatted="整形済み。")]
+
+            result = organizer._generate_structured(prompt="整形して", response_model=FormattedText)
+
+        assert result.formatted == "整形済み。"
+        assert mock_gen.call_count == 2
+        assert mock_gen.call_args.kwargs['timeout'] > 0
+        mock_sleep.assert_called_once()
+
+    def test_compress_sends_identical_content_once(self):
+        """同じ圧縮レベルで内容が同じエピソードは、1件分だけLLMで圧縮するテスト"""
+        organizer = MemoryOrganizer()
+        content = "今日は朝から雨が降っていたので、家で本を読んで過ごした。"
+        episodes = [
+            {'id': 1, 'memory_content': content, 'target_level': 2},
+            {'id': 2, 'memory_content': content, 'target_level': 2},
+        ]
+
+        with patch.object(memory_organizer, 'get_memories_needing_compression', return_value=episodes), \
+                patch.object(memory_organizer, 'update_memory') as mock_update, \
+                patch.object(memory_organizer, 'update_compression_levels_bulk') as mock_levels, \
+                patch.object(memory_organizer, 'write_batch', nullcontext), \
+                patch.object(organizer, '_load_cached_outputs', return_value={}), \
+                patch.object(organizer, '_save_outputs'), \
+                patch.object(organizer.client, 'generate_structured') as mock_gen:
+            mock_gen.return_value = CompressedContent(compressed="雨の日に家で読書した。")
+
+            compressed = organizer._compress_old_episodes()
+
+        assert compressed == 2
+        assert mock_gen.call_count == 1
+        assert mock_gen.call_args.kwargs['response_model'] is CompressedContent
+        assert mock_update.call_count == 2
+        mock_levels.assert_called_once_with('user_memories', [(1, 2), (2, 2)])
+
+    def test_generate_many_returns_results_and_errors(self):
+        """並行呼び出しで、成功した結果と例外をキーごとに返すテスト"""
+        organizer = MemoryOrganizer()
+
+        def fake_generate(prompt, response_model, **kwargs):
+            # 指示はシステムプロンプトで渡し、プロンプトには内容だけを入れる
+            assert kwargs['system_prompt'] == FORMAT_SYSTEM_PROMPT
+            if prompt == "失敗":
+                raise Exception("LLMエラー")
+            return FormattedText(formatted=prompt + "。")
+
+        with patch.object(organizer.client, 'generate_structured', side_effect=fake_generate):
+            results = dict(organizer._generate_many(
+                {1: "猫", 2: "失敗", 3: "犬"}, FormattedText, FORMAT_SYSTEM_PROMPT
+            ))
+
+        assert results[1].formatted == "猫。"
+        assert results[3].formatted == "犬。"
+        assert isinstance(results[2], Exception)
+
+    def test_organize_all_runs_every_step(self):
+        """全カテゴリの整理結果をまとめ、失敗したステップをエラーとして返すテスト"""
+        organizer = MemoryOrganizer()
+
+        with patch.object(organizer, '_organize_attributes', return_value={'formatted': 1}), \
+                patch.object(organizer, '_organize_episodes', return_value={'compressed': 2}), \
+                patch.object(organizer, '_organize_goals', side_effect=Exception("LLMエラー")), \
+                patch.object(organizer, '_organize_requests', return_value={'merged': 3}):
+            results = organizer.organize_all()
+
+        assert results['attributes'] == {'formatted': 1}
+        assert results['episodes'] == {'compressed': 2}
+        assert results['requests'] == {'merged': 3}
+        assert results['error'] == "LLMエラー"
+
+        completed = {log['step'] for log in organizer.get_logs() if log['status'] == 'completed'}
+        assert completed == {'attribute', 'episode', 'request'}
+
 
 class TestEndToEndWithMock:
     """エンドツーエンドのテスト（モック使用）"""
 
     def test_extraction_flow(self):
         """抽出フローの統合テスト"""
-        extractor = MemoryExtractor()
+        extractor = MemoryExtractor(test_mode=True)
 
         # モックデータ
         mock_extracted = ExtractedMemories(